@@ -4,6 +4,7 @@
 cleaner
 """
 # pylint: disable=too-many-locals
+from concurrent.futures import ThreadPoolExecutor
 import os
 from pathlib import Path
 
@@ -13,6 +14,8 @@ from utils import Msg
 from data import get_top_dir
 from data import get_top_wg_dir
 from data import get_db_name
+from data import wg_snapshot_clean
+from data import NewHistory
 
 
 def cleanup(wgtool):
@@ -22,9 +25,18 @@ def cleanup(wgtool):
         <Data>/<vpns>/<peers>/db/
     Remove older by keeping hist/hist_wg directories.
 
+    Only directories which got new history in this run are cleaned
+    (all of them with --refresh). Nothing to do if nothing was written.
+
+    Each directory is independent, so they are cleaned using
+    a pool of opts.jobs threads.
+
     Note: Directoty names taken from filesystem.
     """
     opts = wgtool.opts
+    if not opts.refresh and NewHistory.is_empty():
+        return
+
     num_keep = opts.hist if opts.hist else 5
     num_keep_wg = opts.hist_wg if opts.hist_wg else 3
 
@@ -33,43 +45,85 @@ def cleanup(wgtool):
     Msg.hdr('Cleaning history\n')
 
     #
-    # Data
+    # Data and Data-wg
     #
-    _clean_vpn_dirs(num_keep, data_dir)
+    if opts.refresh:
+        data_dirs = _history_dirs(data_dir)
+        data_wg_dirs = _history_dirs(data_wg_dir)
+        wg_vpns = _wg_snapshot_vpns(data_wg_dir)
+    else:
+        wg_prefix = data_wg_dir + os.sep
+        data_dirs = [one_dir for one_dir in NewHistory.dirs
+                     if not one_dir.startswith(wg_prefix)]
+        data_wg_dirs = [one_dir for one_dir in NewHistory.dirs
+                        if one_dir.startswith(wg_prefix)]
+        wg_vpns = list(NewHistory.wg_vpns)
+
+    todo: list[tuple[int, str]] = []
+    todo += [(num_keep, one_dir) for one_dir in sorted(data_dirs)]
+    todo += [(num_keep_wg, one_dir) for one_dir in sorted(data_wg_dirs)]
+
+    jobs = opts.jobs
+    if jobs > 1 and len(todo) > 1:
+        with ThreadPoolExecutor(max_workers=jobs) as pool:
+            futures = [pool.submit(_clean_one_dir, num, one_dir)
+                       for (num, one_dir) in todo]
+            for future in futures:
+                future.result()
+    else:
+        for (num, one_dir) in todo:
+            _clean_one_dir(num, one_dir)
 
     #
-    # Data-wg
+    # Data-wg snapshot generations
     #
-    _clean_vpn_dirs(num_keep_wg, data_wg_dir)
+    for vpn_name in sorted(wg_vpns):
+        wg_snapshot_clean(opts.work_dir, vpn_name, num_keep_wg)
 
 
-def _clean_vpn_dirs(num_keep: int, data_dir: str):
+def _wg_snapshot_vpns(data_wg_dir: str) -> list[str]:
     """
-    Identify all peer directories and "db" directoiry
-    which has history
+    Vpns with wireguard snapshot generations:
+        <Data-wg>/<db>/<vpn>/<gen>
+    """
+    snap_topdir = os.path.join(data_wg_dir, get_db_name())
+    (_fls, vpn_names, _lnks) = dir_list(snap_topdir, which='name')
+    return vpn_names
+
+
+def _history_dirs(data_dir: str) -> list[str]:
+    """
+    Identify all vpn and peer directories which
+    may have "db" directory with history.
     """
     Msg.plainverb(f'  Cleanup of {data_dir}\n', level=3)
+    one_dirs: list[str] = []
     if not data_dir:
-        return
+        return one_dirs
 
     #
     # Vpn.info / Accounts / profiles
     #
+    db_name = get_db_name()
     (_fls, vpn_dirs, _lnks) = dir_list(data_dir, which='path')
     for vpn_dir in vpn_dirs:
+        if os.path.basename(vpn_dir) == db_name:
+            # snapshot generations are cleaned separately
+            continue
+
         #
         # Vpn.info
         #   Data/<vpn>/Vpn.info -> <db>/xxx/Vpn.info
         #
-        _clean_one_dir(num_keep, vpn_dir)
+        one_dirs.append(vpn_dir)
 
         #
         # peers (has 1 or more profile files)
         #   Data/<vpn>/<account>/<prof> -> <db>/xxx/<prof>
         #
         (_fls, peer_dirs, _lnks) = dir_list(vpn_dir, which='path')
-        for peer_dir in peer_dirs:
-            _clean_one_dir(num_keep, peer_dir)
+        one_dirs += peer_dirs
+    return one_dirs
 
 
 def _clean_one_dir(num_keep: int, one_dir: str):
@@ -85,18 +139,24 @@ def _clean_one_dir(num_keep: int, one_dir: str):
     is empty, then it can be deleted as well.
 
     Do not remove any directory that is a symlink target.
-    Make a list of db/xx which are link targets
-    For each link name find it's history
+    For each link name find it's history:
 
     one_dir/<linkname> -> <db>/xxx/<linkname>
     find all <y> in <db>/<y>/<linkname> for which <y> is NOT xxx
+
+    The db directory is scanned once to get every filename's
+    history (see _db_index).
     """
     Msg.plainverb(f'  Cleanup of {one_dir}\n', level=3)
     removes: list[str] = []
 
     (_fls, _dirs, all_links) = dir_list(one_dir, which='path')
+    if not all_links:
+        return
 
     db_name = get_db_name()
+    one_db_dir = os.path.join(one_dir, db_name)
+    db_index = _db_index(one_db_dir)
 
     for link in all_links:
         # one link at a time as each has its own history.
@@ -111,38 +171,28 @@ def _clean_one_dir(num_keep: int, one_dir: str):
         link_subdir = path_obj.parts[-2:][0]
 
         #
-        # Get list of all xxx with same filename as link.
+        # All (mtime, xxx) with same filename as link.
         #   db_dir/xxx/filename
         #
         filename = os.path.basename(link)
-        one_db_dir = os.path.join(one_dir, db_name)
-        subdirs_all = _subdirs_with_file(one_db_dir, filename)
-        if link_subdir in subdirs_all:
-            subdirs_all.remove(link_subdir)
-
-        #
-        # List of filepaths (without the link target)
-        #
-        candidates: list[str] = []
-        for subdir in subdirs_all:
-            fpath = os.path.join(one_dir, db_name, subdir, filename)
-            candidates.append(fpath)
+        candidates = [(mtime, subdir)
+                      for (mtime, subdir) in db_index.get(filename, [])
+                      if subdir != link_subdir]
 
         #
         # which of possible are to be removed
         #
-        remove_items = _make_remove_list(num_keep, candidates)
-        if remove_items:
-            removes += remove_items
+        for subdir in _make_remove_list(num_keep, candidates):
+            removes.append(os.path.join(one_db_dir, subdir, filename))
 
     #
     # Now we have the list to be removed
     # Go ahead and delete them.
     #
-    subdir_list: list[str] = []
+    subdir_list: set[str] = set()
     for fpath in removes:
         subdir = os.path.dirname(fpath)
-        subdir_list.append(subdir)
+        subdir_list.add(subdir)
         _remove_file(fpath)
 
     #
@@ -152,6 +202,37 @@ def _clean_one_dir(num_keep: int, one_dir: str):
         _remove_dir_if_empty(subdir)
 
 
+def _db_index(db_dir: str) -> dict[str, list[tuple[float, str]]]:
+    """
+    One pass over db_dir/<xxx>/ to map:
+        filename -> [(mtime, xxx), ...]
+    for every file in every dated directory.
+    """
+    db_index: dict[str, list[tuple[float, str]]] = {}
+    if not os.path.isdir(db_dir):
+        return db_index
+
+    try:
+        with os.scandir(db_dir) as scan:
+            subdirs = [(item.name, item.path) for item in scan
+                       if item.is_dir(follow_symlinks=False)]
+    except OSError:
+        return db_index
+
+    for (subdir, subdir_path) in subdirs:
+        try:
+            with os.scandir(subdir_path) as scan:
+                for item in scan:
+                    if not item.is_file(follow_symlinks=False):
+                        continue
+                    mtime = item.stat(follow_symlinks=False).st_mtime
+                    history = db_index.setdefault(item.name, [])
+                    history.append((mtime, subdir))
+        except OSError:
+            continue
+    return db_index
+
+
 def _remove_file(fpath: str):
     """
     Remove file - log any problems
@@ -189,33 +270,11 @@ def _remove_dir_if_empty(dpath: str):
         Msg.warn(f'Error deleting directory: {dpath}')
 
 
-def _subdirs_with_file(topdir: str, targ_file: str) -> list[str]:
-    """
-    Given a directory,  find all subdirs which contain filename.
-
-    i.e.
-    Find all <x> for which the file:
-        topdir/<x>/filename
-    exists.
-
-    Return list of <x>
-    """
-    matches: list[str] = []
-    (_fls, dirs_all, _lnks) = dir_list(topdir, which='path')
-
-    for subdir in dirs_all:
-        (files, _dirs, _lnks) = dir_list(subdir, which='name')
-        if targ_file in files:
-            subdir_name = os.path.basename(subdir)
-            matches.append(subdir_name)
-
-    return matches
-
-
-def _make_remove_list(num_keep: int, candidates: list[str]) -> list[str]:
+def _make_remove_list(num_keep: int,
+                      candidates: list[tuple[float, str]]) -> list[str]:
     """
-    Given list of paths of candidates, return
-    list of those to be removed.
+    Given list of (mtime, xxx) candidates, return
+    list of xxx to be removed.
     """
     remove_list: list[str] = []
     if not candidates or len(candidates) < num_keep:
@@ -225,6 +284,6 @@ def _make_remove_list(num_keep: int, candidates: list[str]) -> list[str]:
     # Sort list by file time - newest first
     # And make the list to remove
     #
-    candidates.sort(key=os.path.getmtime, reverse=True)
-    remove_list = candidates[num_keep:]
+    candidates.sort(reverse=True)
+    remove_list = [subdir for (_mtime, subdir) in candidates[num_keep:]]
     return remove_list
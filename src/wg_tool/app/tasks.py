@@ -4,10 +4,18 @@
 Do all tasks
 """
 
+import os
+
 from utils import Msg
 from utils import set_restrictive_file_perms
+from utils import file_perms_audit
+from utils import WriteBatch
 from data import get_top_dir
 from data import get_top_wg_dir
+from data import get_db_name
+from data import DigestIndex
+from dns_resolver import Dns
+from net import cidr_cache_report
 from vpns import Vpns
 
 from .cleanup import cleanup
@@ -63,14 +71,21 @@ def do_tasks(vpns: Vpns) -> bool:
         vpns.show_rpt()
 
     #
-    # save config data
-    #
-    vpns.write()
+    # save config data and wireguard data
+    #  - files are synced together and put in place at commit
+    #
+    WriteBatch.begin()
+    try:
+        vpns.write()
+        vpns.write_wireguard()
+    except BaseException:
+        # nothing is put in place - drop the temp files
+        WriteBatch.abort()
+        raise
 
-    #
-    # save wireguard data
-    #
-    vpns.write_wireguard()
+    if not WriteBatch.commit():
+        Msg.err('Error putting files in place\n')
+        return False
 
     #
     # Extra caution to ensure permissions are user/root only
@@ -80,10 +95,26 @@ def do_tasks(vpns: Vpns) -> bool:
 
         # file perms
         topdir = get_top_dir(opts.work_dir)
-        set_restrictive_file_perms(topdir)
+        set_restrictive_file_perms(topdir, opts.jobs)
 
         topdir = get_top_wg_dir(opts.work_dir)
-        set_restrictive_file_perms(topdir)
+        set_restrictive_file_perms(topdir, opts.jobs)
+
+    #
+    # Report (only) any permission drift in files new since last audit
+    #
+    if opts.file_perms_audit:
+        topdir = get_top_dir(opts.work_dir)
+        topdirs = [topdir, get_top_wg_dir(opts.work_dir)]
+        mark_file = os.path.join(topdir, get_db_name(), 'perms-audit')
+        file_perms_audit(topdirs, mark_file, opts.jobs)
+    #
+    # digests of files checked/written this run
+    #
+    DigestIndex.save_all()
+    Dns.save_cache()
+    cidr_cache_report()
+
     #
     # clean up
     #
@@ -8,9 +8,15 @@ Each "vpn" has its own suite of peers. Some peers are clients
 which connect to a gateway (which listens on a known ip/port)
 """
 # pylint: disable=too-few-public-methods
+import os
 
 from config import Opts
 from utils import Msg
+from utils import TomlCache
+from crypto import KeyEngine
+from data import DigestIndex
+from data import (get_top_dir, get_db_name)
+from dns_resolver import Dns
 from vpns import Vpns
 
 from .data_migration import do_data_migration
@@ -33,6 +39,20 @@ class Tool:
         if self.opts.verb > 0:
             Msg.verb = self.opts.verb
 
+        if self.opts.key_check:
+            KeyEngine.wg_check = True
+
+        if self.opts.verify or self.opts.refresh:
+            DigestIndex.verify = True
+            TomlCache.verify = True
+
+        #
+        # dns answers saved between runs
+        #
+        Dns.cache_file = os.path.join(get_top_dir(self.opts.work_dir),
+                                      get_db_name(), 'dns-cache')
+        Dns.refresh = self.opts.refresh
+
         #
         # Check if migrating from older config version
         # - migration writes out the new config data
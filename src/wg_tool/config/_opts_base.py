@@ -73,6 +73,8 @@ class OptsBase:
         #
         self.hist: int = 5
         self.hist_wg: int = 3
+        self.incremental: bool = False
+        self.wg_snapshot: bool = False
         # self.net_compact: bool = True
 
         self.list: bool = False
@@ -80,6 +82,10 @@ class OptsBase:
         self.run_show_rpt: bool = False
 
         self.file_perms: bool = False
+        self.file_perms_audit: bool = False
+        self.verify: bool = False
+        self.key_check: bool = False
+        self.jobs: int = 1
 
         self.brief: bool = False
         self.verb: int = 0
@@ -99,6 +105,7 @@ class OptsBase:
         # pids -> peer identities
         #
         self.ident_names: list[str] = []
+        self.ids_file: str = ''
         self.idents: Identities = Identities()
 
     def pprint(self, recurs: bool = False):
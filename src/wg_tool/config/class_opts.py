@@ -10,6 +10,7 @@ import os
 import sys
 
 from utils import (Msg, version)
+from utils import open_file
 from data import get_top_dir
 
 from ._opts_base import OptsBase
@@ -56,12 +57,27 @@ class Opts(OptsBase):
         # Command line must be of the form:
         #  vpn or vpn.acct or vpn.acct.prof where prof is a
         #  profile name or a comma separated list of profile names.
+        # ids_file adds more from file
         #
+        if self.ids_file:
+            ids_from_file = _read_ids_file(self.ids_file)
+            if ids_from_file is None:
+                self.okay = False
+                return
+            self.ident_names += ids_from_file
+
         if self.ident_names:
             if not self.idents.parse_ids(self.ident_names):
                 self.okay = False
                 return
         #
+        # jobs: 0 means one per cpu
+        #
+        if self.jobs <= 0:
+            cpus = os.cpu_count()
+            self.jobs = cpus if cpus else 1
+
+        #
         # validation checks
         #
         if not input_validation(self):
@@ -189,3 +205,28 @@ def _modify_check(opts: Opts) -> bool:
         Msg.plain('\n')
         return False
     return True
+
+
+def _read_ids_file(fpath: str) -> list[str] | None:
+    """
+    Read ID names from file.
+    Whitespace separated, "#" starts a comment.
+    Returns list of ID names or None on error.
+    """
+    try:
+        fobj = open_file(fpath, 'r')
+        if not fobj:
+            Msg.err(f'Failed to read ids file {fpath}\n')
+            return None
+        with fobj:
+            data = fobj.read()
+
+    except OSError as err:
+        Msg.err(f'Error with ids file {fpath} : {err}\n')
+        return None
+
+    names: list[str] = []
+    for row in data.splitlines():
+        row = row.split('#', 1)[0]
+        names += row.split()
+    return names
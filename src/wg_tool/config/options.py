@@ -161,6 +161,12 @@ def _edit_options() -> tuple[str, str, list[_Opt]]:
     opts.append((('-new', '--new'),
                  {'help': txt, 'action': 'store_true'}))
 
+    txt = 'Read more IDs from file, one or more per line.\n'
+    txt += 'Added to any positional IDs. Handy with --new for many IDs\n'
+    txt += 'Anything after "#" on a line is ignored'
+    opts.append((('-ids-file', '--ids-file'),
+                 {'metavar': 'FILE', 'help': txt}))
+
     txt = 'Generate new keys for IDs (See positional parameters)'
     opts.append((('-roll', '--roll-keys'),
                  {'action': 'store_true', 'help': txt}))
@@ -219,6 +225,34 @@ def _stored_options(saved: dict[str, Any]) -> tuple[str, str, list[_Opt]]:
     opts.append((('-hist-wg', '--hist-wg'),
                  {'metavar': 'NUM', 'default': default, 'help': txt}))
 
+    toggle = False
+    if saved and saved.get('incremental') is not None:
+        toggle = saved['incremental']
+
+    txt = 'Only write files of peers whose inputs changed'
+    opts.append((('-inc', '--incremental'),
+                 {'action': 'store_true', 'default': toggle,
+                  'help': txt + f' ({toggle})'}))
+
+    txt = 'Check and write all files (turn off incremental)'
+    opts.append((('-no-inc', '--no-incremental'),
+                 {'action': 'store_false', 'dest': 'incremental',
+                  'help': txt}))
+
+    toggle = False
+    if saved and saved.get('wg_snapshot') is not None:
+        toggle = saved['wg_snapshot']
+
+    txt = 'Write wireguard configs as one generation per run'
+    opts.append((('-wg-snap', '--wg-snapshot'),
+                 {'action': 'store_true', 'default': toggle,
+                  'help': txt + f' ({toggle})'}))
+
+    txt = 'Write wireguard configs with history per file'
+    opts.append((('-no-wg-snap', '--no-wg-snapshot'),
+                 {'action': 'store_false', 'dest': 'wg_snapshot',
+                  'help': txt}))
+
     # toggle = True
     # if saved and saved.get('net_compact') is not None:
     #     toggle = saved['net_compact']
@@ -300,6 +334,28 @@ def _general_options() -> tuple[str, str, list[_Opt]]:
     opts.append((('-fp', '--file-perms'),
                  {'action': 'store_true', 'help': txt}))
 
+    txt = 'Report data files with permissions other than user/group'
+    txt += ' only (nothing is changed).'
+    txt += '\nOnly files new since the last clean audit are checked.'
+    opts.append((('-fpa', '--file-perms-audit'),
+                 {'action': 'store_true', 'help': txt}))
+
+    txt = 'Read and compare files to find changes instead of using'
+    txt += ' stored digests. Not normally needed.'
+    opts.append((('-verify', '--verify'),
+                 {'action': 'store_true', 'help': txt}))
+
+    txt = 'Cross check keys generated in process using "wg pubkey".'
+    txt += ' Not normally needed.'
+    opts.append((('-kc', '--key-check'),
+                 {'action': 'store_true', 'help': txt}))
+
+    txt = 'Number of processes used to render wireguard configs (1).'
+    txt += '\nAlso threads used by cleanup and file permission walks.'
+    txt += '\n0 uses one per cpu'
+    opts.append((('-j', '--jobs'),
+                 {'metavar': 'NUM', 'help': txt}))
+
     txt = 'Verbose output. Repeat for even more verbosity.\n'
     txt += '-vv works with -l and -rpt. Use -vvv for very verbose output'
     opts.append((('-v', '--verb'),
@@ -382,10 +438,10 @@ def parse_args(work_dir: str, data_dir: str) -> dict[str, Any]:
     # Current remaining options
     #
     if args:
-        int_keys = ('hist', 'hist_wg')
+        int_keys = ('hist', 'hist_wg', 'jobs')
         cslist_keys = ('nets_wanted_add', 'nets_wanted_del',
                        'nets_offered_add', 'nets_offered_del')
-        save_keys = int_keys
+        save_keys = ('hist', 'hist_wg', 'incremental', 'wg_snapshot')
         for (key, val) in vars(args).items():
             if val is not None:
 
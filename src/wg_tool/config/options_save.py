@@ -21,6 +21,8 @@ def write_saved_options(opts: dict[str, Any], fpath: str) -> bool:
     save options in TOML format:
       - keep_hist
       - keep_hist_wg
+      - incremental
+      - wg_snapshot
 
     Returns:
         bool:
@@ -36,7 +38,8 @@ def write_saved_options(opts: dict[str, Any], fpath: str) -> bool:
 
     opts_save: dict[str, Any] = {}
 
-    keys = ('hist', 'hist_wg')  # , 'net_compact')
+    keys = ('hist', 'hist_wg', 'incremental', 'wg_snapshot')
+    # keys += ('net_compact',)
     for key in keys:
         if opts.get(key) is not None:
             opts_save[key] = opts.get(key)
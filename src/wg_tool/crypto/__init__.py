@@ -3,5 +3,8 @@
 ''' crypto module '''
 from .digest import message_digest
 from .keys import gen_key_pair
+from .keys import gen_key_pairs
 from .keys import gen_psk
+from .keys import gen_psks
 from .keys import public_from_private_key
+from .keys import KeyEngine
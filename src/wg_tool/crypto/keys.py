@@ -1,72 +1,176 @@
 # SPDX-License-Identifier: GPL-2.0-or-later
 # SPDX-FileCopyrightText: © 2022-present  Gene C <arch@sapience.com>
 """
-make private, public and preshared keys using wg genkey/pubkey/genpsk
+make private, public and preshared keys.
+
+Keys are generated in process using X25519 from the cryptography package
+and encoded the same way as wireguard (base64 of the raw 32 bytes).
+Optionally, keys can be cross checked using /usr/bin/wg from wireguard-tools.
 """
+# pylint: disable=too-few-public-methods
+import base64
+import binascii
+import os
+
+from cryptography.hazmat.primitives.asymmetric.x25519 import X25519PrivateKey
+from cryptography.hazmat.primitives.serialization import Encoding
+from cryptography.hazmat.primitives.serialization import PublicFormat
+
 from utils.msg import (Msg)
 from utils.run_prog_copy import (run_prog)
 
+_KEY_LEN: int = 32
 
-def gen_key_pair() -> tuple[str, str]:
+
+class KeyEngine:
+    """
+    Key generation settings.
+
+    wg_check:
+        When True every private/public key pair is also verified
+        using "wg pubkey". Slow, since it runs wg for every key,
+        but ensures we are consistent with what wireguard uses.
     """
-    Use /usr/bin/wg from wireguard tools to generate the public private
-    and preshared keys.
+    wg_check: bool = False
 
-    While we could generate directly, using the tools from wireguard ensures
-    that we are consistent with what wireguard uses.
 
-    Note, that time to generate keys is irrelevant.
+def gen_key_pair() -> tuple[str, str]:
     """
-    key_prv: str = ''
-    key_pub: str = ''
+    Generate a wireguard private and public key pair.
 
-    #
-    # private key
-    #
-    pargs = ['/usr/bin/wg', 'genkey']
-    (ret, key_prv, errors) = run_prog(pargs)
-    if ret != 0:
-        Msg.err(f'Error generating key: {errors}')
-        return ('', '')
+    Private key is clamped just like "wg genkey" does.
 
-    #
-    # pub key
-    #
+    Returns:
+        (key_prv, key_pub) or ('', '') on error.
+    """
+    key_prv = _encode(_clamp(os.urandom(_KEY_LEN)))
     key_pub = public_from_private_key(key_prv)
-
-    key_prv = key_prv.strip()
-    key_pub = key_pub.strip()
+    if not key_pub:
+        return ('', '')
 
     return (key_prv, key_pub)
 
 
+def gen_key_pairs(count: int) -> list[tuple[str, str]]:
+    """
+    Generate count key pairs.
+    All private keys are taken from one batch of random bytes.
+
+    Returns:
+        list of (key_prv, key_pub) or empty list on error.
+    """
+    pairs: list[tuple[str, str]] = []
+    if count <= 0:
+        return pairs
+
+    for key in _random_keys(count):
+        key_prv = _encode(_clamp(key))
+        key_pub = public_from_private_key(key_prv)
+        if not key_pub:
+            return []
+        pairs.append((key_prv, key_pub))
+    return pairs
+
+
 def gen_psk() -> str:
     """
     Generate a WG pre shared key (PSK)
+    Same as "wg genpsk" - 32 random bytes.
     """
-    wg = '/usr/bin/wg'
-    pargs = [wg, 'genpsk']
-
-    (ret, psk, errors) = run_prog(pargs)
-    if ret != 0:
-        Msg.err(f'Error generating psk: {errors}')
-        return ''
-    psk = psk.strip()
+    psk = _encode(os.urandom(_KEY_LEN))
     return psk
 
 
+def gen_psks(count: int) -> list[str]:
+    """
+    Generate count PSKs from one batch of random bytes.
+    """
+    psks = [_encode(key) for key in _random_keys(count)]
+    return psks
+
+
 def public_from_private_key(key_prv: str) -> str:
     """
     Extract public key from private key
     """
+    key_bytes = _decode(key_prv)
+    if not key_bytes:
+        Msg.err('Error generating public key: invalid private key\n')
+        return ''
+
+    prv = X25519PrivateKey.from_private_bytes(key_bytes)
+    pub = prv.public_key().public_bytes(Encoding.Raw, PublicFormat.Raw)
+    key_pub = _encode(pub)
+
+    if KeyEngine.wg_check:
+        wg_key_pub = _wg_public_from_private_key(key_prv)
+        if wg_key_pub != key_pub:
+            Msg.err('Error: public key differs from "wg pubkey"\n')
+            Msg.plain(f' {key_pub} vs {wg_key_pub}\n')
+            return ''
+
+    return key_pub
+
+
+def _wg_public_from_private_key(key_prv: str) -> str:
+    """
+    Extract public key from private key using wg
+    """
     wg = '/usr/bin/wg'
     pargs = [wg, 'pubkey']
 
     (ret, key_pub, errors) = run_prog(pargs, input_str=key_prv)
     if ret != 0:
-        Msg.err(f'Error generating psk: {errors}')
+        Msg.err(f'Error running wg pubkey: {errors}')
         return ''
 
     key_pub = key_pub.strip()
 
     return key_pub
+
+
+def _random_keys(count: int) -> list[bytes]:
+    """
+    Split one read of random bytes into count keys.
+    """
+    if count <= 0:
+        return []
+
+    pool = os.urandom(count * _KEY_LEN)
+    keys = [pool[i:i + _KEY_LEN] for i in range(0, len(pool), _KEY_LEN)]
+    return keys
+
+
+def _clamp(key: bytes) -> bytes:
+    """
+    Curve25519 private key clamping (same as wg genkey)
+    """
+    clamped = bytearray(key)
+    clamped[0] &= 248
+    clamped[31] = (clamped[31] & 127) | 64
+    return bytes(clamped)
+
+
+def _encode(key: bytes) -> str:
+    """
+    wireguard key string format
+    """
+    return base64.b64encode(key).decode('ascii')
+
+
+def _decode(key: str) -> bytes:
+    """
+    wireguard key string to bytes.
+    Returns empty bytes if not a valid key.
+    """
+    if not key:
+        return b''
+
+    try:
+        key_bytes = base64.b64decode(key.strip(), validate=True)
+    except (binascii.Error, ValueError):
+        return b''
+
+    if len(key_bytes) != _KEY_LEN:
+        return b''
+    return key_bytes
@@ -3,14 +3,20 @@
 """
 DB Data module
 """
-from .mod_time import (mod_time_now, mod_time_file)
+from .mod_time import (mod_time_now, mod_time_file, mod_time_run)
 from .write_dict import write_dict
 from .write_db_file import write_db_file
+from .digest_index import DigestIndex
+from .history import NewHistory
+from .wg_snapshot import (wg_snapshot_begin, wg_snapshot_commit)
+from .wg_snapshot import (wg_snapshot_abort, wg_snapshot_clean)
+from .wg_snapshot import wg_snapshot_release
 
 from .paths import (get_file_names, get_acct_names)
 from .paths import get_vpninfo_file
 from .paths import get_vpnpsk_file
 from .paths import (get_vpn_names, get_wg_vpn_dir)
+from .paths import get_wg_qr_cache_dir
 from .paths import (get_top_dir, get_top_wg_dir, get_vpn_dir)
 from .paths import get_data_dir
 from .paths import get_db_name
@@ -11,3 +11,4 @@ DATA_DIR: str = 'Data'
 WG_DATA_DIR: str = 'Data-wg'
 DB_DIR: str = '_.db._'
 EDIT_DIR: str = 'Edits'
+QR_CACHE_DIR: str = '_.qr._'
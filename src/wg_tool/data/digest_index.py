@@ -0,0 +1,126 @@
+# SPDX-License-Identifier: GPL-2.0-or-later
+# SPDX-FileCopyrightText: © 2022-present  Gene C <arch@sapience.com>
+"""
+Digest index of files written by write_db_file().
+
+Each directory with history keeps a sidecar file:
+    <topdir>/<db>/digests
+mapping each filename to the digest of its comment cleaned
+content along with the stat (mtime, size, inode) of the file
+at the time. If the stat is unchanged, the stored digest is used
+instead of reading the file and hashing it again.
+Wireguard snapshots keep one index per vpn.
+"""
+import os
+from typing import Any
+
+from utils import Msg
+from utils import dict_to_toml_string
+from utils import read_toml_file
+from utils import write_path_atomic
+
+from .paths import get_db_name
+from .perms import restrict_file_mode
+
+_INDEX_FILE: str = 'digests'
+
+
+class DigestIndex:
+    """
+    Stored digests for the files in one directory.
+
+    verify:
+        When True the stored digests are not used and files
+        are always read and compared. The index is still updated.
+    """
+    verify: bool = False
+    _indexes: dict[str, 'DigestIndex'] = {}
+
+    def __init__(self, path: str):
+        self.path: str = path
+        self.digests: dict[str, dict[str, Any]] = {}
+        self.changed: bool = False
+
+        if os.path.isfile(self.path):
+            self.digests = read_toml_file(self.path)
+
+    @classmethod
+    def get(cls, path: str) -> 'DigestIndex':
+        """
+        Return index saved in file path - read on first use.
+        """
+        index = cls._indexes.get(path)
+        if index is None:
+            index = DigestIndex(path)
+            cls._indexes[path] = index
+        return index
+
+    @classmethod
+    def for_dir(cls, topdir: str) -> 'DigestIndex':
+        """
+        Return index for files in topdir: <topdir>/<db>/digests
+        """
+        return cls.get(os.path.join(topdir, get_db_name(), _INDEX_FILE))
+
+    def lookup(self, filename: str, fstat: os.stat_result, comments: str
+               ) -> str:
+        """
+        Return stored digest of file if its stat is unchanged.
+        Empty if unknown or file changed since.
+        """
+        if DigestIndex.verify:
+            return ''
+
+        item = self.digests.get(filename)
+        if not item or item.get('comments') != comments:
+            return ''
+
+        if (item.get('mtime') != fstat.st_mtime_ns
+                or item.get('size') != fstat.st_size
+                or item.get('ino') != fstat.st_ino):
+            return ''
+        return item.get('digest', '')
+
+    def update(self, filename: str, fstat: os.stat_result, comments: str,
+               digest: str):
+        """
+        Save digest and stat of file.
+        """
+        item = {'digest': digest,
+                'comments': comments,
+                'mtime': fstat.st_mtime_ns,
+                'size': fstat.st_size,
+                'ino': fstat.st_ino,
+                }
+        if self.digests.get(filename) != item:
+            self.digests[filename] = item
+            self.changed = True
+
+    def save(self) -> bool:
+        """
+        Write out index if changed.
+        """
+        if not self.changed:
+            return True
+
+        # directory may since be renamed or removed
+        if not os.path.isdir(os.path.dirname(self.path)):
+            return True
+
+        data = dict_to_toml_string(self.digests)
+        if not write_path_atomic(data, self.path, restrict_file_mode()):
+            Msg.warn(f'Error saving digest index {self.path}\n')
+            return False
+        self.changed = False
+        return True
+
+    @classmethod
+    def save_all(cls) -> bool:
+        """
+        Write out every changed index.
+        """
+        okay = True
+        for index in cls._indexes.values():
+            if not index.save():
+                okay = False
+        return okay
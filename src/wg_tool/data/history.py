@@ -0,0 +1,39 @@
+# SPDX-License-Identifier: GPL-2.0-or-later
+# SPDX-FileCopyrightText: © 2022-present  Gene C <arch@sapience.com>
+"""
+Record of where new history was added in this run.
+
+Cleanup only needs to look at these.
+"""
+
+
+class NewHistory:
+    """
+    Added to as files are written:
+      dirs: directories with a new file in their db history.
+      wg_vpns: vpns with a new wireguard snapshot generation.
+    """
+    # pylint: disable=too-few-public-methods
+    dirs: set[str] = set()
+    wg_vpns: set[str] = set()
+
+    @classmethod
+    def add_dir(cls, topdir: str):
+        """
+        topdir/<db>/ has new history
+        """
+        cls.dirs.add(topdir)
+
+    @classmethod
+    def add_wg_vpn(cls, vpn_name: str):
+        """
+        vpn has a new snapshot generation
+        """
+        cls.wg_vpns.add(vpn_name)
+
+    @classmethod
+    def is_empty(cls) -> bool:
+        """
+        True if nothing was added
+        """
+        return not (cls.dirs or cls.wg_vpns)
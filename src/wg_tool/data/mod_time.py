@@ -23,6 +23,24 @@ def mod_time_now() -> str:
     return mod_time
 
 
+class _RunTime:
+    """
+    Time stamp shared by everything written in one run.
+    """
+    # pylint: disable=too-few-public-methods
+    mod_time: str = ''
+
+
+def mod_time_run() -> str:
+    """
+    Mod time of this run - set on first use.
+    Every file changed in one run lands in the same dated directory.
+    """
+    if not _RunTime.mod_time:
+        _RunTime.mod_time = mod_time_now()
+    return _RunTime.mod_time
+
+
 def mod_time_file(file: str) -> str:
     """
     Mod time from file modification time
@@ -22,6 +22,9 @@ All database Files reside under the top level work-dir:
         <acct-2>/prof-1-gw1.conf, prof-2-gw2.conf, ...
                         ...
 
+    # QR code images cached by content (hash of config sans comments)
+    Data-wg/_.qr._/<vpn-name>/<hash>.png
+
 Wireguard section for each acct and profile has one config
 per profile-gateway.
 E.g. If some vpn has 1 client profile cl1, and 2 gateways gw1 and gw2,
@@ -41,6 +44,8 @@ from utils import make_dir_path
 from ids import Identity
 
 from .constants import (DATA_DIR, WG_DATA_DIR, DB_DIR, EDIT_DIR)
+from .constants import QR_CACHE_DIR
+from .wg_snapshot import wg_snapshot_staging
 
 
 def get_edit_dir(work_dir: str) -> str:
@@ -103,9 +108,23 @@ def get_wg_vpn_dir(work_dir: str, vpn_name: str) -> str:
     work_dir and data_dir must exist (we check in opts.check)
     """
     wg_dir = os.path.join(work_dir, WG_DATA_DIR, vpn_name)
+
+    # configs go to new generation while its being written
+    staging = wg_snapshot_staging(wg_dir)
+    if staging:
+        return staging
     return wg_dir
 
 
+def get_wg_qr_cache_dir(work_dir: str, vpn_name: str) -> str:
+    """
+    Return dir where QR code images are cached by content.
+    Data-wg/_.qr._/<vpn-name>
+    """
+    qr_cache_dir = os.path.join(work_dir, WG_DATA_DIR, QR_CACHE_DIR, vpn_name)
+    return qr_cache_dir
+
+
 def get_acct_names(work_dir: str, vpn_name: str) -> tuple[str, list[str]]:
     """
     Get directory and list of acct names for vpn_name.
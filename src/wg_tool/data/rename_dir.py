@@ -9,6 +9,7 @@ from utils import Msg
 
 from .paths import get_vpn_dir
 from .paths import get_wg_vpn_dir
+from .wg_snapshot import wg_snapshot_rename
 
 
 def _rename_dir(old: str, new: str) -> bool:
@@ -50,6 +51,10 @@ def rename_vpn_dir(work_dir: str, vpn_name: str, vpn_name_new: str) -> bool:
     new_dir = get_wg_vpn_dir(work_dir, vpn_name_new)
     if not _rename_dir(old_dir, new_dir):
         return False
+
+    # Data_wg snapshot generations
+    if not wg_snapshot_rename(work_dir, vpn_name, vpn_name_new):
+        return False
     return True
 
 
@@ -0,0 +1,356 @@
+# SPDX-License-Identifier: GPL-2.0-or-later
+# SPDX-FileCopyrightText: © 2022-present  Gene C <arch@sapience.com>
+"""
+Wireguard snapshots: one generation directory per vpn per run.
+
+    Data-wg/<vpn> -> <db>/<vpn>/<gen>
+
+A run starts a new generation by hard linking every file of the
+current one. Configs and QR codes are then written into the new
+generation (files are always replaced never changed in place).
+At commit, if anything differs, the <vpn> symlink is switched to the
+new generation with one atomic rename. Otherwise it is discarded.
+
+Readers of Data-wg/<vpn> therefore see either the previous or the
+new set of configs, never a mix.
+
+Generations are never changed once current. When snapshots are
+turned off, Data-wg/<vpn> is first made a real directory again
+(a copy of the current generation) - see wg_snapshot_release().
+"""
+import os
+import shutil
+
+from utils import Msg
+from utils import make_dir_path
+
+from .constants import (WG_DATA_DIR, DB_DIR)
+from .mod_time import mod_time_run
+from .history import NewHistory
+
+_INDEX_FILE: str = 'digests'
+
+
+class WgSnapshot:
+    """
+    Generations being written:
+      staging: Data-wg/<vpn> -> new generation dir
+    """
+    # pylint: disable=too-few-public-methods
+    staging: dict[str, str] = {}
+
+
+def get_wg_snapshot_dir(work_dir: str, vpn_name: str) -> str:
+    """
+    Where generations of vpn are kept:
+    Data-wg/<db>/<vpn>
+    """
+    return os.path.join(work_dir, WG_DATA_DIR, DB_DIR, vpn_name)
+
+
+def wg_snapshot_staging(wg_vpn_dir: str) -> str:
+    """
+    Return the generation being written for wg_vpn_dir (or empty)
+    """
+    return WgSnapshot.staging.get(wg_vpn_dir, '')
+
+
+def wg_snapshot_index(fpath: str) -> tuple[str, str]:
+    """
+    If fpath is in a generation being written return
+    (digest index path, key of fpath) otherwise ('', '').
+    Index lives with the generations so it carries over.
+    """
+    for gen_dir in WgSnapshot.staging.values():
+        if fpath.startswith(gen_dir + os.sep):
+            snap_dir = os.path.dirname(gen_dir)
+            key = os.path.relpath(fpath, gen_dir)
+            return (os.path.join(snap_dir, _INDEX_FILE), key)
+    return ('', '')
+
+
+def wg_snapshot_begin(work_dir: str, vpn_name: str) -> bool:
+    """
+    Start new generation for vpn.
+    Populated with hard links to current one.
+    """
+    wg_vpn_dir = os.path.join(work_dir, WG_DATA_DIR, vpn_name)
+    snap_dir = get_wg_snapshot_dir(work_dir, vpn_name)
+
+    gen = mod_time_run()
+    gen_dir = os.path.join(snap_dir, gen)
+    count = 0
+    while os.path.lexists(gen_dir):
+        count += 1
+        gen_dir = os.path.join(snap_dir, f'{gen}.{count}')
+
+    if not make_dir_path(gen_dir):
+        Msg.err(f'Error making snapshot dir {gen_dir}\n')
+        return False
+
+    if os.path.isdir(wg_vpn_dir):
+        if not _link_tree(wg_vpn_dir, gen_dir):
+            shutil.rmtree(gen_dir, ignore_errors=True)
+            return False
+
+    WgSnapshot.staging[wg_vpn_dir] = gen_dir
+    return True
+
+
+def wg_snapshot_commit(work_dir: str, vpn_name: str) -> bool:
+    """
+    Make the new generation current - if it differs from current.
+    """
+    wg_vpn_dir = os.path.join(work_dir, WG_DATA_DIR, vpn_name)
+    gen_dir = WgSnapshot.staging.pop(wg_vpn_dir, '')
+    if not gen_dir:
+        return True
+
+    if os.path.isdir(wg_vpn_dir) and _same_tree(wg_vpn_dir, gen_dir):
+        shutil.rmtree(gen_dir, ignore_errors=True)
+        return True
+
+    #
+    # Older layout is a real directory - move it aside (once).
+    #
+    if os.path.isdir(wg_vpn_dir) and not os.path.islink(wg_vpn_dir):
+        snap_dir = os.path.dirname(gen_dir)
+        saved = os.path.join(snap_dir, os.path.basename(gen_dir) + '.pre')
+        if os.path.lexists(saved):
+            shutil.rmtree(saved, ignore_errors=True)
+        try:
+            os.rename(wg_vpn_dir, saved)
+        except OSError as exc:
+            Msg.err(f'Error moving {wg_vpn_dir} aside: {exc}\n')
+            shutil.rmtree(gen_dir, ignore_errors=True)
+            return False
+
+    #
+    # Switch: Data-wg/<vpn> -> <db>/<vpn>/<gen>
+    #
+    # new generation must be on disk before it becomes current
+    for (dirpath, _dirnames, _filenames) in os.walk(gen_dir):
+        _fsync_dir(dirpath)
+
+    target = os.path.relpath(gen_dir, os.path.dirname(wg_vpn_dir))
+    if not _switch_link(target, wg_vpn_dir):
+        shutil.rmtree(gen_dir, ignore_errors=True)
+        return False
+    _fsync_dir(os.path.dirname(wg_vpn_dir))
+    NewHistory.add_wg_vpn(vpn_name)
+
+    Msg.plainverb(f'  {vpn_name} wireguard generation {target}\n', level=2)
+    return True
+
+
+def wg_snapshot_abort(work_dir: str, vpn_name: str):
+    """
+    Drop generation being written
+    """
+    wg_vpn_dir = os.path.join(work_dir, WG_DATA_DIR, vpn_name)
+    gen_dir = WgSnapshot.staging.pop(wg_vpn_dir, '')
+    if gen_dir:
+        shutil.rmtree(gen_dir, ignore_errors=True)
+
+
+def wg_snapshot_release(work_dir: str, vpn_name: str) -> bool:
+    """
+    Snapshots not used (this run): if Data-wg/<vpn> is a link to
+    a generation, replace it with a real directory holding a copy
+    of that generation so files are written there and not into the
+    generation.
+    """
+    wg_vpn_dir = os.path.join(work_dir, WG_DATA_DIR, vpn_name)
+    if not os.path.islink(wg_vpn_dir):
+        return True
+
+    gen_dir = os.path.realpath(wg_vpn_dir)
+    dir_tmp = wg_vpn_dir + '.dir.tmp'
+    link_saved = wg_vpn_dir + '.link.tmp'
+    try:
+        if os.path.lexists(dir_tmp):
+            shutil.rmtree(dir_tmp)
+        shutil.copytree(gen_dir, dir_tmp, symlinks=True,
+                        ignore=shutil.ignore_patterns('*.tmp'))
+    except OSError as exc:
+        Msg.err(f'Error copying {gen_dir}: {exc}\n')
+        shutil.rmtree(dir_tmp, ignore_errors=True)
+        return False
+
+    for (dirpath, _dirnames, _filenames) in os.walk(dir_tmp):
+        _fsync_dir(dirpath)
+
+    #
+    # a directory cannot replace a link in one rename:
+    # move link aside, put directory in place, drop link
+    #
+    try:
+        os.replace(wg_vpn_dir, link_saved)
+    except OSError as exc:
+        Msg.err(f'Error moving {wg_vpn_dir} aside: {exc}\n')
+        shutil.rmtree(dir_tmp, ignore_errors=True)
+        return False
+
+    try:
+        os.rename(dir_tmp, wg_vpn_dir)
+    except OSError as exc:
+        Msg.err(f'Error replacing {wg_vpn_dir}: {exc}\n')
+        _switch_link(os.readlink(link_saved), wg_vpn_dir)
+        shutil.rmtree(dir_tmp, ignore_errors=True)
+        return False
+
+    try:
+        os.unlink(link_saved)
+    except OSError:
+        pass
+    _fsync_dir(os.path.dirname(wg_vpn_dir))
+
+    gen = os.path.basename(gen_dir)
+    Msg.plainverb(f'  {vpn_name} wireguard generation {gen} released\n',
+                  level=2)
+    return True
+
+
+def wg_snapshot_rename(work_dir: str, vpn_name: str, vpn_name_new: str
+                       ) -> bool:
+    """
+    Vpn renamed: move its generations along and re-point
+    Data-wg/<vpn_name_new> (which is already renamed).
+    """
+    old_dir = get_wg_snapshot_dir(work_dir, vpn_name)
+    new_dir = get_wg_snapshot_dir(work_dir, vpn_name_new)
+    if not os.path.isdir(old_dir):
+        return True
+
+    try:
+        os.rename(old_dir, new_dir)
+    except OSError as exc:
+        Msg.err(f'Error renaming {old_dir}: {exc}\n')
+        return False
+
+    wg_vpn_dir = os.path.join(work_dir, WG_DATA_DIR, vpn_name_new)
+    if not os.path.islink(wg_vpn_dir):
+        return True
+
+    gen = os.path.basename(os.readlink(wg_vpn_dir))
+    target = os.path.relpath(os.path.join(new_dir, gen),
+                             os.path.dirname(wg_vpn_dir))
+    return _switch_link(target, wg_vpn_dir)
+
+
+def _switch_link(target: str, linkname: str) -> bool:
+    """
+    Atomically make (or change) linkname -> target
+    """
+    link_tmp = linkname + '.tmp'
+    try:
+        if os.path.lexists(link_tmp):
+            os.unlink(link_tmp)
+        os.symlink(target, link_tmp)
+        os.replace(link_tmp, linkname)
+    except OSError as exc:
+        Msg.err(f'Error switching {linkname} to {target}: {exc}\n')
+        return False
+    return True
+
+
+def _fsync_dir(dpath: str):
+    """
+    Flush directory entries to disk
+    """
+    try:
+        fd = os.open(dpath, os.O_RDONLY | os.O_DIRECTORY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+
+def _link_tree(src_dir: str, dst_dir: str) -> bool:
+    """
+    Hard link every file in src_dir tree into dst_dir.
+    Symlinked files (older layout) are resolved and
+    history (<db>) directories skipped.
+    """
+    for (dirpath, dirnames, filenames) in os.walk(src_dir):
+        if DB_DIR in dirnames:
+            dirnames.remove(DB_DIR)
+
+        rel = os.path.relpath(dirpath, src_dir)
+        targ_dir = os.path.normpath(os.path.join(dst_dir, rel))
+        if not make_dir_path(targ_dir):
+            Msg.err(f'Error making {targ_dir}\n')
+            return False
+
+        for filename in filenames:
+            if filename.endswith('.tmp'):
+                continue
+            src = os.path.realpath(os.path.join(dirpath, filename))
+            dst = os.path.join(targ_dir, filename)
+            try:
+                os.link(src, dst)
+            except OSError:
+                try:
+                    shutil.copy2(src, dst)
+                except OSError as exc:
+                    Msg.err(f'Error copying {src}: {exc}\n')
+                    return False
+    return True
+
+
+def _same_tree(dir1: str, dir2: str) -> bool:
+    """
+    True if both trees have same files using same inodes.
+    i.e. nothing in dir2 (made by _link_tree) was changed.
+    """
+    return _tree_inodes(dir1) == _tree_inodes(dir2)
+
+
+def _tree_inodes(topdir: str) -> dict[str, int]:
+    """
+    map relative path -> inode for every file in tree
+    """
+    inodes: dict[str, int] = {}
+    for (dirpath, dirnames, filenames) in os.walk(topdir):
+        if DB_DIR in dirnames:
+            dirnames.remove(DB_DIR)
+        for filename in filenames:
+            if filename.endswith('.tmp'):
+                continue
+            path = os.path.join(dirpath, filename)
+            try:
+                inode = os.stat(path).st_ino
+            except OSError:
+                continue
+            inodes[os.path.relpath(path, topdir)] = inode
+    return inodes
+
+
+def wg_snapshot_clean(work_dir: str, vpn_name: str, num_keep: int):
+    """
+    Keep the current generation plus num_keep previous ones.
+    """
+    wg_vpn_dir = os.path.join(work_dir, WG_DATA_DIR, vpn_name)
+    snap_dir = get_wg_snapshot_dir(work_dir, vpn_name)
+    if not os.path.isdir(snap_dir):
+        return
+
+    current = ''
+    if os.path.islink(wg_vpn_dir):
+        current = os.path.basename(os.path.realpath(wg_vpn_dir))
+
+    gens: list[str] = []
+    with os.scandir(snap_dir) as scan:
+        for item in scan:
+            if item.is_dir(follow_symlinks=False) and item.name != current:
+                gens.append(item.name)
+
+    gens.sort(reverse=True)
+    for gen in gens[num_keep:]:
+        gen_dir = os.path.join(snap_dir, gen)
+        Msg.plainverb(f'  Removing generation {gen_dir}\n', level=3)
+        shutil.rmtree(gen_dir, ignore_errors=True)
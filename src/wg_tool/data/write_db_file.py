@@ -3,6 +3,8 @@
 """
 File writer that keeps history
 """
+from functools import partial
+from typing import Callable
 import os
 # import stat
 
@@ -13,10 +15,14 @@ from utils import open_file
 from utils import make_dir_path
 from utils import file_symlink
 from utils import write_path_atomic
+from utils import WriteBatch
 from utils import clean_comments
 
+from .digest_index import DigestIndex
+from .history import NewHistory
 from .paths import get_db_name
-from .mod_time import mod_time_now
+from .mod_time import mod_time_run
+from .wg_snapshot import wg_snapshot_index
 from .perms import restrict_file_mode
 
 
@@ -61,13 +67,51 @@ def write_db_file(data: str,
     if ok_comments is not None:
         good_comments = ok_comments
 
-    same = _same_content(fpath, data, good_comments)
-    if same:
-        return (True, False)
-
     topdir = os.path.dirname(fpath)
     filename = os.path.basename(fpath)
 
+    #
+    # digest of what we have. If file unchanged since we
+    # last wrote/checked it, the index has its digest.
+    #
+    clean_data = clean_comments(data, ok_comments=good_comments)
+    clean_digest = message_digest(clean_data.encode('utf-8')).hex()
+    comments = ','.join(good_comments)
+
+    (index_path, key) = wg_snapshot_index(fpath)
+    if index_path:
+        index = DigestIndex.get(index_path)
+    else:
+        index = DigestIndex.for_dir(topdir)
+        key = filename
+
+    fstat = _stat(fpath)
+    if fstat:
+        file_digest = index.lookup(key, fstat, comments)
+        if not file_digest:
+            file_digest = _file_digest(fpath, good_comments)
+            if file_digest:
+                index.update(key, fstat, comments, file_digest)
+        if file_digest == clean_digest:
+            return (True, False)
+
+    if fmode < 0:
+        fmode = restrict_file_mode()
+
+    # file is in place once any batch is committed
+    update = partial(_index_update, index, key, fpath, comments,
+                     clean_digest)
+
+    #
+    # snapshot generation: the generation is the history
+    #
+    if index_path:
+        if not write_path_atomic(data, fpath, fmode):
+            Msg.err(f'Error writing {fpath}\n')
+            return (False, False)
+        _after_commit(update)
+        return (True, True)
+
     if not make_dir_path(topdir):
         Msg.err(f'Error making directory: {topdir}\n')
         return (False, False)
@@ -78,7 +122,7 @@ def write_db_file(data: str,
         Msg.err(f'Error making directory: {db_topdir}\n')
         return (False, False)
 
-    mod_time = mod_time_now()
+    mod_time = mod_time_run()
     db_dir = os.path.join(db_topdir, mod_time)
     db_file = os.path.join(db_dir, filename)
 
@@ -86,9 +130,6 @@ def write_db_file(data: str,
 
     # write data
     # fmode = stat.S_IRUSR | stat.S_IWUSR | stat.S_IRGRP
-    if fmode < 0:
-        fmode = restrict_file_mode()
-
     if not write_path_atomic(data, db_file, fmode):
         Msg.err(f'Error writing {db_file}\n')
         return (False, False)
@@ -97,36 +138,58 @@ def write_db_file(data: str,
     if not file_symlink(link_target, fpath):
         Msg.err(f'Error making symlink : {fpath} -> {link_target}\n')
         return (False, False)
+    NewHistory.add_dir(topdir)
+
+    _after_commit(update)
     return (True, True)
 
 
-def _same_content(fpath: str, data: str, ok_comments: list[str]) -> bool:
+def _after_commit(func: Callable[[], None]):
+    """
+    Call func now or, if writes are batched, once they are committed.
+    """
+    if WriteBatch.active:
+        WriteBatch.after_commit(func)
+    else:
+        func()
+
+
+def _index_update(index: DigestIndex, key: str, fpath: str, comments: str,
+                  digest: str):
     """
-    Determins if fpath and data have some content
+    Save digest of newly written fpath
     """
-    if not fpath or not os.path.exists(fpath):
-        return False
+    fstat = _stat(fpath)
+    if fstat:
+        index.update(key, fstat, comments, digest)
+
+
+def _stat(fpath: str) -> os.stat_result | None:
+    """
+    Stat of file (following symlink) or None if not there.
+    """
+    if not fpath:
+        return None
+    try:
+        return os.stat(fpath)
+    except OSError:
+        return None
+
 
+def _file_digest(fpath: str, ok_comments: list[str]) -> str:
+    """
+    Digest (hex) of fpath content without comments.
+    Empty if file missing, unreadable or empty.
+    """
     fob = open_file(fpath, 'r')
     if not fob:
-        return False
+        return ''
 
     file_data = fob.read()
     fob.close()
     if not file_data:
-        return False
+        return ''
 
     file_data = clean_comments(file_data, ok_comments=ok_comments)
-    clean_data = clean_comments(data, ok_comments=ok_comments)
-
-    if len(clean_data) != len(file_data):
-        return False
-
-    # check data is same
-    file_data_hash = message_digest(file_data.encode('utf-8'))
-    clean_data_hash = message_digest(clean_data.encode('utf-8'))
-
-    if file_data_hash == clean_data_hash:
-        return True
-
-    return False
+    file_digest = message_digest(file_data.encode('utf-8')).hex()
+    return file_digest
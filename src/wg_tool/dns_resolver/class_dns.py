@@ -2,18 +2,59 @@
 # SPDX-FileCopyrightText: © 2023-present  Gene C <arch@sapience.com>
 """
 DNS tools
+
+A and AAAA answers are kept (with their expiry time) and, if
+cache_file is set, saved for the next run. While an answer is
+current no query is made. If a query fails (e.g. offline) an
+expired answer is used instead, and that host / type is not
+queried again for the rest of the run.
 """
 # pylint: disable=too-few-public-methods
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any
+import time
+
 import dns.resolver
 
+from utils import Msg
+from utils import dict_to_toml_string
+from utils import read_toml_file
+from utils import write_path_atomic
+
+# how long to keep "no such name" answers (secs)
+_NEGATIVE_TTL: int = 300
+
+# expired answers are kept this long for use when offline (secs)
+_STALE_KEEP: int = 7 * 86400
+
 
 class Dns():
     """
     DNS using default stub resolver.
+
+    cache_file:
+        Where answers are saved between runs (empty means not saved).
+
+    refresh:
+        When True saved answers are not used (they are replaced).
     """
     _resolver: dns.resolver.Resolver
     _initialized: bool = False
 
+    cache_file: str = ''
+    refresh: bool = False
+
+    # 'rr_type host' -> {'ips': list[str], 'expires': int}
+    _answers: dict[str, dict[str, Any]] = {}
+    _loaded: bool = False
+    _changed: bool = False
+
+    # hosts with an answer different from the saved one (this run)
+    _hosts_changed: set[str] = set()
+
+    # 'rr_type host' which got no answer (this run) - not asked again
+    _failed: set[str] = set()
+
     @staticmethod
     def initialize(servers: list[str] | None = None,
                    port: int = 53,
@@ -45,18 +86,131 @@ class Dns():
 
         Args:
             rr_type (str):
-                'A' or 'PTR'
+                'A', 'AAAA' or 'PTR'
         Returns:
             list[str]:
                 query result as list.
         """
+        if not query:
+            return []
+
+        if rr_type == 'PTR':
+            (_found, rrs, _ttl) = Dns._resolve(query, rr_type)
+            return rrs
+
+        Dns._load()
+        key = f'{rr_type} {query}'
+        now = int(time.time())
+        answer = Dns._answers.get(key)
+        if answer and answer.get('expires', 0) > now:
+            return list(answer.get('ips', []))
+
+        if key not in Dns._failed:
+            (found, rrs, ttl) = Dns._resolve(query, rr_type)
+        else:
+            # no answer earlier this run - dont wait again
+            (found, rrs, ttl) = (None, [], 0)
+
+        if found is None:
+            # no answer from resolver - use what we had
+            Dns._failed.add(key)
+            if answer:
+                return list(answer.get('ips', []))
+            return rrs
+
+        if answer is None or sorted(answer.get('ips', [])) != sorted(rrs):
+            Dns._hosts_changed.add(query)
+        Dns._answers[key] = {'ips': rrs, 'expires': now + ttl}
+        Dns._changed = True
+        return rrs
+
+    @staticmethod
+    def is_changed(host: str) -> bool:
+        """
+        True if a query this run gave host a different answer
+        than the saved one (or there was none saved).
+        i.e. configs using host may now need different IPs.
+        """
+        return host in Dns._hosts_changed
+
+    @staticmethod
+    def prefetch(hosts: list[str], rr_types: tuple[str, ...], jobs: int = 1):
+        """
+        Resolve hosts (those not already known) concurrently so
+        later query() calls are answered without waiting.
+        """
+        Dns._load()
+        now = int(time.time())
+        todo: list[tuple[str, str]] = []
+        for host in dict.fromkeys(hosts):
+            for rr_type in rr_types:
+                key = f'{rr_type} {host}'
+                if key in Dns._failed:
+                    continue
+                answer = Dns._answers.get(key)
+                if not answer or answer.get('expires', 0) <= now:
+                    todo.append((host, rr_type))
+
+        if not todo:
+            return
+
+        # resolver setup is not thread safe
+        Dns.initialize()
+
+        if jobs > 1 and len(todo) > 1:
+            with ThreadPoolExecutor(max_workers=jobs) as pool:
+                list(pool.map(lambda item: Dns.query(*item), todo))
+        else:
+            for (host, rr_type) in todo:
+                Dns.query(host, rr_type)
+
+    @staticmethod
+    def save_cache() -> bool:
+        """
+        Save answers to cache_file if changed.
+        Those expired for a long time are dropped.
+        """
+        if not (Dns.cache_file and Dns._changed):
+            return True
+
+        oldest = int(time.time()) - _STALE_KEEP
+        answers = {key: answer for (key, answer) in Dns._answers.items()
+                   if answer.get('expires', 0) > oldest}
+        data = dict_to_toml_string(answers)
+        if not data:
+            data = '\n'
+        if not write_path_atomic(data, Dns.cache_file):
+            Msg.warn(f'Error saving dns cache {Dns.cache_file}\n')
+            return False
+        Dns._changed = False
+        return True
+
+    @staticmethod
+    def _load():
+        """
+        Read saved answers (once)
+        """
+        if Dns._loaded:
+            return
+        Dns._loaded = True
+        if Dns.cache_file and not Dns.refresh:
+            Dns._answers = read_toml_file(Dns.cache_file)
+
+    @staticmethod
+    def _resolve(query: str, rr_type: str
+                 ) -> tuple[bool | None, list[str], int]:
+        """
+        Ask the resolver.
+
+        Returns:
+            (found, records, ttl)
+            found is None if there was no answer (timeout etc),
+            False if the name or record does not exist.
+        """
         rrs: list[str] = []
         if not Dns._initialized:
             Dns.initialize()
 
-        if not query:
-            return rrs
-
         # Do the query
         resolver = Dns._resolver
         try:
@@ -65,12 +219,17 @@ class Dns():
             else:
                 res = resolver.resolve(query, rr_type)
 
+        except (dns.resolver.NXDOMAIN, dns.resolver.NoAnswer):
+            return (False, rrs, _NEGATIVE_TTL)
+
         except dns.exception.DNSException:
-            return rrs
+            return (None, rrs, 0)
 
         # get result as text strings
         for rdata in res:
             record = rdata.to_text()
             if record != '0.0.0.0':
                 rrs.append(record)
-        return rrs
+
+        ttl = res.rrset.ttl if res.rrset is not None else _NEGATIVE_TTL
+        return (True, rrs, ttl)
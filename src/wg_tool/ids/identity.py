@@ -9,6 +9,7 @@ Name space by conbstruction is unique
 import uuid
 
 from utils import Msg
+from utils import (fields_to_dict, is_field)
 from utils.debug import pprint
 from data.constants import DB_DIR
 
@@ -40,6 +41,8 @@ class Identity:
 
     tag is globally unique.
     """
+    __slots__ = ('id_str', 'vpn_name', 'acct_name', 'prof_name', 'tag')
+
     def __init__(self):
         self.id_str: str = ''
         self.vpn_name: str = ''
@@ -86,14 +89,18 @@ class Identity:
         """
         Map self to a dictionary
         """
-        attribs: dict[str, str] = vars(self).copy()
+        attribs: dict[str, str] = fields_to_dict(self)
         return attribs
 
     def from_dict(self, attribs: dict[str, str]):
         """
         Map dictionary to attribs
+         - unknown keys are ignored
         """
         for (k, v) in attribs.items():
+            if not is_field(self, k):
+                Msg.warn(f'Identity: ignoring unknown key {k}\n')
+                continue
             setattr(self, k, v)
 
     def new_tag(self):
@@ -13,3 +13,8 @@ from .tools import internet_networks
 from .tools import cidr_in_cidrs
 
 from .shared import NetsShared
+
+from .cidr_cache import cidr_net
+from .cidr_cache import cidr_type
+from .cidr_cache import cidrs_compact
+from .cidr_cache import cidr_cache_report
@@ -0,0 +1,287 @@
+# SPDX-License-Identifier: GPL-2.0-or-later
+# SPDX-FileCopyrightText: © 2022-present  Gene C <arch@sapience.com>
+"""
+Address allocators.
+
+Keep track of which addresses in a network are still available.
+Addresses are handled as integers, ranges are inclusive [first, last].
+
+Two backends:
+  - AllocRanges: sorted list of free ranges (bisect).
+    Works for any size network, IPv4 or IPv6.
+  - AllocBitmap: one byte per address.
+    Used for IPv4 networks up to /16 (at most 64k addresses).
+
+Use new_allocator() to get the one suited to a network.
+"""
+from bisect import bisect_right
+import ipaddress
+
+from utils import Msg
+from utils.debug import pprint
+
+# largest network (fewest prefix bits) to use the bitmap for.
+_BITMAP_MIN_PREFIX: int = 16
+
+type _Net = ipaddress.IPv4Network | ipaddress.IPv6Network
+
+
+class AllocRanges:
+    """
+    Free addresses kept as sorted, non overlapping, ranges.
+    _firsts[i] and _lasts[i] are the first and last address
+    of the i-th free range.
+    """
+    def __init__(self, first: int, last: int):
+        self.first: int = first
+        self.last: int = last
+        self._firsts: list[int] = [first]
+        self._lasts: list[int] = [last]
+
+    def _find(self, first: int, last: int) -> int:
+        """
+        Return index of free range holding all of [first, last]
+        or -1 if not all free.
+        """
+        idx = bisect_right(self._firsts, first) - 1
+        if idx < 0 or self._lasts[idx] < last:
+            return -1
+        return idx
+
+    def is_free(self, first: int, last: int) -> bool:
+        """
+        Return True if every address in [first, last] is available.
+        """
+        return self._find(first, last) >= 0
+
+    def take(self, first: int, last: int) -> bool:
+        """
+        Mark [first, last] taken.
+        Returns False if any part of it is not available.
+        """
+        idx = self._find(first, last)
+        if idx < 0:
+            return False
+
+        range_first = self._firsts[idx]
+        range_last = self._lasts[idx]
+        del self._firsts[idx]
+        del self._lasts[idx]
+
+        if last < range_last:
+            self._firsts.insert(idx, last + 1)
+            self._lasts.insert(idx, range_last)
+
+        if range_first < first:
+            self._firsts.insert(idx, range_first)
+            self._lasts.insert(idx, first - 1)
+        return True
+
+    def give(self, first: int, last: int):
+        """
+        Mark [first, last] available.
+        Caller ensures none of it is currently available.
+        """
+        idx = bisect_right(self._firsts, first)
+        self._firsts.insert(idx, first)
+        self._lasts.insert(idx, last)
+
+        # merge with neighbours
+        if idx + 1 < len(self._firsts) and self._firsts[idx + 1] == last + 1:
+            self._lasts[idx] = self._lasts[idx + 1]
+            del self._firsts[idx + 1]
+            del self._lasts[idx + 1]
+
+        if idx > 0 and self._lasts[idx - 1] + 1 == first:
+            self._lasts[idx - 1] = self._lasts[idx]
+            del self._firsts[idx]
+            del self._lasts[idx]
+
+    def next_free(self) -> int | None:
+        """
+        Lowest available address or None if full
+        """
+        if not self._firsts:
+            return None
+        return self._firsts[0]
+
+    def take_next(self, count: int) -> list[int]:
+        """
+        Mark the lowest count available addresses taken.
+        Returns list of them or empty list if not enough available.
+        """
+        if count <= 0 or self.num_free() < count:
+            return []
+
+        nums: list[int] = []
+        while len(nums) < count:
+            first = self._firsts[0]
+            last = min(self._lasts[0], first + count - len(nums) - 1)
+            nums.extend(range(first, last + 1))
+            if last == self._lasts[0]:
+                del self._firsts[0]
+                del self._lasts[0]
+            else:
+                self._firsts[0] = last + 1
+        return nums
+
+    def num_free(self) -> int:
+        """
+        Number of available addresses
+        """
+        return sum(self._lasts) - sum(self._firsts) + len(self._firsts)
+
+    def free_ranges(self) -> list[tuple[int, int]]:
+        """
+        List of available [first, last] ranges.
+        """
+        return list(zip(self._firsts, self._lasts))
+
+    def pprint(self, recurs: bool = False):
+        """
+        Debug tool: Print myself (no dunders)
+        """
+        pprint(self, recurs=recurs)
+
+
+class AllocBitmap:
+    """
+    Free addresses kept as one byte per address: 0 free, 1 taken.
+    _low is a lower bound on the first free address.
+    """
+    def __init__(self, first: int, last: int):
+        self.first: int = first
+        self.last: int = last
+        self._taken: bytearray = bytearray(last - first + 1)
+        self._low: int = 0
+
+    def _offsets(self, first: int, last: int) -> tuple[int, int]:
+        """
+        Map [first, last] to offsets [beg, end) or (-1, -1) if outside.
+        """
+        if first < self.first or last > self.last or first > last:
+            return (-1, -1)
+        return (first - self.first, last - self.first + 1)
+
+    def is_free(self, first: int, last: int) -> bool:
+        """
+        Return True if every address in [first, last] is available.
+        """
+        (beg, end) = self._offsets(first, last)
+        if beg < 0:
+            return False
+        return self._taken.find(1, beg, end) < 0
+
+    def take(self, first: int, last: int) -> bool:
+        """
+        Mark [first, last] taken.
+        Returns False if any part of it is not available.
+        """
+        (beg, end) = self._offsets(first, last)
+        if beg < 0 or self._taken.find(1, beg, end) >= 0:
+            return False
+
+        self._taken[beg:end] = b'\x01' * (end - beg)
+        return True
+
+    def give(self, first: int, last: int):
+        """
+        Mark [first, last] available.
+        """
+        (beg, end) = self._offsets(first, last)
+        if beg < 0:
+            return
+        self._taken[beg:end] = bytes(end - beg)
+        self._low = min(self._low, beg)
+
+    def next_free(self) -> int | None:
+        """
+        Lowest available address or None if full
+        """
+        offset = self._taken.find(0, self._low)
+        if offset < 0:
+            self._low = len(self._taken)
+            return None
+        self._low = offset
+        return self.first + offset
+
+    def take_next(self, count: int) -> list[int]:
+        """
+        Mark the lowest count available addresses taken.
+        Returns list of them or empty list if not enough available.
+        """
+        if count <= 0 or self.num_free() < count:
+            return []
+
+        taken = self._taken
+        nums: list[int] = []
+        offset = self._low
+        while len(nums) < count:
+            offset = taken.find(0, offset)
+            taken[offset] = 1
+            nums.append(self.first + offset)
+            offset += 1
+        self._low = offset
+        return nums
+
+    def num_free(self) -> int:
+        """
+        Number of available addresses
+        """
+        return self._taken.count(0)
+
+    def free_ranges(self) -> list[tuple[int, int]]:
+        """
+        List of available [first, last] ranges.
+        """
+        ranges: list[tuple[int, int]] = []
+        taken = self._taken
+        beg = taken.find(0)
+        while beg >= 0:
+            end = taken.find(1, beg)
+            if end < 0:
+                end = len(taken)
+            ranges.append((self.first + beg, self.first + end - 1))
+            beg = taken.find(0, end)
+        return ranges
+
+    def pprint(self, recurs: bool = False):
+        """
+        Debug tool: Print summary (bitmap too big to print)
+        """
+        Msg.info(f'{self.__class__.__name__} instance:\n')
+        Msg.plain(f'{"range":>15s}: {self.first} - {self.last}\n')
+        Msg.plain(f'{"free":>15s}: {self.num_free()}\n')
+
+
+type Allocator = AllocRanges | AllocBitmap
+
+
+def new_allocator(net: _Net) -> Allocator:
+    """
+    Return allocator with every address in net available.
+    IPv4 networks of /16 or smaller use a bitmap.
+    """
+    first = int(net.network_address)
+    last = int(net.broadcast_address)
+
+    if net.version == 4 and net.prefixlen >= _BITMAP_MIN_PREFIX:
+        return AllocBitmap(first, last)
+    return AllocRanges(first, last)
+
+
+def resize_allocator(alloc: Allocator, net: _Net) -> Allocator:
+    """
+    Return allocator for (super) network net keeping
+    what is taken in the current one.
+    Addresses in net but not covered by alloc are available.
+    """
+    new_alloc = new_allocator(net)
+
+    # take everything that alloc covers then give back its free
+    if not new_alloc.take(alloc.first, alloc.last):
+        return alloc
+
+    for (first, last) in alloc.free_ranges():
+        new_alloc.give(first, last)
+    return new_alloc
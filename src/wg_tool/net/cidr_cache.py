@@ -0,0 +1,77 @@
+# SPDX-License-Identifier: GPL-2.0-or-later
+# SPDX-FileCopyrightText: © 2022-present  Gene C <arch@sapience.com>
+"""
+Cached CIDR parsing.
+
+The same cidr strings (vpn networks, profile addresses, shared nets)
+are parsed many times each run. Results are kept (keyed by string)
+in bounded LRU caches shared by the whole process, so each distinct
+string is parsed once and every caller gets the same network object.
+Network objects are immutable so sharing them is safe.
+
+Hits and misses are reported (-vv) by cidr_cache_report().
+"""
+from functools import lru_cache
+
+from py_cidr import Cidr
+from py_cidr import IPvxNetwork
+
+from utils import Msg
+
+# Most distinct strings kept in each cache
+_CACHE_SIZE: int = 4096
+
+
+@lru_cache(maxsize=_CACHE_SIZE)
+def cidr_net(cidr: str) -> IPvxNetwork | None:
+    """
+    Network of cidr (host bits allowed) or None if not valid.
+    """
+    if not cidr:
+        return None
+    return Cidr.cidr_to_net(cidr)
+
+
+@lru_cache(maxsize=_CACHE_SIZE)
+def cidr_type(cidr: str) -> str | None:
+    """
+    iptype ('ip4' or 'ip6') of cidr or None if not valid.
+    """
+    if not cidr:
+        return None
+    return Cidr.cidr_iptype(cidr)
+
+
+def cidrs_compact(cidrs: list[str]) -> tuple[list[str], list[str]]:
+    """
+    Returns (sorted unique cidrs, compacted cidrs)
+    """
+    (sorted_cidrs, compact) = _cidrs_compact(frozenset(cidrs))
+    return (list(sorted_cidrs), list(compact))
+
+
+@lru_cache(maxsize=_CACHE_SIZE)
+def _cidrs_compact(cidrs: frozenset[str]
+                   ) -> tuple[tuple[str, ...], tuple[str, ...]]:
+    """
+    Sort and compact (AllowedIPs) - many peers share the same list.
+    """
+    sorted_cidrs = Cidr.sort_cidrs(list(cidrs))
+    compact = Cidr.compact(sorted_cidrs)
+    return (tuple(sorted_cidrs), tuple(compact))
+
+
+def cidr_cache_report():
+    """
+    Show cache hits/misses (-vv)
+    """
+    caches = (('net', cidr_net), ('iptype', cidr_type),
+              ('compact', _cidrs_compact))
+    for (name, func) in caches:
+        info = func.cache_info()
+        total = info.hits + info.misses
+        if total <= 0:
+            continue
+        rate = 100 * info.hits / total
+        txt = f'cidr {name} cache: {info.hits}/{total} hits ({rate:.1f}%)'
+        Msg.plainverb(f'  {txt}\n', level=2)
@@ -12,6 +12,9 @@ from py_cidr import (Cidr, IPAddress, IPvxNetwork)
 from utils import Msg
 from utils.debug import pprint
 
+from .allocator import (Allocator, new_allocator, resize_allocator)
+from .cidr_cache import (cidr_net, cidr_type)
+
 
 class NetWork:
     """
@@ -43,26 +46,23 @@ class NetWork:
            x.x.x.0
            x.x.x.255
 
-        The list of available network ips is always generated at load
+        The available network ips are always generated at load
         time by removing all the IPs used by peers (gateways and clients).
+        These are tracked by an allocator (see allocator.py) which
+        holds the available addresses as integers.
 
         This way we are sure the list is correct. It also means we can
         check there are no duplicate IPs coming from files.
 
         VpnInfo is created whenever a vpn with unique name is created.
         The data is stored on disk (work-dir/data/gateways/<vpn-name>/Vpn.info
-
-        net_avail is really list(ip4) | list(ip6) since its one or the other.
-        this seems to make being consistent w pep-484 create
-        inappropriate contortions.  such as unnecessary checks if ip4/ip6
-        when we've already checked via iptype.
         """
         self.okay: bool = True
 
         self.net_str: str = ''
         self.net: IPvxNetwork
         self.iptype: str = ''
-        self.net_avail: list[IPvxNetwork] = []
+        self.avail: Allocator
 
         self.prefixlen: dict[str, int] = {'ip4': 32, 'ip6': 128}
 
@@ -75,13 +75,18 @@ class NetWork:
         """
         if self.net_in_ip(net_str):
             # cidr is supernet of net
-            new_net = Cidr.cidr_to_net(net_str)
+            new_net = cidr_net(net_str)
             if not new_net:
                 Msg.err(f'Error with VPN network address {net_str}')
                 self.okay = False
                 return False
             self.net_str = net_str
             self.net = new_net
+
+            # new addresses are available apart from network/broadcast
+            self.avail = resize_allocator(self.avail, new_net)
+            for addr in (new_net.network_address, new_net.broadcast_address):
+                self.avail.take(int(addr), int(addr))
             return True
 
         return False
@@ -96,7 +101,7 @@ class NetWork:
             self.okay = False
             return False
 
-        net = Cidr.cidr_to_net(net_str)
+        net = cidr_net(net_str)
         if net:
             self.net_str = net_str
             self.net = net
@@ -108,12 +113,10 @@ class NetWork:
         self.iptype = Cidr.address_iptype(self.net)
 
         #
-        # net_avail is list of nets with available IP addresses
-        #  - remove network and broadcast addresses
-        #  - net_avail.hosts() takes care of not
-        #    using network / broadcast IPs
+        # Start with every address available
+        #  - then remove network and broadcast addresses
         #
-        self.net_avail = [net]
+        self.avail = new_allocator(net)
 
         #
         # mark network / broadcast unavailable
@@ -158,8 +161,8 @@ class NetWork:
             e.g. x.x.x.10/32
 
         can be ip/cidr string, or IPvxNetwork or IPAddress
-        If address in ip_avail remove it
-           return true if removed else false
+        If all of address is available mark it taken
+           return true if marked else false
         """
         #
         # Validation
@@ -180,19 +183,9 @@ class NetWork:
             Msg.warn(f'Note: cannot mark {address} taken: {txt}\n')
             return False
 
-        changed = False
-        avail: list[IPvxNetwork] = []
-        for net in self.net_avail:
-            if Cidr.net_is_subnet(addr, net):
-                changed = True
-                net_chg = net.address_exclude(addr)  # type: ignore[arg-type]
-                if net_chg is not None:
-                    avail += list(net_chg)
-            else:
-                avail.append(net)
-        if changed:
-            self.net_avail = Cidr.sort_nets(avail)
-        else:
+        first = int(addr.network_address)
+        last = int(addr.broadcast_address)
+        if not self.avail.take(first, last):
             Msg.err(f'Error: IP {address} already used\n')
             return False
         return True
@@ -204,30 +197,49 @@ class NetWork:
         Returns
             One available IP Network (with prefix)
         """
-        ipnet: IPvxNetwork
-
         prefix = self.prefixlen[self.iptype]
         if prefix <= 0:
             return None
 
-        # find
-        found = False
-        for net in self.net_avail:
-            net_prefix = net.prefixlen
-            if prefix >= net_prefix:
-                # pull of the first (aka network) address
-                ipa = net.network_address
-                ipnet = ipaddress.ip_network(ipa)  # type: ignore[arg-type]
-                found = True
-                break
-
-        # remove found from available
-        if found:
-            if mark_unavail:
-                self.mark_address_taken(ipnet)
-            return ipnet
-        Msg.err(f'Failed to find available net {self.iptype} / {prefix}\n')
-        return None
+        # lowest available address
+        num = self.avail.next_free()
+        if num is None:
+            txt = f'{self.iptype} / {prefix}'
+            Msg.err(f'Failed to find available net {txt}\n')
+            return None
+
+        ipnet = self._num_to_net(num)
+        if mark_unavail:
+            self.avail.take(num, num)
+        return ipnet
+
+    def find_new_addresses(self, count: int) -> list[IPvxNetwork]:
+        """
+        Find and mark taken count available addresses.
+        Addresses are the lowest available ones and so are
+        contiguous where possible.
+        Returns
+            list of IP Network (with prefix) or empty list if
+            not enough addresses are available.
+        """
+        nums = self.avail.take_next(count)
+        if len(nums) < count:
+            txt = f'{count} addresses in {self.net_str}'
+            Msg.err(f'Failed to find {txt}\n')
+            return []
+        return [self._num_to_net(num) for num in nums]
+
+    def _num_to_net(self, num: int) -> IPvxNetwork:
+        """
+        Integer address to single address network (/32 or /128)
+        """
+        ipa: IPAddress
+        if self.iptype == 'ip6':
+            ipa = ipaddress.IPv6Address(num)
+        else:
+            ipa = ipaddress.IPv4Address(num)
+        ipnet = ipaddress.ip_network(ipa)
+        return ipnet
 
     def ip_in_net(self, ip: str) -> bool:
         """
@@ -239,12 +251,12 @@ class NetWork:
         if not ip:
             return False
 
-        addr = Cidr.cidr_to_net(ip)
+        addr = cidr_net(ip)
         if not addr:
             return False
 
         # Check is valid and same as our IP type (v4 or v6)
-        ipt = Cidr.address_iptype(addr)
+        ipt = cidr_type(ip)
         if ipt != self.iptype:
             return False
 
@@ -260,12 +272,12 @@ class NetWork:
             return False
 
         # check is valid and same IP type as us
-        addr = Cidr.cidr_to_net(cidr)
+        addr = cidr_net(cidr)
         if not addr:
             return False
 
         # ipt = Cidr.address_iptype(addr)
-        ipt = Cidr.cidr_iptype(cidr)
+        ipt = cidr_type(cidr)
         if ipt != self.iptype:
             return False
 
@@ -280,16 +292,16 @@ class NetWork:
         if not ip:
             return False
 
-        avail = True
-        addr = Cidr.cidr_to_net(ip)
+        if not self.ip_in_net(ip):
+            return False
+
+        addr = cidr_net(ip)
         if not addr:
             return False
 
-        for net in self.net_avail:
-            if addr.subnet_of(net):   # type: ignore[arg-type]
-                avail = True
-                break
-        return avail
+        first = int(addr.network_address)
+        last = int(addr.broadcast_address)
+        return self.avail.is_free(first, last)
 
     def addr_to_wg_addr(self, ip: str) -> str:
         """
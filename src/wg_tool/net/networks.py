@@ -4,11 +4,12 @@
 Collection of networks
 Deals with sub/supersets
 """
-
 from utils import Msg
 from utils.debug import pprint
 
+from .cidr_cache import cidr_net
 from .network import NetWork
+from .prefix_trie import PrefixTrie
 
 
 class NetWorks:
@@ -20,6 +21,10 @@ class NetWorks:
         self.okay: bool = True
         self.nets: dict[str, NetWork] = {}
 
+        # networks by prefix - built when needed, None if out of date
+        self._trie: PrefixTrie | None = None
+        self._trie_nets: list[NetWork] = []
+
     def addr_to_wg_addr(self, addr: str) -> str:
         """
         Return the "wireguard" address from cidr.
@@ -82,32 +87,75 @@ class NetWorks:
         """
         Return NetWork net_str belongs to or None.
         """
-        for (_cidr, network) in self.nets.items():
-            if network.ip_in_net(net_str):
-                return network
-        return None
+        found = self._networks_containing(net_str)
+        if not found:
+            return None
+        return found[0]
 
     def ip_is_subnet(self, cidr: str) -> bool:
         """
         Return True if cidr is in any network.
         """
-        for (_cidr, network) in self.nets.items():
-            if network.ip_in_net(cidr):
-                return True
+        if self._networks_containing(cidr):
+            return True
         return False
 
-    def find_new_addresses(self) -> list[str]:
+    def _networks_containing(self, net_str: str) -> list[NetWork]:
         """
-        For each network (NetWork)
-        Get a new address and return them as a list
+        Networks which net_str is in - in same order as self.nets
         """
-        addresses: list[str] = []
+        net = cidr_net(net_str)
+        if not net:
+            return []
+
+        trie = self._get_trie()
+        found = sorted(trie.covering(net))
+        return [self._trie_nets[idx] for idx in found]
+
+    def _networks_inside(self, net_str: str) -> list[NetWork]:
+        """
+        Networks which are in net_str - in same order as self.nets
+        """
+        net = cidr_net(net_str)
+        if not net:
+            return []
+
+        trie = self._get_trie()
+        found = sorted(trie.covered(net))
+        return [self._trie_nets[idx] for idx in found]
+
+    def _get_trie(self) -> PrefixTrie:
+        """
+        Prefix trie of our networks (values are index into _trie_nets)
+        """
+        if self._trie is None:
+            self._trie = PrefixTrie()
+            self._trie_nets = list(self.nets.values())
+            for (idx, network) in enumerate(self._trie_nets):
+                self._trie.insert(network.net, idx)
+        return self._trie
+
+    def find_new_addresses(self, count: int = 1) -> list[list[str]]:
+        """
+        Get new addresses for count profiles.
+        Each profile gets one new address from each network (NetWork).
+        All addresses are reserved in one pass per network.
+
+        Returns:
+            list with one list of address strings per profile.
+            Empty list on failure.
+        """
+        if count <= 0:
+            return []
+
+        addresses: list[list[str]] = [[] for _ in range(count)]
         for (_cidr, network) in self.nets.items():
-            net = network.find_new_address()
-            if net:
-                addresses.append(str(net))
-            else:
+            nets = network.find_new_addresses(count)
+            if not nets:
                 self.okay = False
+                return []
+            for (idx, net) in enumerate(nets):
+                addresses[idx].append(str(net))
         return addresses
 
     def get_net_strs(self) -> list[str]:
@@ -137,18 +185,17 @@ class NetWorks:
         #
         # Check if subnet
         #
-        for (_net_str, network) in nets.items():
-            is_subnet = network.ip_in_net(cidr)
-            if is_subnet:
-                return True
+        if self._networks_containing(cidr):
+            return True
 
         #
         # Check if supernet
         #
-        for (_net_str, network) in nets.items():
+        for network in self._networks_inside(cidr):
             is_supernet = network.expand_net(cidr)
             if is_supernet:
                 # network expanded - we're done
+                self._trie = None
                 return True
         #
         # Must be new
@@ -158,6 +205,7 @@ class NetWorks:
             return False
 
         self.nets[cidr] = network
+        self._trie = None
         return True
 
     def pprint(self, recurs: bool = False):
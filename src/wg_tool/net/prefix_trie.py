@@ -0,0 +1,101 @@
+# SPDX-License-Identifier: GPL-2.0-or-later
+# SPDX-FileCopyrightText: © 2022-present  Gene C <arch@sapience.com>
+"""
+Binary prefix trie of networks.
+
+Each network is stored at the node reached by following its
+prefix bits from the root (one bit per level), with ipv4 and ipv6
+kept in separate tries. All networks containing a given network
+are then found on the path to it, and all those it contains are
+below it. Finding either is O(prefixlen) rather than a scan of
+every network.
+"""
+# pylint: disable=too-few-public-methods
+from typing import Any
+
+from py_cidr import IPvxNetwork
+
+
+class _Node:
+    """
+    One trie node: child for 0 and 1 bit and values stored here.
+    """
+    __slots__ = ('kids', 'values')
+
+    def __init__(self):
+        self.kids: list['_Node | None'] = [None, None]
+        self.values: list[Any] = []
+
+
+class PrefixTrie:
+    """
+    Map networks to values.
+    More than one value may be stored for the same network.
+    """
+    def __init__(self):
+        self._roots: dict[int, _Node] = {}
+
+    def insert(self, net: IPvxNetwork, value: Any):
+        """
+        Store value for net.
+        """
+        node = self._roots.get(net.version)
+        if node is None:
+            node = _Node()
+            self._roots[net.version] = node
+
+        for bit in _prefix_bits(net):
+            kid = node.kids[bit]
+            if kid is None:
+                kid = _Node()
+                node.kids[bit] = kid
+            node = kid
+
+        node.values.append(value)
+
+    def covering(self, net: IPvxNetwork) -> list[Any]:
+        """
+        Values of all networks containing net (including net itself).
+        Ordered from largest network to smallest.
+        """
+        found: list[Any] = []
+        node = self._roots.get(net.version)
+        if node is None:
+            return found
+
+        found += node.values
+        for bit in _prefix_bits(net):
+            node = node.kids[bit]
+            if node is None:
+                break
+            found += node.values
+        return found
+
+    def covered(self, net: IPvxNetwork) -> list[Any]:
+        """
+        Values of all networks inside net (including net itself).
+        """
+        found: list[Any] = []
+        node = self._roots.get(net.version)
+        for bit in _prefix_bits(net):
+            if node is None:
+                break
+            node = node.kids[bit]
+        if node is None:
+            return found
+
+        todo: list[_Node] = [node]
+        while todo:
+            node = todo.pop()
+            found += node.values
+            todo += [kid for kid in node.kids if kid is not None]
+        return found
+
+
+def _prefix_bits(net: IPvxNetwork) -> list[int]:
+    """
+    The prefix bits of net - most significant first.
+    """
+    addr = int(net.network_address)
+    last = net.max_prefixlen - 1
+    return [(addr >> (last - idx)) & 1 for idx in range(net.prefixlen)]
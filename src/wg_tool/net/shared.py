@@ -9,6 +9,9 @@ from py_cidr import IPvxNetwork
 
 from utils import Msg
 
+from .cidr_cache import cidr_net
+from .prefix_trie import PrefixTrie
+
 
 class NetShared:
     """
@@ -28,7 +31,7 @@ class NetShared:
         self.subnet_of: list[str] = []
         self.supernet_of: list[str] = []
 
-        net = Cidr.cidr_to_net(cidr)
+        net = cidr_net(cidr)
         if net:
             self.net = net
         else:
@@ -36,6 +39,8 @@ class NetShared:
 
         self.wanted_by: list[str] = []
         self.offered_by: list[str] = []
+        self._wanted_set: set[str] = set()
+        self._offered_set: set[str] = set()
 
     def cidr_is_sub(self, cidr: str) -> str:
         """
@@ -46,24 +51,36 @@ class NetShared:
             return cidr
         return ''
 
-    def add_wanted_by(self, peer: str):
+    def add_wanted_by(self, peer: str) -> bool:
         """
         Add this peer to list
+        Returns True if added (was not there)
         """
-        if peer not in self.wanted_by:
-            self.wanted_by.append(peer)
+        if peer in self._wanted_set:
+            return False
+        self._wanted_set.add(peer)
+        self.wanted_by.append(peer)
+        return True
 
-    def add_offered_by(self, peer: str):
+    def add_offered_by(self, peer: str) -> bool:
         """
         Add this peer to list
+        Returns True if added (was not there)
         """
-        if peer not in self.offered_by:
-            self.offered_by.append(peer)
+        if peer in self._offered_set:
+            return False
+        self._offered_set.add(peer)
+        self.offered_by.append(peer)
+        return True
 
 
 class NetsShared:
     """
     List of all shared networks.
+
+    Indexed by cidr and by peer (what each peer wants / offers).
+    The common nets of every (wanting, offering) pair of peers are
+    computed once (after refresh) and looked up by get_common_nets().
     """
     def __init__(self):
         self.ok: bool = True
@@ -72,6 +89,13 @@ class NetsShared:
         self.nets_by_peers: dict[str, list[str]] = {}
         self.peers_by_nets: dict[str, list[str]] = {}
 
+        self._by_cidr: dict[str, NetShared] = {}
+        self._wanted: dict[str, list[NetShared]] = {}
+        self._offered: dict[str, list[NetShared]] = {}
+
+        # (wanted by, offered by) -> common nets. None until computed.
+        self._common: dict[tuple[str, str], list[str]] | None = None
+
     def refresh(self):
         """
         Call after all shared are added.
@@ -80,8 +104,10 @@ class NetsShared:
         Every unique cidr string gets its own instance of NetShared.
         This way we can track if any are sub/super nets of
         others.
+        Then find the common nets of every peer pair.
         """
         self._update_subnets()
+        self._update_common()
         # self._update_nets_by_peers()
         # self._update_peers_by_nets()
 
@@ -114,26 +140,42 @@ class NetsShared:
         if not (peer1 and peer2):
             return nets
 
-        #
-        # make set of (unique) pairs of shared net from each peer.
-        # where with shared from each peer.
-        # When shared is same for both peers, add the cidr
-        # and thus skip tuple(x, x) where x is same shared net.
-        # Each pair is tuple(shared_a, shared_b)
-        # Use sort on cidr to ensure (a, b) is treated same as (b, a)
-        # and only included once.
-        #
-        shared_1 = self._shared_wanted_by(peer1)
-        shared_2 = self._shared_offered_by(peer2)
-        nets = _common_nets(shared_1, shared_2)
-
-        shared_1 = self._shared_wanted_by(peer2)
-        shared_2 = self._shared_offered_by(peer1)
-        nets += _common_nets(shared_1, shared_2)
-
-        nets = list(set(nets))
+        if self._common is None:
+            self._update_common()
+        common = self._common if self._common is not None else {}
+
+        nets_1 = common.get((peer1, peer2))
+        nets_2 = common.get((peer2, peer1))
+        if nets_1 and nets_2:
+            nets = sorted(set(nets_1 + nets_2))
+        elif nets_1:
+            nets = nets_1.copy()
+        elif nets_2:
+            nets = nets_2.copy()
         return nets
 
+    def _update_common(self):
+        """
+        Common nets for each pair (peer_w, peer_o) where
+        peer_w wants some net and peer_o offers some net.
+        Only pairs having any are kept.
+
+        For each pair make set of (unique) pairs of shared net
+        from each peer.
+        When shared is same for both peers, add the cidr
+        and thus skip tuple(x, x) where x is same shared net.
+        Each pair is tuple(shared_a, shared_b)
+        Use sort on cidr to ensure (a, b) is treated same as (b, a)
+        and only included once.
+        """
+        common: dict[tuple[str, str], list[str]] = {}
+        for (peer_w, shared_w) in self._wanted.items():
+            for (peer_o, shared_o) in self._offered.items():
+                nets = _common_nets(shared_w, shared_o)
+                if nets:
+                    common[(peer_w, peer_o)] = sorted(set(nets))
+        self._common = common
+
     def _add_cidr_wanted_by(self, peer: str, cidr: str) -> bool:
         """
         Adds cidr and wanted_by peer (peer = ident.id_str)
@@ -142,7 +184,9 @@ class NetsShared:
         if not ok:
             return False
 
-        shared.add_wanted_by(peer)
+        if shared.add_wanted_by(peer):
+            self._wanted.setdefault(peer, []).append(shared)
+            self._common = None
         return True
 
     def _add_cidr_offered_by(self, peer: str, cidr: str) -> bool:
@@ -153,7 +197,9 @@ class NetsShared:
         if not ok:
             return False
 
-        shared.add_offered_by(peer)
+        if shared.add_offered_by(peer):
+            self._offered.setdefault(peer, []).append(shared)
+            self._common = None
         return True
 
     def _add_shared_for_cidr(self, cidr: str) -> tuple[bool, NetShared]:
@@ -167,66 +213,54 @@ class NetsShared:
                 Msg.err(f'Invalid net {cidr}\n')
                 return (False, shared)
             self.shared.append(shared)
+            self._by_cidr[cidr] = shared
+            self._common = None
         return (True, shared)
 
     def _update_subnets(self):
         """
         Identify which are subnet of another.
         By subnet_of we exclude the equality case
+
+        Networks containing each one are found walking
+        a prefix trie rather than comparing every pair.
+        Equal networks (different cidr strings) are treated as
+        the earlier one being subnet of the later one.
         """
-        for (sh_1, sh_2) in itertools.combinations(self.shared, 2):
-            if sh_1.cidr == sh_2.cidr:
-                # This is an error and should never happen
-                # dont bother repairing this just display error
-                self.ok = False
-                Msg.err(f'Error: Duplicate cidrs: {sh_1.cidr}\n')
+        trie = PrefixTrie()
+        for (idx, shared) in enumerate(self.shared):
+            if shared.ok:
+                trie.insert(shared.net, idx)
+
+        for (idx, sh_1) in enumerate(self.shared):
+            if not sh_1.ok:
                 continue
+            for other in trie.covering(sh_1.net):
+                if other == idx:
+                    continue
+                sh_2 = self.shared[other]
+
+                if sh_1.cidr == sh_2.cidr:
+                    # This is an error and should never happen
+                    # dont bother repairing this just display error
+                    if other > idx:
+                        self.ok = False
+                        Msg.err(f'Error: Duplicate cidrs: {sh_1.cidr}\n')
+                    continue
+
+                if sh_1.net == sh_2.net and other < idx:
+                    continue
 
-            if Cidr.net_is_subnet(sh_1.net, sh_2.net):
                 sh_1.subnet_of.append(sh_2.cidr)
                 sh_2.supernet_of.append(sh_1.cidr)
 
-            elif Cidr.net_is_subnet(sh_2.net, sh_1.net):
-                sh_2.subnet_of.append(sh_1.cidr)
-                sh_1.supernet_of.append(sh_2.cidr)
-
     def _shared_for_cidr(self, cidr: str) -> NetShared | None:
         """
         Return net shared which owns "net"
         """
         if not cidr:
             return None
-
-        for shared in self.shared:
-            if cidr == shared.cidr:
-                return shared
-        return None
-
-    def _shared_wanted_by(self, peer: str) -> list[NetShared]:
-        """
-        Return list of all NetShared wanted by this peer
-        """
-        shared_all: list[NetShared] = []
-        if not peer:
-            return shared_all
-
-        for shared in self.shared:
-            if peer in shared.wanted_by:
-                shared_all.append(shared)
-        return shared_all
-
-    def _shared_offered_by(self, peer: str) -> list[NetShared]:
-        """
-        Return list of all NetShared offered by this peer
-        """
-        shared_all: list[NetShared] = []
-        if not peer:
-            return shared_all
-
-        for shared in self.shared:
-            if peer in shared.offered_by:
-                shared_all.append(shared)
-        return shared_all
+        return self._by_cidr.get(cidr)
 
 
 def _common_nets(shared_1_all: list[NetShared], shared_2_all: list[NetShared]
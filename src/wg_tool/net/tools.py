@@ -5,7 +5,7 @@
 """
 Net tools
 """
-from py_cidr import Cidr
+from .cidr_cache import cidr_net
 
 
 def cidr_in_cidrs(cidr: str, cidrs: list[str]) -> bool:
@@ -22,9 +22,15 @@ def cidr_in_cidrs(cidr: str, cidrs: list[str]) -> bool:
     if cidr in cidrs:
         return True
 
-    nets = Cidr.cidrs_to_nets(cidrs)
-    if Cidr.cidr_is_subnet(cidr, nets):
-        return True
+    net = cidr_net(cidr)
+    if not net:
+        return False
+
+    for other in cidrs:
+        other_net = cidr_net(other)
+        if other_net and other_net.version == net.version:
+            if net.subnet_of(other_net):    # type: ignore[arg-type]
+                return True
     return False
 
 
@@ -4,3 +4,4 @@
 from .acct import Acct
 from .profile import Profile
 from .wg_config import WgConfig
+from .wg_dns import dns_prefetch
@@ -10,6 +10,7 @@ from typing import (Any)
 import os
 
 from utils import (Msg, read_toml_file, state_marker)
+from utils import (fields_to_dict, is_field)
 from utils.debug import pprint
 from data import (mod_time_now, get_file_names, write_dict)
 from data import (get_vpn_dir)
@@ -49,6 +50,9 @@ class Acct():
       Data-wg/<vpn>/<acct_name>/<profile.conf>
                                 ...
     """
+    __slots__ = ('vpn_name', 'name', 'active', 'hidden', 'mod_time',
+                 'profile', 'changed')
+
     def __init__(self, vpn_name: str, acct_name: str):
         #
         # info
@@ -160,10 +164,19 @@ class Acct():
                     return False
         return True
 
-    def write(self, opts: Opts) -> bool:
+    def write(self, opts: Opts, write_info: bool = True,
+              prof_names: list[str] | None = None) -> bool:
         """
         Write self out with profile data in separate files.
         todo: add check that info is valid
+
+        Args:
+            write_info (bool):
+                If False skip the Acct.info file.
+
+            prof_names (list[str] | None):
+                Only write these profiles. None means all of them.
+
         Returns True if all good.
         """
         # if not self.changed:
@@ -181,13 +194,15 @@ class Acct():
         #
         # Acct Info File
         #
-        if not self.write_info(acct_dir):
+        if write_info and not self.write_info(acct_dir):
             return False
 
         #
         # profile data
         #
-        for (_prof_name, prof) in self.profile.items():
+        for (prof_name, prof) in self.profile.items():
+            if prof_names is not None and prof_name not in prof_names:
+                continue
             if not prof.write(opts, acct_dir):
                 return False
         return True
@@ -244,7 +259,7 @@ class Acct():
         Serialize
         """
         attrib: dict[str, Any] = {}
-        for (k, v) in vars(self).items():
+        for (k, v) in fields_to_dict(self).items():
             if k == 'profile':
                 profile: dict[str, Any] = {}
                 attrib[k] = profile
@@ -259,7 +274,7 @@ class Acct():
         Serialize self but skip 'profile' and 'changed'.
         """
         attrib: dict[str, Any] = {}
-        for (k, v) in vars(self).items():
+        for (k, v) in fields_to_dict(self).items():
             if k not in ('profile', 'changed'):
                 attrib[k] = v
         return attrib
@@ -273,7 +288,7 @@ class Acct():
 
         for (k, v) in data_dict.items():
             if k != 'profile':
-                setattr(self, k, v)
+                self._set_field(k, v)
 
     def from_dict(self, data_dict: dict[str, Any]):
         """
@@ -287,7 +302,16 @@ class Acct():
                     prof.from_dict(prof_dict)
                     self.profile[name] = prof
             else:
-                setattr(self, k, v)
+                self._set_field(k, v)
+
+    def _set_field(self, key: str, val: Any):
+        """
+        Set one (known) attribute from saved data.
+        """
+        if key == 'profile' or not is_field(self, key):
+            Msg.warn(f'Acct {self.name}: ignoring unknown key {key}\n')
+            return
+        setattr(self, key, val)
 
     def active_profile_names(self) -> tuple[list[str], list[str]]:
         """
@@ -369,6 +393,7 @@ class Acct():
         prof.changed = True
         self.changed = True
         self.profile[prof_name] = prof
+        Profile.generation += 1
 
         return prof
 
@@ -383,7 +408,7 @@ class Acct():
         if os.path.isfile(info_file):
             info_dict = read_toml_file(info_file)
             for (k, v) in info_dict.items():
-                setattr(self, k, v)
+                self._set_field(k, v)
         else:
             Msg.warn(f'Warning: missing info file: {info_file}\n')
             Msg.plain('  repairing.\n')
@@ -522,35 +547,25 @@ class Acct():
         for prof in list(self.profile.values()):
             prof.refresh_nets()
 
-    def new_key_pairs(self, idents: Identities) -> bool:
+    def profs_from_idents(self, idents: Identities
+                          ) -> tuple[bool, list[Profile]]:
         """
-        Generate new keys for ids
+        Return the profiles of ids belonging to this account.
+
+        Every profile must exist, otherwise returns (False, []).
         """
-        prof_names: list[str] = []
+        profs: list[Profile] = []
         vpn_name = self.vpn_name
         acct_name = self.name
 
         for ident in idents.ids:
             if ident.vpn_name == vpn_name and ident.acct_name == acct_name:
                 if ident.prof_name in self.profile:
-                    prof_names.append(ident.prof_name)
+                    profs.append(self.profile[ident.prof_name])
                 else:
                     Msg.err(f'Unknown profile: {ident.id_str}\n')
-                    return False
-
-        if not prof_names:
-            # nothing to do
-            return True
-
-        #
-        # Ok do it
-        #
-        for prof_name in prof_names:
-            prof = self.profile[prof_name]
-            if not prof.new_key_pair():
-                return False
-        self.changed = True
-        return True
+                    return (False, [])
+        return (True, profs)
 
     def find_prof(self, prof_name) -> Profile | None:
         """
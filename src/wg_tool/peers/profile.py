@@ -8,9 +8,9 @@ Profile
 # pylint: disable=duplicate-code
 from typing import (Any, Self)
 import os
-from copy import deepcopy
 
 from utils import Msg
+from utils import (fields_to_dict, is_field)
 from utils import read_toml_file
 from utils import dict_to_toml_string
 
@@ -26,6 +26,10 @@ from .profile_base import ProfileBase
 from .wg_address import set_wireguard_address
 from .show_list import show_list
 
+# never saved - always generated internally
+_ALWAYS_DROP: frozenset[str] = frozenset(
+        ('changed', 'is_gw', 'mod_time', 'peer_id'))
+
 
 class Profile(ProfileBase):
     """
@@ -33,6 +37,12 @@ class Profile(ProfileBase):
 
     A peer is denoted by it's ID: vpn.account.profile names.
     """
+    __slots__ = ()
+
+    # bumped when any profile is added, renamed or gets new keys
+    # (see vpn/peer_index.py)
+    generation: int = 0
+
     def is_gateway(self):
         """
         Returns true if a gateway
@@ -95,12 +105,21 @@ class Profile(ProfileBase):
         with these new ones.
         """
         (key_prv, key_pub) = gen_key_pair()
+        if not key_pub:
+            return False
+        self.set_key_pair(key_prv, key_pub)
+        return True
+
+    def set_key_pair(self, key_prv: str, key_pub: str):
+        """
+        Replace old keys with the new key pair.
+        """
         self.PrivateKey = key_prv
         self.PublicKey = key_pub
         self.changed = True
+        Profile.generation += 1
         # new key can have psks - not legacy any more.
         self.no_psk_tags = []
-        return True
 
     def read(self, fpath: str) -> bool:
         """
@@ -191,15 +210,17 @@ class Profile(ProfileBase):
         """
         Convert to dictionary.
         Skip: 'changed'
+        Values are scalars or lists of them so copying the
+        lists is enough (no deepcopy of the whole object).
         """
-        # attribs: dict[str, Any] = vars(self).copy()
-        attribs: dict[str, Any] = deepcopy(vars(self))
-        attribs = self.attribs_drop(attribs)
+        attribs = self.attribs_drop(fields_to_dict(self))
 
         adict: dict[str, Any] = {}
         for (k, v) in attribs.items():
             if isinstance(v, Identity):
                 adict[k] = v.to_dict()
+            elif isinstance(v, (list, dict)):
+                adict[k] = _plain_copy(v)
             else:
                 adict[k] = v
         return adict
@@ -216,8 +237,10 @@ class Profile(ProfileBase):
                 ident = Identity()
                 ident.from_dict(v)
                 self.ident = ident
-            else:
+            elif is_field(self, k):
                 setattr(self, k, v)
+            else:
+                Msg.warn(f'Profile: ignoring unknown key {k}\n')
 
     def merge_from_dict(self, attribs: dict[str, Any]):
         """
@@ -230,6 +253,9 @@ class Profile(ProfileBase):
         attribs = self.attribs_drop(attribs, drops=drops)
 
         for (k, v) in attribs.items():
+            if not is_field(self, k):
+                Msg.warn(f'  ignoring unknown key {k}\n')
+                continue
             current = getattr(self, k)
             if _is_different(current, v):
                 # if (v or isinstance(v, bool)) and v != current:
@@ -323,12 +349,11 @@ class Profile(ProfileBase):
         These attributes are not saved.
         Always generated internally.
         """
-        drops += ('changed', 'is_gw', 'mod_time', 'peer_id')
-        drops = tuple(set(drops))
+        drop_set = _ALWAYS_DROP.union(drops) if drops else _ALWAYS_DROP
 
         attribs_keep: dict[str, Any] = {}
         for (key, value) in attribs.items():
-            if key in drops or value is None:
+            if key in drop_set or value is None:
                 continue
             attribs_keep[key] = value
         return attribs_keep
@@ -468,6 +493,7 @@ class Profile(ProfileBase):
         """
         if self.ident.set_prof_name(new_name):
             self.changed = True
+            Profile.generation += 1
         return True
 
     def rename_acct(self, new_name: str) -> bool:
@@ -477,6 +503,7 @@ class Profile(ProfileBase):
         """
         if self.ident.set_acct_name(new_name):
             self.changed = True
+            Profile.generation += 1
         return True
 
     def rename_vpn(self, new_name: str) -> bool:
@@ -485,6 +512,7 @@ class Profile(ProfileBase):
         """
         if self.ident.set_vpn_name(new_name):
             self.changed = True
+            Profile.generation += 1
         return True
 
     def id_string(self) -> str:
@@ -605,3 +633,14 @@ def _nets_drop_internet(nets: list[str]) -> tuple[bool, list[str]]:
         else:
             nets_clean.append(net)
     return (found_internet, nets_clean)
+
+
+def _plain_copy(value: Any) -> Any:
+    """
+    Copy of (nested) lists / dicts - other values are immutable.
+    """
+    if isinstance(value, list):
+        return [_plain_copy(item) for item in value]
+    if isinstance(value, dict):
+        return {key: _plain_copy(item) for (key, item) in value.items()}
+    return value
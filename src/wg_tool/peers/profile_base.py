@@ -13,7 +13,18 @@ from utils.debug import pprint
 class ProfileBase:
     """
     Data part of Profile
+     - fields in the order they are saved.
     """
+    __slots__ = ('ident', 'Address', 'AddressWg', 'PrivateKey', 'PublicKey',
+                 'no_psk_tags', 'PersistentKeepalive', 'MTU',
+                 'pre_up', 'pre_down', 'post_up', 'post_down',
+                 'nets_offered', 'nets_wanted',
+                 'internet_offered', 'internet_wanted',
+                 'Endpoint', 'Endpoint_alt', 'alternate_wanted',
+                 'use_vpn_dns', 'dns', 'dns_search', 'dns_linux',
+                 'dns_postup', 'dns_postdn', 'active', 'hidden',
+                 'is_gw', 'changed', 'mod_time')
+
     def __init__(self):
         self.ident: Identity = Identity()
 
@@ -11,7 +11,10 @@ from vpninfo import VpnInfo
 
 from .wg_config_base import WgConfigBase
 from .acct import Acct
-from .wg_write import wg_write_config
+from .wg_write import wg_config_items
+from .wg_write import wg_render_config
+from .wg_write import wg_save_config
+from .wg_render_pool import wg_render_configs
 
 
 class WgConfig(WgConfigBase):
@@ -38,9 +41,10 @@ class WgConfig(WgConfigBase):
         _init_dns(self)
         _init_gw_alternates(self)
 
-    def write_all(self) -> bool:
+    def write_all(self, only: set[tuple[str, str]] | None = None) -> bool:
         """
         For each profile, create and write out it's wireguard config.
+        If only is given, then limited to those (acct_name, prof_name).
         Return True all being well.
         """
         # Have any profiles?
@@ -51,14 +55,43 @@ class WgConfig(WgConfigBase):
         acct_names = self.acct_names
         prof_names = self.prof_names
 
+        items: list[tuple[str, str, bool]] = []
         for acct_name in acct_names:
             if not prof_names[acct_name]:
                 continue
 
             for prof_name in prof_names[acct_name]:
-                okay = wg_write_config(self, acct_name, prof_name)
-                if not okay:
+                if only is not None and (acct_name, prof_name) not in only:
+                    continue
+                items += wg_config_items(self, acct_name, prof_name)
+
+        #
+        # Render in parallel then write in order.
+        # One at a time just renders and writes each in turn.
+        #
+        jobs = self.opts.jobs
+        if jobs > 1 and len(items) > 1:
+            for rendered in wg_render_configs(self, items, jobs):
+                if not wg_save_config(self, rendered):
                     status = False
+        else:
+            for (acct_name, prof_name, alternate) in items:
+                rendered = wg_render_config(self, acct_name, prof_name,
+                                            alternate)
+                if not wg_save_config(self, rendered):
+                    status = False
+
+        #
+        # QR codes for all the client configs
+        # Only prune the QR cache when every config was rendered.
+        #
+        self.qr_codes.write(self.opts.work_dir, self.vpninfo.name, jobs,
+                            prune=only is None)
+
+        num_rendered = self.peer_cache.rendered
+        num_cached = self.peer_cache.cached
+        txt = f'{num_rendered} rendered, {num_cached} from cache'
+        Msg.plainverb(f'{"":4s} Peer sections: {txt}\n', level=2)
         return status
 
 
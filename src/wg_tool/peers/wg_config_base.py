@@ -11,6 +11,8 @@ from vpninfo import VpnInfo
 from net import NetsShared
 
 from .acct import Acct
+from .wg_peer import WgPeerCache
+from .wg_qr import WgQrCodes
 
 
 class WgConfigBase:
@@ -61,3 +63,9 @@ class WgConfigBase:
 
         # list of ids of any gateways with alternate endpoint
         self.gw_alternates: list[str] = []
+
+        # rendered [Peer] sections - reused across configs
+        self.peer_cache: WgPeerCache = WgPeerCache()
+
+        # QR codes to make once all configs are written
+        self.qr_codes: WgQrCodes = WgQrCodes()
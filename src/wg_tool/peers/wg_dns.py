@@ -8,6 +8,21 @@ from py_cidr import Cidr
 from dns_resolver import Dns
 
 
+def dns_prefetch(hosts: list[str], include_ipv6: bool, jobs: int = 1):
+    """
+    Look up all the non-IP hosts at once (concurrently) ahead
+    of dns_to_wg_dns() being called for each config.
+    """
+    names = [host for host in hosts if not Cidr.is_valid_cidr(host)]
+    if not names:
+        return
+
+    rr_types: tuple[str, ...] = ('A',)
+    if include_ipv6:
+        rr_types = ('A', 'AAAA',)
+    Dns.prefetch(names, rr_types, jobs)
+
+
 def dns_to_wg_dns(hosts: list[str], include_ipv6: bool) -> list[str]:
     """
     DNS hosts convert any domain names to IP addresses
@@ -139,8 +139,8 @@ def _dns_data(vpninfo: VpnInfo, prof: ProfileBase
     # dns servers:
     #   profile + [gateways + vpninfo] if usinf vpn dns
 
-    dns_list: list[str] = prof.dns
-    dns_search_list: list[str] = prof.dns_search
+    dns_list: list[str] = prof.dns.copy()
+    dns_search_list: list[str] = prof.dns_search.copy()
     dns_postup: str = ''
     dns_postdn: str = ''
 
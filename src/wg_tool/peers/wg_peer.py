@@ -5,11 +5,10 @@ Write wireguard all config files for one vpn
 """
 # pylint: disable=too-many-instance-attributes
 # pylint: disable=too-few-public-methods
-from py_cidr import Cidr
-
 from utils import Msg
 from utils import list_string_to_csv_sublists
 from net import internet_networks
+from net import cidrs_compact
 
 from .profile_base import ProfileBase
 
@@ -33,47 +32,109 @@ class WgPeerData:
         Can be empty if alternate requested and no
         alternate Endpoint.
         """
-        data = _wg_peer_data(self)
+        (head, tail) = _wg_peer_data(self)
+        if not head:
+            return ''
+        data = head + _psk_line(self.psk) + tail
         return data
 
 
-def _wg_peer_data(wg_peer: WgPeerData) -> str:
+class WgPeerCache:
+    """
+    Per run cache of rendered [Peer] sections.
+
+    A peer section depends only on the peer, on a few settings
+    of the profile owning the config and on the nets shared by the pair.
+    Same peer is in many configs (e.g. every client is in every gateway
+    config) so each section is rendered once and reused.
+
+    The PresharedKey is specific to the pair and is not cached.
+    Each section is kept as (head, tail) with the psk going in between.
+    """
+    def __init__(self):
+        self.sections: dict[tuple, tuple[str, str]] = {}
+        self.rendered: int = 0
+        self.cached: int = 0
+
+    def data(self, wg_peer: WgPeerData) -> str:
+        """
+        Return the [Peer] section data for wg_peer.
+        """
+        my_prof = wg_peer.config_prof
+        prof = wg_peer.prof
+
+        if my_prof.is_gw:
+            internet = my_prof.internet_offered
+        else:
+            internet = my_prof.internet_wanted
+
+        key = (my_prof.is_gw, internet, my_prof.alternate_wanted,
+               prof.ident.tag, wg_peer.alternate, wg_peer.peer_to_peer,
+               tuple(wg_peer.nets_common))
+
+        parts = self.sections.get(key)
+        if parts is None:
+            parts = _wg_peer_data(wg_peer)
+            self.sections[key] = parts
+            self.rendered += 1
+        else:
+            self.cached += 1
+
+        (head, tail) = parts
+        if not head:
+            return ''
+        return head + _psk_line(wg_peer.psk) + tail
+
+
+def _psk_line(psk: str) -> str:
+    """
+    PresharedKey line (if have psk).
+    """
+    if not psk:
+        return ''
+    return f'{"PresharedKey":20s} = {psk}\n'
+
+
+def _wg_peer_data(wg_peer: WgPeerData) -> tuple[str, str]:
     """
     For profile 'my_prof', create data for peer profile 'prof'.
     Caller must ensure peer_prof != my_prof
     my_prof - owns the config.
     prof is the peer to be added
-    psk is the shared key for the pair : (my_prof,  prof)
     cl_nets_offered: list of networks clients provide to all gatways
                     and clients of those gateways can access via the gateway.
 
     If alternate is set then alternate endpoint is used. Caller will
     only call us with alternate if prof is gateway and exists.
     We dont need to check this but can if we'er cautious.
+
+    Returns (head, tail) of the section. The PresharedKey, if any,
+    goes in between. Both empty if nothing to add.
     """
     my_prof = wg_peer.config_prof
     prof = wg_peer.prof
 
     if wg_peer.alternate:
         if not (my_prof.alternate_wanted and prof.Endpoint_alt):
-            return ''
+            return ('', '')
 
     alt_mark = 'alternate' if wg_peer.alternate else ''
     gw_mark = '(gateway)' if prof.is_gw else ''
 
     note = f'{prof.ident.acct_name} {prof.ident.prof_name}'
 
-    data: str = '\n'
-    data += f'{"[Peer]":20s} # {note} {gw_mark} {alt_mark}\n'
-    data += f'{"PublicKey":20s} = {prof.PublicKey}\n'
+    head: list[str] = ['\n']
+    head.append(f'{"[Peer]":20s} # {note} {gw_mark} {alt_mark}\n')
+    head.append(f'{"PublicKey":20s} = {prof.PublicKey}\n')
 
     #
     # check if (my_prof) config is for gateway
     #
+    tail: list[str] = []
     if my_prof.is_gw:
-        data += _peer_data_gateway(wg_peer)
+        tail.append(_peer_data_gateway(wg_peer))
     else:
-        data += _peer_data_client(wg_peer)
+        tail.append(_peer_data_client(wg_peer))
 
     #
     # Endpoint:
@@ -81,9 +142,9 @@ def _wg_peer_data(wg_peer: WgPeerData) -> str:
     #
     endpoint = _endpoint(note, prof, wg_peer.alternate)
     if endpoint:
-        data += endpoint
+        tail.append(endpoint)
 
-    return data
+    return (''.join(head), ''.join(tail))
 
 
 def _peer_data_gateway(wg_peer: WgPeerData) -> str:
@@ -92,27 +153,17 @@ def _peer_data_gateway(wg_peer: WgPeerData) -> str:
     my_prof - owns the config and is a gateway.
     prof is the peer to be added
     """
-    data: str = ''
+    data: list[str] = []
     internet = internet_networks()
 
     my_prof = wg_peer.config_prof
     prof = wg_peer.prof
-    psk = wg_peer.psk
     peer_to_peer = wg_peer.peer_to_peer
     vpn_nets = wg_peer.vpn_nets
 
     #
-    # PSK
-    #   - if gateway pair use that psk
-    #   - if (client) peer has psk use that
+    # PSK is added by caller - it goes before this
     #
-    # psk: str = ''
-    # if gw_psk:
-    #     psk = gw_psk
-    # elif prof.PresharedKey:
-    #     psk = prof.PresharedKey
-    if psk:
-        data += f'{"PresharedKey":20s} = {psk}\n'
 
     #
     # Allowed ips
@@ -120,7 +171,7 @@ def _peer_data_gateway(wg_peer: WgPeerData) -> str:
     #
     allowed: list[str] = []
     if peer_to_peer:
-        allowed = vpn_nets
+        allowed = vpn_nets.copy()
     else:
         allowed = prof.Address.copy()
 
@@ -137,19 +188,17 @@ def _peer_data_gateway(wg_peer: WgPeerData) -> str:
     # compact (keep pre-compact as comment)
     #
     if allowed:
-        allowed = list(set(allowed))
-        allowed = Cidr.sort_cidrs(allowed)
-        compact = Cidr.compact(allowed)
+        (allowed, compact) = cidrs_compact(allowed)
         if len(compact) < len(allowed):
-            data += _pre_compact_nets_comment(allowed)
+            data.append(_pre_compact_nets_comment(allowed))
         allowed = compact
 
     # Up to 3 nets per AllowedIPs line
     sub_allowed = list_string_to_csv_sublists(allowed, 3)
     for allowed_ips in sub_allowed:
-        data += f'{"AllowedIPs":20s} = {allowed_ips}\n'
+        data.append(f'{"AllowedIPs":20s} = {allowed_ips}\n')
 
-    return data
+    return ''.join(data)
 
 
 def _peer_data_client(wg_peer: WgPeerData) -> str:
@@ -158,30 +207,27 @@ def _peer_data_client(wg_peer: WgPeerData) -> str:
     my_prof - owns the config and is a client (not a gateway)
     prof is the peer to be added
     """
-    data: str = ''
+    data: list[str] = []
     internet = internet_networks()
 
     my_prof = wg_peer.config_prof
     prof = wg_peer.prof
-    psk = wg_peer.psk
     peer_to_peer = wg_peer.peer_to_peer
     vpn_nets = wg_peer.vpn_nets
 
     #
-    # This client PSK is shared with gateway
+    # This client PSK is shared with gateway - added by caller
     #
-    if psk:
-        data += f'{"PresharedKey":20s} = {psk}\n'
-
     if prof.PersistentKeepalive > 0:
-        data += f'{"PersistentKeepalive":20s} = {prof.PersistentKeepalive}\n'
+        keepalive = prof.PersistentKeepalive
+        data.append(f'{"PersistentKeepalive":20s} = {keepalive}\n')
 
     #
     # Allowed ips
     #
     allowed: list[str] = []
     if peer_to_peer:
-        allowed = vpn_nets
+        allowed = vpn_nets.copy()
     else:
         allowed = prof.Address.copy()
 
@@ -194,19 +240,17 @@ def _peer_data_client(wg_peer: WgPeerData) -> str:
     # compact if asked (keep pre-compact as comment)
     #
     if allowed:
-        allowed = list(set(allowed))
-        allowed = Cidr.sort_cidrs(allowed)
-        compact = Cidr.compact(allowed)
+        (allowed, compact) = cidrs_compact(allowed)
         if len(compact) < len(allowed):
-            data += _pre_compact_nets_comment(allowed)
+            data.append(_pre_compact_nets_comment(allowed))
         allowed = compact
 
     # Up to 3 nets per AllowedIPs line
     sub_allowed = list_string_to_csv_sublists(allowed, 3)
     for allowed_ips in sub_allowed:
-        data += f'{"AllowedIPs":20s} = {allowed_ips}\n'
+        data.append(f'{"AllowedIPs":20s} = {allowed_ips}\n')
 
-    return data
+    return ''.join(data)
 
 
 def _endpoint(note: str, prof: ProfileBase, alternate: bool) -> str:
@@ -0,0 +1,215 @@
+# SPDX-License-Identifier: GPL-2.0-or-later
+# SPDX-FileCopyrightText: © 2022-present  Gene C <arch@sapience.com>
+"""
+QR codes for client wireguard configs.
+
+QR codes are made after all the configs are written.
+Images are cached by content: the QR image depends only on the
+config with comments removed, so the cache file name is the hash of that.
+A config whose only change is in comments (e.g. the date in
+the header) or a renamed profile reuses the cached image.
+
+Any missing images are generated using a pool of processes.
+Images are put in place along with the configs: if writes are
+batched (WriteBatch) they are renamed into place at commit, or
+dropped if the batch fails.
+"""
+from concurrent.futures import ProcessPoolExecutor
+import contextlib
+import io
+import multiprocessing
+import os
+import shutil
+
+from utils import Msg
+from utils import clean_comments
+from utils import dir_list
+from utils import make_dir_path
+from utils import os_chmod
+from utils import os_rename
+from utils import os_unlink
+from utils import text_to_qr_file
+from utils import WriteBatch
+from crypto import message_digest
+from data import get_wg_qr_cache_dir
+from data import restrict_file_mode
+
+
+class WgQrCodes:
+    """
+    QR codes to be made for one vpn.
+     - items: list of (config_data, qr_file, changed)
+    """
+    def __init__(self):
+        self.items: list[tuple[str, str, bool]] = []
+
+    def add(self, config_data: str, qr_file: str, changed: bool):
+        """
+        Request QR code of config_data in qr_file.
+        changed is True if the config was changed.
+        """
+        self.items.append((config_data, qr_file, changed))
+
+    def write(self, work_dir: str, vpn_name: str, jobs: int,
+              prune: bool = True) -> bool:
+        """
+        Make all the requested QR codes.
+        If prune then cached images not used by any config are removed.
+        Errors are not fatal - but returns False if any.
+        """
+        if not self.items:
+            return True
+
+        cache_dir = get_wg_qr_cache_dir(work_dir, vpn_name)
+        if not make_dir_path(cache_dir):
+            Msg.warn(f'Error making QR cache dir {cache_dir}\n')
+            return False
+
+        fmode = restrict_file_mode()
+
+        #
+        # Sort out what's needed
+        #  - todo: images to generate {cache_file: config_data}
+        #  - places: copy cache image to qr file
+        #
+        todo: dict[str, str] = {}
+        places: list[tuple[str, str]] = []
+        live: set[str] = set()
+        num_seeded = 0
+
+        for (config_data, qr_file, changed) in self.items:
+            cache_file = _cache_file(cache_dir, config_data)
+            live.add(os.path.basename(cache_file))
+            have_qr = os.path.isfile(qr_file)
+
+            if cache_file in todo or os.path.isfile(cache_file):
+                if changed or not have_qr:
+                    places.append((cache_file, qr_file))
+                continue
+
+            if have_qr and not changed:
+                # unchanged config: existing image is the one we want
+                if _copy_qr(qr_file, cache_file, fmode, batch=False):
+                    num_seeded += 1
+                    continue
+
+            todo[cache_file] = config_data
+            places.append((cache_file, qr_file))
+
+        #
+        # Generate new images then put into place
+        #
+        okay = _make_qr_files(todo, jobs, fmode)
+
+        for (cache_file, qr_file) in places:
+            if not os.path.isfile(cache_file):
+                continue
+            if not _copy_qr(cache_file, qr_file, fmode):
+                Msg.warn(f'Error creating QR code: {qr_file}\n')
+                okay = False
+
+        num_pruned = 0
+        if prune:
+            num_pruned = _prune_cache(cache_dir, live)
+
+        txt = f'{len(todo)} generated, {len(places) - len(todo)} from cache'
+        txt += f', {num_seeded} seeded, {num_pruned} pruned'
+        Msg.plainverb(f'{"":4s} QR codes: {txt}\n', level=2)
+        return okay
+
+
+def _cache_file(cache_dir: str, config_data: str) -> str:
+    """
+    Cache file path for QR code of config_data.
+    """
+    txt = clean_comments(config_data)
+    digest = message_digest(txt.encode('utf-8')).hex()
+    return os.path.join(cache_dir, f'{digest}.png')
+
+
+def _copy_qr(src: str, dst: str, fmode: int, batch: bool = True) -> bool:
+    """
+    Atomically put copy of src image at dst.
+    Uses hard link when possible - images are never changed in place.
+    If batch and writes are batched, dst changes at commit.
+    """
+    dst_dir = os.path.dirname(dst)
+    if not make_dir_path(dst_dir):
+        return False
+
+    dst_tmp = dst + '.tmp'
+    if os.path.lexists(dst_tmp):
+        os_unlink(dst_tmp)
+
+    try:
+        os.link(src, dst_tmp)
+    except OSError:
+        try:
+            shutil.copyfile(src, dst_tmp)
+        except OSError as err:
+            Msg.warn(f'Error copying {src}: {err}\n')
+            return False
+
+    if fmode > 0:
+        os_chmod(dst_tmp, fmode)
+
+    if batch and WriteBatch.active:
+        WriteBatch.add_rename(dst_tmp, dst)
+        return True
+
+    return os_rename(dst_tmp, dst)
+
+
+def _make_qr_files(todo: dict[str, str], jobs: int, fmode: int) -> bool:
+    """
+    Generate QR images - using pool of jobs processes if more than one.
+    """
+    if not todo:
+        return True
+
+    items = [(data, qr_file, fmode) for (qr_file, data) in todo.items()]
+
+    if jobs > 1 and len(items) > 1:
+        chunksize = max(1, len(items) // (4 * jobs))
+        mp_context = multiprocessing.get_context('fork')
+        with ProcessPoolExecutor(max_workers=jobs,
+                                 mp_context=mp_context) as pool:
+            results = list(pool.map(_make_qr, items, chunksize=chunksize))
+    else:
+        results = [_make_qr(item) for item in items]
+
+    okay = True
+    for (item, (ok, output)) in zip(items, results):
+        if output:
+            Msg.plain(output)
+        if not ok:
+            # annoying not fatal
+            Msg.warn(f'Error creating QR code: {item[1]}\n')
+            okay = False
+    return okay
+
+
+def _make_qr(item: tuple[str, str, int]) -> tuple[bool, str]:
+    """
+    Worker: make one QR image.
+    Messages are captured and returned.
+    """
+    (data, qr_file, fmode) = item
+    output = io.StringIO()
+    with contextlib.redirect_stdout(output):
+        ok = text_to_qr_file(data, qr_file, fmode)
+    return (ok, output.getvalue())
+
+
+def _prune_cache(cache_dir: str, live: set[str]) -> int:
+    """
+    Remove cached images not in live.
+    Returns number removed.
+    """
+    num_pruned = 0
+    (files, _dirs, _links) = dir_list(cache_dir, which='name')
+    for file in files:
+        if file.endswith('.png') and file not in live:
+            if os_unlink(os.path.join(cache_dir, file)):
+                num_pruned += 1
+    return num_pruned
@@ -0,0 +1,78 @@
+# SPDX-License-Identifier: GPL-2.0-or-later
+# SPDX-FileCopyrightText: © 2022-present  Gene C <arch@sapience.com>
+"""
+Render wireguard configs using a pool of processes.
+
+Rendering a config only reads the vpn data (WgConfigBase)
+so can be done in parallel. The rendered configs are returned
+in the same order as requested so that writing them, along with
+any messages, stays deterministic.
+
+Worker processes are forked so they inherit the data
+rather than having it pickled for each one.
+"""
+from concurrent.futures import ProcessPoolExecutor
+import contextlib
+import io
+import multiprocessing
+
+from .wg_config_base import WgConfigBase
+from .wg_write import WgRendered
+from .wg_write import wg_render_config
+
+# Set in parent before the fork - the worker processes inherit it.
+_WG_CONF: WgConfigBase | None = None
+
+
+def wg_render_configs(wg_conf: WgConfigBase,
+                      items: list[tuple[str, str, bool]],
+                      jobs: int) -> list[WgRendered]:
+    """
+    Render all configs in items using jobs processes.
+    items is list of (acct_name, prof_name, alternate).
+    Returns rendered configs in same order as items.
+    """
+    # pylint: disable=global-statement
+    global _WG_CONF
+
+    chunksize = max(1, len(items) // (4 * jobs))
+    mp_context = multiprocessing.get_context('fork')
+
+    _WG_CONF = wg_conf
+    try:
+        with ProcessPoolExecutor(max_workers=jobs,
+                                 mp_context=mp_context) as pool:
+            rendered = list(pool.map(_render_one, items, chunksize=chunksize))
+    finally:
+        _WG_CONF = None
+
+    for one in rendered:
+        wg_conf.peer_cache.rendered += one.peer_rendered
+        wg_conf.peer_cache.cached += one.peer_cached
+    return rendered
+
+
+def _render_one(item: tuple[str, str, bool]) -> WgRendered:
+    """
+    Worker: render one config.
+    Messages are captured and returned to be shown by the parent.
+    """
+    (acct_name, prof_name, alternate) = item
+    wg_conf = _WG_CONF
+    if wg_conf is None:
+        rendered = WgRendered(acct_name, prof_name, alternate)
+        rendered.okay = False
+        return rendered
+
+    peer_cache = wg_conf.peer_cache
+    num_rendered = peer_cache.rendered
+    num_cached = peer_cache.cached
+
+    output = io.StringIO()
+    with contextlib.redirect_stdout(output):
+        rendered = wg_render_config(wg_conf, acct_name, prof_name, alternate)
+
+    rendered.output = output.getvalue()
+    rendered.peer_rendered = peer_cache.rendered - num_rendered
+    rendered.peer_cached = peer_cache.cached - num_cached
+    return rendered
@@ -9,10 +9,8 @@ import os
 from data import mod_time_now
 from data import get_wg_vpn_dir
 from data import write_db_file
-from data import restrict_file_mode
 
 from utils import Msg
-from utils import text_to_qr_file
 from utils import make_dir_path
 from utils import os_unlink
 
@@ -23,21 +21,39 @@ from .wg_peer import WgPeerData
 from .wg_config_base import WgConfigBase
 
 
-def wg_write_config(wg_conf: WgConfigBase,
+class WgRendered:
+    """
+    One rendered wireguard config ready to be written.
+     - data: the config text. Empty if nothing to write
+       (e.g. alternate config without alternate gateway peers).
+     - output: any messages generated while rendering
+       (only used when rendering in a separate process).
+     - peer_rendered / peer_cached: peer cache counts.
+    """
+    # pylint: disable=too-few-public-methods
+    def __init__(self, acct_name: str, prof_name: str, alternate: bool):
+        self.acct_name: str = acct_name
+        self.prof_name: str = prof_name
+        self.alternate: bool = alternate
+        self.okay: bool = True
+        self.data: str = ''
+        self.output: str = ''
+        self.peer_rendered: int = 0
+        self.peer_cached: int = 0
+
+
+def wg_config_items(wg_conf: WgConfigBase,
                     acct_name: str,
-                    prof_name: str) -> bool:
+                    prof_name: str) -> list[tuple[str, str, bool]]:
     """
-    Write wireguard config for acct.profile
+    List of configs for acct.profile as (acct_name, prof_name, alternate).
 
     If any gateway peer have alternate endpoint,
     then a second config written to the "alt" subdirectory.
     This has same [Interface] but gateway peers use the
     alternate endpoint.
     """
-    alternate = False
-    ok = _wg_write_config(wg_conf, acct_name, prof_name, alternate)
-    if not ok:
-        return False
+    items: list[tuple[str, str, bool]] = [(acct_name, prof_name, False)]
 
     #
     # Could there be gateway which has alternate peer gateway?
@@ -46,20 +62,18 @@ def wg_write_config(wg_conf: WgConfigBase,
     acct = wg_conf.accts[acct_name]
     prof = acct.profile[prof_name]
     if prof.alternate_wanted and wg_conf.gw_alternates:
-        alternate = True
-        ok = _wg_write_config(wg_conf, acct_name, prof_name, alternate)
-        if not ok:
-            return False
-    return True
+        items.append((acct_name, prof_name, True))
+    return items
 
 
-def _wg_write_config(wg_conf: WgConfigBase,
+def wg_render_config(wg_conf: WgConfigBase,
                      acct_name: str,
                      prof_name: str,
                      alternate: bool
-                     ) -> bool:
+                     ) -> WgRendered:
     """
-    Write wireguard profile for one acct.
+    Make wireguard config for one acct profile.
+    Only uses wg_conf - nothing is written.
 
     Gateways:
         Each gateway profile has its [Interface] section
@@ -79,12 +93,10 @@ def _wg_write_config(wg_conf: WgConfigBase,
     Gateway config is similar to client config but
     includes a [Peer] section for every client not just gateways
     """
-    all_okay: bool = True
+    rendered = WgRendered(acct_name, prof_name, alternate)
     acct = wg_conf.accts[acct_name]
     prof = acct.profile[prof_name]
     vpninfo = wg_conf.vpninfo
-    vpn_name = vpninfo.name
-    work_dir = wg_conf.opts.work_dir
 
     #
     # when vpninfo.peer_to_peer is on, use network prefix
@@ -102,19 +114,15 @@ def _wg_write_config(wg_conf: WgConfigBase,
     #
     # Top of config file
     #
-    data = _file_header(prof)
-
-    acct_dir = _get_acct_dir(work_dir, vpn_name, acct_name)
-    if not acct_dir:
-        return False
+    data: list[str] = [_file_header(prof)]
 
     #
     # [Interface]
     #   Address here is wireguard IP (host bits with vpn prefix)
     #
     interface_data = wg_interface_data(acct_info, vpninfo, prof)
-    data += interface_data
-    data += '\n'
+    data.append(interface_data)
+    data.append('\n')
 
     #
     # [Peer]
@@ -122,15 +130,47 @@ def _wg_write_config(wg_conf: WgConfigBase,
     #
     gateway_data = _wg_write_peer_gateways(wg_conf, vpn_nets, prof, alternate)
     if alternate and not gateway_data:
-        return True
-    data += gateway_data
+        return rendered
+    data.append(gateway_data)
 
     #
     # [Peer]
     #   - Clients (only in gateway configs)
     #
     if prof.is_gw:
-        data += _wg_write_peer_clients(wg_conf, vpn_nets, prof)
+        data.append(_wg_write_peer_clients(wg_conf, vpn_nets, prof))
+
+    rendered.data = ''.join(data)
+    return rendered
+
+
+def wg_save_config(wg_conf: WgConfigBase, rendered: WgRendered) -> bool:
+    """
+    Write rendered wireguard config and its QR code.
+    """
+    if rendered.output:
+        Msg.plain(rendered.output)
+
+    if not rendered.okay:
+        return False
+
+    config_data = rendered.data
+    if not config_data:
+        return True
+
+    all_okay: bool = True
+    acct_name = rendered.acct_name
+    prof_name = rendered.prof_name
+    alternate = rendered.alternate
+
+    acct = wg_conf.accts[acct_name]
+    prof = acct.profile[prof_name]
+    vpn_name = wg_conf.vpninfo.name
+    work_dir = wg_conf.opts.work_dir
+
+    acct_dir = _get_acct_dir(work_dir, vpn_name, acct_name)
+    if not acct_dir:
+        return False
 
     #
     # Write the config
@@ -150,7 +190,8 @@ def _wg_write_config(wg_conf: WgConfigBase,
     #
     ok_comments = ['pre-compact', 'vpn-name', 'account-name', 'profile-name',
                    'is-gateway']
-    (ok, changed) = write_db_file(data, fpath, ok_comments=ok_comments)
+    (ok, changed) = write_db_file(config_data, fpath,
+                                  ok_comments=ok_comments)
     if not ok:
         Msg.err(f'Error writing wg config: {fpath}\n')
         all_okay = False
@@ -160,10 +201,10 @@ def _wg_write_config(wg_conf: WgConfigBase,
         Msg.plain(f'      {id_str} wg config {alt}updated\n')
 
     #
-    # Generate QR code (not for gateways)
+    # QR code (not for gateways)
     # - dont keep history for these as trivial
     #   generate - they're just QR of corresponding .conf file.
-    # Only generate qr if the wg config changed
+    # - made after all configs are written (see WgQrCodes)
     # delete qr code if gateway and exists
     #
     qr_dir = _get_qr_dir(acct_dir)
@@ -171,11 +212,8 @@ def _wg_write_config(wg_conf: WgConfigBase,
     if prof.is_gw:
         if os.path.isfile(qr_file):
             os_unlink(qr_file)
-    elif changed:
-        fmode = restrict_file_mode()
-        if not text_to_qr_file(data, qr_file, fmode):
-            # annoying not fatal
-            Msg.warn(f'Error creating QR code: {qr_file}\n')
+    else:
+        wg_conf.qr_codes.add(config_data, qr_file, changed)
 
     return all_okay
 
@@ -235,12 +273,13 @@ def _wg_write_peer_gateways(wg_conf: WgConfigBase,
     no peers are returned
     """
     header = '#\n# Gateways\n#\n'
-    data = ''
+    data: list[str] = []
 
     if alternate and not prof.alternate_wanted:
-        return data
+        return ''
 
     vpninfo = wg_conf.vpninfo
+    peer_cache = wg_conf.peer_cache
     wg_peer = WgPeerData()
     nets_shared = wg_conf.nets_shared
     id_str = prof.ident.id_str
@@ -283,11 +322,12 @@ def _wg_write_peer_gateways(wg_conf: WgConfigBase,
             wg_peer.peer_to_peer = vpninfo.peer_to_peer
             wg_peer.vpn_nets = vpn_nets
 
-            data += wg_peer.data()
+            data.append(peer_cache.data(wg_peer))
 
-    if data:
-        data = header + data
-    return data
+    peers_data = ''.join(data)
+    if peers_data:
+        peers_data = header + peers_data
+    return peers_data
 
 
 def _wg_write_peer_clients(wg_conf: WgConfigBase, vpn_nets: list[str],
@@ -296,9 +336,10 @@ def _wg_write_peer_clients(wg_conf: WgConfigBase, vpn_nets: list[str],
     If this config is a gateway, then add all the clients it supports.
     Return data as a string to be written to config file.
     """
-    data = '\n#\n# Clients\n#\n'
+    data: list[str] = ['\n#\n# Clients\n#\n']
 
     vpninfo = wg_conf.vpninfo
+    peer_cache = wg_conf.peer_cache
     wg_peer = WgPeerData()
     nets_shared = wg_conf.nets_shared
     id_str = prof.ident.id_str
@@ -334,6 +375,6 @@ def _wg_write_peer_clients(wg_conf: WgConfigBase, vpn_nets: list[str],
             wg_peer.vpn_nets = vpn_nets
             wg_peer.alternate = False
 
-            data += wg_peer.data()
+            data.append(peer_cache.data(wg_peer))
 
-    return data
+    return ''.join(data)
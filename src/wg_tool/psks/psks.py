@@ -8,7 +8,7 @@ import os
 from utils import Msg
 from utils import read_toml_file
 from utils.debug import pprint
-from crypto import gen_psk
+from crypto import gen_psks
 
 from data import get_vpnpsk_file
 from data import write_dict
@@ -20,117 +20,176 @@ class Psks:
     Each pair of profiles, where at least 1 profile is a gatwway
     share one psk.
 
-    For each psk they index key compresses a pair of profile ID tags
+    Each psk is indexed by the ordered pair of profile ID tags.
+    A reverse index maps each tag to all the pairs it is part of.
+    On file the pair is saved using "tag_hi+tag_lo" as the key.
+
+    changed is set whenever a psk is added, replaced or dropped
+    after being read from file.
     """
     def __init__(self):
-        self.psk: dict[str, str] = {}
+        self.psk: dict[tuple[str, str], str] = {}
+        self._tag_pairs: dict[str, set[tuple[str, str]]] = {}
+        self.changed: bool = False
 
-    def to_dict(self) -> dict[str, str]:
+    def to_dict(self) -> dict[str, dict[str, str]]:
         """
         Return dictionary of self
         """
-        attribs = vars(self).copy()
+        psk = {f'{pair[0]}+{pair[1]}': val for (pair, val) in self.psk.items()}
+        attribs = {'psk': psk}
         return attribs
 
-    def from_dict(self, attribs: dict[str, str]):
+    def from_dict(self, attribs: dict[str, dict[str, str]]):
         """
         Populate from dictionary
         """
-        for (k, v) in attribs.items():
-            setattr(self, k, v)
+        psk_dict = attribs.get('psk')
+        if not psk_dict or not isinstance(psk_dict, dict):
+            return
+
+        for (name, psk) in psk_dict.items():
+            tags = name.split('+')
+            if len(tags) != 2:
+                Msg.warn(f'psks: skipping bad tag pair {name}\n')
+                continue
+            self._set(self.pair_from_tags(tags[0], tags[1]), psk)
+
+    def pair_from_tags(self, tag1: str, tag2: str) -> tuple[str, str]:
+        """
+        Make key from tag pair.
+        Tags are ordered so psk[t1, t2] = psk[t2, t1]
+        """
+        if tag1 > tag2:
+            return (tag1, tag2)
+        return (tag2, tag1)
 
     def name_from_tags(self, tag1: str, tag2: str) -> str:
         """
-        Make key from tag pair
+        Make name from tag pair as used in the psk file.
         """
         if not (tag1 and tag2):
             Msg.warn('psks: missing tag\n')
             return ''
 
-        # order tags so psk[t1, t2] = psk[t2, t1]
-        if tag1 > tag2:
-            pair = (tag1, tag2)
-        else:
-            pair = (tag2, tag1)
-
+        pair = self.pair_from_tags(tag1, tag2)
         name = pair[0] + '+' + pair[1]
         return name
 
+    def pairs(self) -> list[tuple[str, str, str]]:
+        """
+        Return list of (tag_hi, tag_lo, psk) for all pairs.
+        """
+        return [(pair[0], pair[1], psk) for (pair, psk) in self.psk.items()]
+
     def lookup_psk(self, tag1: str, tag2: str) -> str:
         """
         Return the shared key for the tag pair
-        PSK will be generated for this tag pair if not found
-        unless no_psk is set True.
+        or empty string if there is none.
 
         Legacy no_psk:
-        If no_psk is True then this tag pair will not have a PSK
         Some legacy clients may not have shared a PSK for this tag pair.
-        This allows us to support those legacy older configs.
+        Such pairs have an empty psk.
         """
-        pair_name = self.name_from_tags(tag1, tag2)
-        if not pair_name:
-            return ''
+        if tag1 > tag2:
+            psk = self.psk.get((tag1, tag2))
+        else:
+            psk = self.psk.get((tag2, tag1))
 
-        psk = self.psk.get(pair_name)
         if not psk:
             psk = ''
         return psk
 
-    def get_set_shared_key(self, tag1: str, tag2: str, no_psk: bool = False
-                           ) -> str:
+    def set_shared_keys(self, tag_pairs: list[tuple[str, str]]) -> int:
         """
-        Return the shared key for the tag pair
-        PSK will be generated for this tag pair if not found
-        unless no_psk is set True.
+        Generate and install PSKs for all the tag pairs.
 
-        Legacy no_psk:
-        If no_psk is True then this tag pair will not have a PSK
-        Some legacy clients may not have shared a PSK for this tag pair.
-        This allows us to support those legacy older configs.
+        All PSKs are generated in one batch.
+        Pairs that already have a PSK are left alone
+        and a pair listed as (A, B) and (B, A) gets one PSK.
+
+        Returns:
+            Number of PSKs generated.
         """
-        pair_name = self.name_from_tags(tag1, tag2)
-        if not pair_name:
-            return ''
+        pairs: dict[tuple[str, str], bool] = {}
+        for (tag1, tag2) in tag_pairs:
+            if not (tag1 and tag2):
+                Msg.warn('psks: missing tag\n')
+                continue
+            pair = self.pair_from_tags(tag1, tag2)
+            if not self.psk.get(pair):
+                pairs[pair] = True
 
-        psk = self.psk.get(pair_name)
-        if not psk:
-            if no_psk:
-                psk = ''
-            else:
-                psk = gen_psk()
-            self.psk[pair_name] = psk
+        if not pairs:
+            return 0
 
-        return psk
+        psks = gen_psks(len(pairs))
+        for (pair, psk) in zip(pairs, psks):
+            self._set(pair, psk)
+
+        return len(psks)
 
     def put_shared_key(self, tag1: str, tag2: str, psk: str):
         """
         Install psk for the tag pair
         """
-        pair_name = self.name_from_tags(tag1, tag2)
-        self.psk[pair_name] = psk
+        if not (tag1 and tag2):
+            Msg.warn('psks: missing tag\n')
+            return
+        self._set(self.pair_from_tags(tag1, tag2), psk)
+
+    def drop_tag(self, tag: str):
+        """
+        Remove all psks the tag is part of.
+        """
+        pairs = self._tag_pairs.get(tag)
+        if not pairs:
+            return
+
+        for pair in list(pairs):
+            self._drop_pair(pair)
 
-    def clean_unknown_tags(self, gw_tags: list[str], tags: list[str]):
+    def clean_unknown_tags(self, tags: list[str]):
         """
         Clean any unknown tags from our psk list.
         Shouldn't be needed unless a profile is manually deleted.
-        Tag pairs are between every gw and every other tag
         We never remove a profile, only mark it inactive of not needed.
         Could happen on partial migrations which failed in middle too.
         """
-        known_names: list[str] = []
-        for gw_tag in gw_tags:
-            for tag in tags:
-                if tag == gw_tag:
-                    continue
-                name = self.name_from_tags(gw_tag, tag)
-                known_names.append(name)
-
-        # drop any unknown
-        names = list(self.psk.keys())
-        for name in names:
-            if name not in known_names:
-                Msg.warn(f'Dropping unknown tag pair: {name}\n')
-                del self.psk[name]
+        known_tags = set(tags)
+
+        # drop any unknown tag with all its pairs
+        unknown = [tag for tag in self._tag_pairs if tag not in known_tags]
+        for tag in unknown:
+            Msg.warn(f'Dropping unknown tag pairs: {tag}\n')
+            self.drop_tag(tag)
+
+    def _set(self, pair: tuple[str, str], psk: str):
+        """
+        Install psk for ordered pair and update tag index
+        """
+        if self.psk.get(pair) != psk:
+            self.changed = True
+        self.psk[pair] = psk
+        for tag in pair:
+            tag_pairs = self._tag_pairs.get(tag)
+            if tag_pairs is None:
+                tag_pairs = set()
+                self._tag_pairs[tag] = tag_pairs
+            tag_pairs.add(pair)
+
+    def _drop_pair(self, pair: tuple[str, str]):
+        """
+        Remove one ordered pair and update tag index
+        """
+        if self.psk.pop(pair, None) is not None:
+            self.changed = True
+        for tag in pair:
+            tag_pairs = self._tag_pairs.get(tag)
+            if tag_pairs:
+                tag_pairs.discard(pair)
+                if not tag_pairs:
+                    del self._tag_pairs[tag]
 
     def read_file(self, work_dir: str, vpn_name: str) -> bool:
         """
@@ -144,6 +203,7 @@ class Psks:
         psk_dict = read_toml_file(psk_file)
         if psk_dict and isinstance(psk_dict, dict):
             self.from_dict(psk_dict)
+        self.changed = False
         return True
 
     def write_file(self, work_dir: str, vpn_name: str, footer: str) -> bool:
@@ -20,6 +20,9 @@ class PeerReport:
     """
     Report data for one peer
     """
+    __slots__ = ('pubkey', 'endpoint', 'allowed_ips', 'latest_handshake',
+                 'transfer', 'interface', 'listening_port', 'acct_prof')
+
     def __init__(self):
         # Pure Peers
         self.pubkey: str = ''
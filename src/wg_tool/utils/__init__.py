@@ -9,16 +9,20 @@ from .file_tools import (save_prev_symlink, file_symlink, make_dir_path)
 from .file_tools import (dir_list, os_chmod)
 from .file_tools import set_restrictive_file_perms_walk
 from .file_tools import set_restrictive_file_perms
+from .perms_audit import file_perms_audit
 from .file_tools import os_rename
 from .file_tools import os_unlink
 from .run_prog_local import run_prog
 from .msg import (Msg)
+from .fields import (class_fields, fields_to_dict, is_field)
 from .toml import (dict_to_toml_string, read_toml_file, write_toml_file)
+from .toml_cache import TomlCache
 from .qr_code import text_to_qr_file
 from .read_write import open_file
 from .version import version
 from .report import (state_marker)
 from .read_write import write_path_atomic
+from .write_batch import WriteBatch
 from .comments import clean_comments
 from .comments import clean_comment
 from .text import csv_string_to_list
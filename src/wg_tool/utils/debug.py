@@ -8,6 +8,7 @@ add class method pprint() to class.
 """
 from typing import Any
 
+from .fields import fields_to_dict
 from .msg import Msg
 
 
@@ -20,7 +21,9 @@ def pprint(this: Any, recurs: bool = False):
         return
 
     Msg.info(f'{this.__class__.__name__} instance:\n')
-    for (attr, val) in vars(this).items():
+    attribs = dict(vars(this)) if hasattr(this, '__dict__') else {}
+    attribs |= fields_to_dict(this)
+    for (attr, val) in attribs.items():
         if not attr.startswith('__'):
             Msg.plain(f'{attr:>15s}: ')
 
@@ -38,7 +41,10 @@ def pprint(this: Any, recurs: bool = False):
 def _is_class(this: Any) -> bool:
     """
     Returns true if this is an instance of class
+    (with instance dict or slots)
     """
+    if hasattr(type(this), '__slots__'):
+        return True
     try:
         getattr(this, '__dict__')
     except AttributeError:
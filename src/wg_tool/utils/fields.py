@@ -0,0 +1,50 @@
+# SPDX-License-Identifier: GPL-2.0-or-later
+# SPDX-FileCopyrightText: © 2022-present  Gene C <arch@sapience.com>
+"""
+Declared fields of slotted classes.
+
+Data classes list their attributes in __slots__, in the same order
+they are set in __init__(), which is also the order they are saved.
+The fields of an instance are those of its class and all its bases.
+"""
+from functools import cache
+from typing import Any
+
+
+@cache
+def class_fields(cls: type) -> tuple[str, ...]:
+    """
+    All slot names of cls (bases first).
+    """
+    fields: list[str] = []
+    for klass in reversed(cls.__mro__):
+        slots = klass.__dict__.get('__slots__', ())
+        if isinstance(slots, str):
+            slots = (slots,)
+        for name in slots:
+            if not name.startswith('__') and name not in fields:
+                fields.append(name)
+    return tuple(fields)
+
+
+def fields_to_dict(obj: Any) -> dict[str, Any]:
+    """
+    vars() equivalent for slotted instance:
+    map field name -> value (unset fields are skipped)
+    """
+    cls: type = type(obj)
+    attribs: dict[str, Any] = {}
+    for name in class_fields(cls):
+        try:
+            attribs[name] = getattr(obj, name)
+        except AttributeError:
+            continue
+    return attribs
+
+
+def is_field(obj: Any, name: str) -> bool:
+    """
+    True if name is a declared field of obj
+    """
+    cls: type = type(obj)
+    return name in class_fields(cls)
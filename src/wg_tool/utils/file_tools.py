@@ -8,6 +8,13 @@ import stat
 import tempfile
 
 from .msg import Msg
+from .tree_walk import walk_dirs
+from .write_batch import WriteBatch
+
+# file -> rw-r---- (with ug+x for executables)
+#  dir -> rwxr-x---
+_FILE_PERM: int = stat.S_IRUSR | stat.S_IWUSR | stat.S_IRGRP
+_DIR_PERM: int = stat.S_IRWXU | stat.S_IRGRP | stat.S_IXGRP
 
 
 def save_prev_symlink(fdir: str, orig: str):
@@ -80,8 +87,13 @@ def file_symlink(target: str, linkname: str) -> bool:
     """
     file_symlink(target, linkname)
     Does equivalent to:  ln -s src dst
+    If a WriteBatch is active the link is changed at commit.
     Returns True when succeeds.
     """
+    if WriteBatch.active:
+        WriteBatch.add_symlink(target, linkname)
+        return True
+
     #
     # check if its there and correct
     # If there but wrong, remove the old link
@@ -124,10 +136,32 @@ def make_dir_path(path_dir: str, dirmode: int = -1) -> bool:
     """
     if dirmode < 0:
         dirmode = stat.S_IRWXU | stat.S_IRGRP | stat.S_IXGRP
+
+    #
+    # Each missing component is created with dirmode
+    # (chmod as well since umask may have removed some bits).
+    # Existing directories are left as they are.
+    #
+    missing: list[str] = []
+    path = path_dir
+    while path and not os.path.isdir(path):
+        missing.append(path)
+        (path, tail) = os.path.split(path)
+        if not tail:
+            break
+
+    mkdir_mode = dirmode if dirmode > 0 else 0o777
     try:
-        os.makedirs(path_dir, exist_ok=True)
-        if dirmode > 0:
-            os.chmod(path_dir, dirmode)
+        for one_dir in reversed(missing):
+            try:
+                os.mkdir(one_dir, mkdir_mode)
+            except FileExistsError:
+                # made by someone else meanwhile
+                if not os.path.isdir(one_dir):
+                    return False
+                continue
+            if dirmode > 0:
+                os.chmod(one_dir, dirmode)
     except OSError:
         return False
     return True
@@ -246,7 +280,7 @@ def set_restrictive_file_perms_walk(topdir: str) -> bool:
     return okay
 
 
-def set_restrictive_file_perms(topdir: str) -> bool:
+def set_restrictive_file_perms(topdir: str, jobs: int = 1) -> bool:
     """
     This is slower than os.walk() on NFS
     Both are fast on non-NFS
@@ -256,62 +290,71 @@ def set_restrictive_file_perms(topdir: str) -> bool:
         other =
      where X means x if a dir
      Return True unless any os.chmod() throws exception
-    """
-    # pylint: disable=too-many-branches
-    scan = None
-    try:
-        scan = os.scandir(topdir)
-    except OSError:
-        return True
 
-    if not scan:
+    With jobs > 1, directories are done by a pool of threads which
+    keeps several stat/chmod round trips in flight on NFS.
+    """
+    if not os.path.isdir(topdir):
         return True
 
-    # file -> rw-r---- (with ug+x for executables)
-    #  dir -> rwxr-x---
-    file_perm = stat.S_IRUSR | stat.S_IWUSR | stat.S_IRGRP
-    dir_perm = stat.S_IRWXU | stat.S_IRGRP | stat.S_IXGRP
-
     okay = True
-    if not os_chmod(topdir, dir_perm):
+    if not os_chmod(topdir, _DIR_PERM):
         # Keep going so can do what we can.
         okay = False
 
-    for item in scan:
-
-        if item.is_symlink():
-            continue
-
-        fstat = item.stat()
-        fmode = fstat.st_mode
+    if not walk_dirs(topdir, _restrict_one_dir, jobs):
+        okay = False
+    return okay
 
-        if item.is_file():
-            #
-            # Files:
-            # - ug+x for executables
-            #
-            fperm = file_perm
 
-            if fmode & stat.S_IXUSR:
-                fperm |= stat.S_IXUSR
+def _restrict_one_dir(dirpath: str) -> tuple[bool, list[str]]:
+    """
+    Restrict permissions of everything in dirpath (not recursive).
+    Returns (okay, subdirectories)
+    """
+    subdirs: list[str] = []
+    try:
+        scan = os.scandir(dirpath)
+    except OSError:
+        return (True, subdirs)
 
-            if fmode & stat.S_IXGRP:
-                fperm |= stat.S_IXGRP
+    okay = True
+    with scan:
+        for item in scan:
 
-            if fmode != fperm:
-                if not os_chmod(item.path, fperm):
-                    okay = False
+            if item.is_symlink():
+                continue
 
-        elif item.is_dir():
-            #
-            # Directories:
-            #  set perms then recurse
-            #
-            fperm = dir_perm
-            if fmode != fperm:
-                if not os_chmod(item.path, dir_perm):
-                    okay = False
-            if not set_restrictive_file_perms(item.path):
-                okay = False
+            try:
+                fmode = item.stat().st_mode
+            except OSError:
+                continue
 
-    return okay
+            if item.is_file():
+                #
+                # Files:
+                # - ug+x for executables
+                #
+                fperm = _FILE_PERM
+
+                if fmode & stat.S_IXUSR:
+                    fperm |= stat.S_IXUSR
+
+                if fmode & stat.S_IXGRP:
+                    fperm |= stat.S_IXGRP
+
+                if stat.S_IMODE(fmode) != fperm:
+                    if not os_chmod(item.path, fperm):
+                        okay = False
+
+            elif item.is_dir():
+                #
+                # Directories:
+                #  set perms - caller recurses
+                #
+                if stat.S_IMODE(fmode) != _DIR_PERM:
+                    if not os_chmod(item.path, _DIR_PERM):
+                        okay = False
+                subdirs.append(item.path)
+
+    return (okay, subdirs)
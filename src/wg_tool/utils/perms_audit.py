@@ -0,0 +1,111 @@
+# SPDX-License-Identifier: GPL-2.0-or-later
+# SPDX-FileCopyrightText: © 2022-present  Gene C <arch@sapience.com>
+"""
+Audit file permissions without changing anything.
+
+Only entries changed since the last clean audit (the watermark)
+are checked. A directory whose mtime and ctime are both older than
+the watermark has had nothing added (or renamed into it) since, so
+its files are not stat'ed - only its subdirectories are followed.
+
+Permission changes to older files do not change their directory,
+so are not seen here. Use --file-perms for that.
+"""
+from functools import partial
+import os
+import stat
+import time
+
+from .msg import Msg
+from .read_write import write_path_atomic
+from .tree_walk import walk_dirs
+
+# anything outside rwxr-x--- is drift
+_ALLOWED: int = stat.S_IRWXU | stat.S_IRGRP | stat.S_IXGRP
+
+
+def file_perms_audit(topdirs: list[str], mark_file: str, jobs: int = 1
+                     ) -> bool:
+    """
+    Report entries under topdirs, new since watermark saved in mark_file,
+    with permissions other than user rwx / group rx.
+    Watermark is only moved forward if no drift was found
+    so drift keeps being reported until fixed.
+    Returns True if no drift found.
+    """
+    mark = _read_mark(mark_file)
+    started = time.time_ns()
+
+    drift: list[tuple[str, int]] = []
+    visit = partial(_audit_one_dir, mark, drift)
+    for topdir in topdirs:
+        if os.path.isdir(topdir):
+            walk_dirs(topdir, visit, jobs)
+
+    if drift:
+        Msg.warn('File permissions drift (use --file-perms to fix):\n')
+        for (path, mode) in sorted(drift):
+            Msg.plain(f'  {mode:04o} {path}\n')
+        return False
+
+    Msg.plainverb(' File permissions audit okay\n', level=2)
+    if not write_path_atomic(f'{started}\n', mark_file):
+        Msg.warn(f'Error saving audit watermark {mark_file}\n')
+    return True
+
+
+def _read_mark(mark_file: str) -> int:
+    """
+    Time (ns) of last clean audit or 0 if none.
+    """
+    try:
+        with open(mark_file, 'r', encoding='utf-8') as fob:
+            return int(fob.read().strip())
+    except (OSError, ValueError):
+        return 0
+
+
+def _audit_one_dir(mark: int, drift: list[tuple[str, int]], dirpath: str
+                   ) -> tuple[bool, list[str]]:
+    """
+    Check dirpath and its files if changed since mark (not recursive).
+    Returns (True, subdirectories)
+    """
+    subdirs: list[str] = []
+    try:
+        dstat = os.stat(dirpath)
+        scan = os.scandir(dirpath)
+    except OSError:
+        return (True, subdirs)
+
+    if dstat.st_ctime_ns > mark:
+        _check_mode(dirpath, dstat.st_mode, drift)
+
+    changed = dstat.st_mtime_ns > mark or dstat.st_ctime_ns > mark
+    with scan:
+        for item in scan:
+            if item.is_dir(follow_symlinks=False):
+                subdirs.append(item.path)
+                continue
+
+            if not changed or item.is_symlink():
+                continue
+
+            try:
+                fstat = item.stat(follow_symlinks=False)
+            except OSError:
+                continue
+            if fstat.st_ctime_ns > mark:
+                _check_mode(item.path, fstat.st_mode, drift)
+
+    return (True, subdirs)
+
+
+def _check_mode(path: str, mode: int, drift: list[tuple[str, int]]):
+    """
+    Add path to drift if mode has bits that are not allowed
+    """
+    perms = stat.S_IMODE(mode)
+    if perms & ~_ALLOWED:
+        # list.append is thread safe
+        drift.append((path, perms))
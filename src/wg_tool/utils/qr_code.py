@@ -52,9 +52,16 @@ def text_to_qr_file(data: str, qr_fname: str, fmode: int = -1) -> bool:
     (_base, ext) = os.path.splitext(qr_fname)
     ext = ext.replace('.', '')
 
+    #
+    # Create file with requested mode so it is never readable by others.
+    # chmod is still needed if file already existed.
+    #
+    cmode = fmode if fmode > 0 else 0o666
     try:
-        img.save(qr_fname, ext)
-    except PermissionError:
+        fd = os.open(qr_fname, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, cmode)
+        with os.fdopen(fd, 'wb') as fob:
+            img.save(fob, ext if ext else None)
+    except OSError:
         return False
 
     if fmode > 0 and not os_chmod(qr_fname, fmode):
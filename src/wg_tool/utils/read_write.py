@@ -11,6 +11,7 @@ import stat
 from .msg import (Msg)
 from .file_tools import make_dir_path
 from .file_tools import os_rename
+from .write_batch import WriteBatch
 
 
 def open_file(path: str, mode: str) -> IO | None:
@@ -69,6 +70,9 @@ def write_path_atomic(data: str | list[str],
             If true then if fpath exists it will be moved
             to Prev/xxx
 
+    If a WriteBatch is active (and not save_prev), the temp file
+    is not synced here and the rename happens at commit.
+
     Return:
         bool:
             Success or fail.
@@ -104,9 +108,12 @@ def write_path_atomic(data: str | list[str],
     else:
         fob.write(data)
 
+    batch = WriteBatch.active and not save_prev
+
     fob.flush()
     fd = fob.fileno()
-    os.fsync(fd)
+    if not batch:
+        os.fsync(fd)
 
     #
     # Set any requested permissions
@@ -123,6 +130,10 @@ def write_path_atomic(data: str | list[str],
 
     fob.close()
 
+    if batch:
+        WriteBatch.add_rename(fpath_tmp, fpath)
+        return True
+
     #
     # Save any existing to dirname/Prev if requested
     #
@@ -6,12 +6,12 @@ toml helper functions
 """
 from typing import (Any)
 import os
-from copy import deepcopy
 import tomllib as toml
 import tomli_w
 
 from .read_write import (open_file, write_path_atomic)
 from .msg import Msg
+from .toml_cache import TomlCache
 
 
 def _dict_none_to_empty(dic: dict[str, Any]) -> dict[str, Any]:
@@ -23,12 +23,15 @@ def _dict_none_to_empty(dic: dict[str, Any]) -> dict[str, Any]:
     if not dic:
         return clean
 
-    clean = deepcopy(dic)
-    for (key, val) in clean.items():
+    for (key, val) in dic.items():
         if val is None:
             clean[key] = ''
         elif isinstance(val, dict):
             clean[key] = _dict_none_to_empty(val)
+        elif isinstance(val, list):
+            clean[key] = val.copy()
+        else:
+            clean[key] = val
     return clean
 
 
@@ -67,9 +70,19 @@ def dict_to_toml_string(dic: dict[str, Any], drop_empty: bool = False) -> str:
 def read_toml_file(fpath: str) -> dict[str, Any]:
     """
     read toml file and return a dictionary
+     - uses parsed copy from TomlCache when available.
     """
     this_dict: dict[str, Any] = {}
     data: str = ''
+
+    cache = TomlCache.find(fpath)
+    if cache:
+        (sig, cached) = cache.get(fpath)
+        if sig is None:
+            return this_dict
+        if cached is not None:
+            return cached
+
     if os.path.exists(fpath):
         fobj = open_file(fpath, 'r')
         if fobj:
@@ -80,6 +93,10 @@ def read_toml_file(fpath: str) -> dict[str, Any]:
                 this_dict = toml.loads(data)
             except toml.TOMLDecodeError as exc:
                 Msg.err(f'File format error {exc}\n')
+                return this_dict
+
+    if cache and sig:
+        cache.put(fpath, sig, this_dict)
     return this_dict
 
 
@@ -0,0 +1,261 @@
+# SPDX-License-Identifier: GPL-2.0-or-later
+# SPDX-FileCopyrightText: © 2022-present  Gene C <arch@sapience.com>
+"""
+Cache of parsed toml files.
+
+While a cache is open for a directory, read_toml_file() of any
+file below it first checks the cache. An entry is used only if
+the file (and symlink target if a link) has the same
+mtime, size and inode as when it was parsed.
+Otherwise the file is parsed and the entry replaced.
+
+The toml files remain the source of truth - the cache can be removed
+at any time. It is rewritten (with only the entries used this time)
+when it is closed, if anything changed.
+
+Entries are stored marshalled so every lookup returns a fresh copy
+which the caller is free to change. Marshal only handles plain
+types and, unlike pickle, loading never runs code. Data it cannot
+handle (e.g. toml dates) is simply not cached. The cache file is
+only used if owned by us and not writable by group or others.
+
+prefetch() fills the cache for a list of files ahead of the
+(serial) readers. Files are read concurrently by a pool of threads
+which helps when storage latency dominates (cold cache, NFS).
+For a large number of files a pool of processes is used instead,
+so the parsing is also done in parallel.
+"""
+from concurrent.futures import (ProcessPoolExecutor, ThreadPoolExecutor)
+from typing import Any
+import marshal
+import multiprocessing
+import os
+import stat
+import tomllib as toml
+
+from .msg import Msg
+
+type _Sig = tuple[str, int, int, int]
+
+# Use processes (rather than threads) when parsing at least this many
+_PROCESS_MIN: int = 500
+
+
+class TomlCache:
+    """
+    Parsed toml files below topdir saved in cache_path.
+
+    verify:
+        When True cached entries are not used (cache is rebuilt).
+    """
+    verify: bool = False
+    _caches: dict[str, 'TomlCache'] = {}
+
+    def __init__(self, topdir: str, cache_path: str):
+        self.topdir: str = topdir
+        self.cache_path: str = cache_path
+        self.entries: dict[str, tuple[_Sig, bytes]] = {}
+        self.used: dict[str, tuple[_Sig, bytes]] = {}
+        self.changed: bool = False
+
+        if not TomlCache.verify and os.path.isfile(cache_path):
+            self._load()
+
+    @classmethod
+    def open(cls, topdir: str, cache_path: str) -> 'TomlCache':
+        """
+        Start using cache for files below topdir
+        """
+        cache = TomlCache(topdir, cache_path)
+        cls._caches[topdir] = cache
+        return cache
+
+    @classmethod
+    def close(cls, topdir: str):
+        """
+        Stop using cache for topdir and save it if changed.
+        """
+        cache = cls._caches.pop(topdir, None)
+        if cache:
+            cache.save()
+
+    @classmethod
+    def find(cls, fpath: str) -> 'TomlCache | None':
+        """
+        Cache, if any, holding fpath
+        """
+        for (topdir, cache) in cls._caches.items():
+            if fpath.startswith(topdir + os.sep):
+                return cache
+        return None
+
+    def get(self, fpath: str) -> tuple[_Sig | None, dict[str, Any] | None]:
+        """
+        Return (signature of fpath, cached data or None).
+        Signature is None if file cannot be stat'ed.
+        """
+        sig = _file_sig(fpath)
+        if sig is None:
+            return (None, None)
+
+        key = os.path.relpath(fpath, self.topdir)
+        entry = self.used.get(key) or self.entries.get(key)
+        if entry is None or entry[0] != sig:
+            return (sig, None)
+
+        try:
+            data = marshal.loads(entry[1])
+        except (ValueError, EOFError, TypeError):
+            return (sig, None)
+        if not isinstance(data, dict):
+            return (sig, None)
+
+        self.used[key] = entry
+        return (sig, data)
+
+    def put(self, fpath: str, sig: _Sig, data: dict[str, Any]):
+        """
+        Save parsed data of fpath (if plain types only)
+        """
+        try:
+            blob = marshal.dumps(data)
+        except ValueError:
+            return
+        key = os.path.relpath(fpath, self.topdir)
+        self.used[key] = (sig, blob)
+        self.changed = True
+
+    def prefetch(self, fpaths: list[str], jobs: int = 1) -> tuple[int, int]:
+        """
+        Parse each of fpaths not already cached using jobs workers.
+        Files that fail to parse are left for the reader
+        to report.
+        Returns (number parsed, number already cached)
+        """
+        todo: list[tuple[str, str, _Sig]] = []
+        num_cached = 0
+        for fpath in fpaths:
+            sig = _file_sig(fpath)
+            if sig is None:
+                continue
+            key = os.path.relpath(fpath, self.topdir)
+            entry = self.used.get(key) or self.entries.get(key)
+            if entry is not None and entry[0] == sig:
+                num_cached += 1
+                continue
+            todo.append((fpath, key, sig))
+
+        paths = [item[0] for item in todo]
+        if jobs > 1 and len(paths) > 1:
+            if len(paths) >= _PROCESS_MIN:
+                chunksize = max(1, len(paths) // (4 * jobs))
+                mp_context = multiprocessing.get_context('fork')
+                with ProcessPoolExecutor(max_workers=jobs,
+                                         mp_context=mp_context) as pool:
+                    results = list(pool.map(_parse_one, paths,
+                                            chunksize=chunksize))
+            else:
+                with ThreadPoolExecutor(max_workers=jobs) as pool:
+                    results = list(pool.map(_parse_one, paths))
+        else:
+            results = [_parse_one(path) for path in paths]
+
+        for ((_fpath, key, sig), data) in zip(todo, results):
+            if data is not None:
+                self.used[key] = (sig, data)
+                self.changed = True
+        return (len(todo), num_cached)
+
+    def save(self) -> bool:
+        """
+        Write out the entries used (if anything changed)
+        """
+        if not (self.changed or self.used.keys() != self.entries.keys()):
+            return True
+
+        cache_dir = os.path.dirname(self.cache_path)
+        if not os.path.isdir(cache_dir):
+            return True
+
+        tmp_path = self.cache_path + '.tmp'
+        mode = stat.S_IRUSR | stat.S_IWUSR | stat.S_IRGRP
+        flags = os.O_WRONLY | os.O_CREAT | os.O_TRUNC
+        try:
+            fd = os.open(tmp_path, flags, mode)
+            with os.fdopen(fd, 'wb') as fob:
+                marshal.dump(self.used, fob)
+            os.replace(tmp_path, self.cache_path)
+        except OSError as exc:
+            Msg.warn(f'Error saving toml cache {self.cache_path}: {exc}\n')
+            return False
+        return True
+
+    def _load(self):
+        """
+        Read cache file - ignored if not readable, not ours,
+        writable by others or not what we saved.
+        """
+        try:
+            with open(self.cache_path, 'rb') as fob:
+                fstat = os.fstat(fob.fileno())
+                bad_mode = stat.S_IWGRP | stat.S_IWOTH
+                if fstat.st_uid != os.getuid() or fstat.st_mode & bad_mode:
+                    Msg.warn(f'Ignoring toml cache {self.cache_path}: '
+                             'not owned by us or writable by others\n')
+                    return
+                entries = marshal.load(fob)
+        except (OSError, EOFError, ValueError, TypeError) as exc:
+            Msg.plainverb(f'Ignoring toml cache {self.cache_path}: {exc}\n',
+                          level=2)
+            return
+
+        if isinstance(entries, dict):
+            self.entries = {key: entry for (key, entry) in entries.items()
+                            if _is_entry(key, entry)}
+
+
+def _is_entry(key: Any, entry: Any) -> bool:
+    """
+    True if key, entry are as saved: str, ((str, int, int, int), bytes)
+    """
+    if not (isinstance(key, str) and isinstance(entry, tuple)):
+        return False
+    if len(entry) != 2 or not isinstance(entry[1], bytes):
+        return False
+
+    sig = entry[0]
+    if not (isinstance(sig, tuple) and len(sig) == 4):
+        return False
+    if not isinstance(sig[0], str):
+        return False
+    return all(isinstance(item, int) for item in sig[1:])
+
+
+def _file_sig(fpath: str) -> _Sig | None:
+    """
+    (symlink target, mtime, size, inode) of file - following link.
+    None if not available.
+    """
+    try:
+        lstat = os.lstat(fpath)
+        link = ''
+        fstat = lstat
+        if stat.S_ISLNK(lstat.st_mode):
+            link = os.readlink(fpath)
+            fstat = os.stat(fpath)
+    except OSError:
+        return None
+    return (link, fstat.st_mtime_ns, fstat.st_size, fstat.st_ino)
+
+
+def _parse_one(fpath: str) -> bytes | None:
+    """
+    Worker: read and parse one toml file.
+    Returns the marshalled result or None if it failed.
+    """
+    try:
+        with open(fpath, 'r', encoding='utf-8') as fob:
+            data = fob.read()
+        return marshal.dumps(toml.loads(data))
+    except (OSError, UnicodeDecodeError, toml.TOMLDecodeError, ValueError):
+        return None
@@ -0,0 +1,44 @@
+# SPDX-License-Identifier: GPL-2.0-or-later
+# SPDX-FileCopyrightText: © 2022-present  Gene C <arch@sapience.com>
+"""
+Directory tree walker - optionally using a pool of threads.
+
+The visit function handles one directory (not recursive) and
+returns (okay, subdirectories). Each subdirectory is then visited.
+On NFS most of the time is spent waiting on the server, so
+visiting several directories at once helps.
+"""
+from concurrent.futures import (ThreadPoolExecutor, Future)
+from concurrent.futures import (wait, FIRST_COMPLETED)
+from typing import Callable
+
+type _Visit = Callable[[str], tuple[bool, list[str]]]
+
+
+def walk_dirs(topdir: str, visit: _Visit, jobs: int = 1) -> bool:
+    """
+    Call visit() on topdir and every directory below it.
+    Uses jobs threads if more than one.
+    Returns False if any visit was not okay.
+    """
+    okay = True
+    if jobs <= 1:
+        todo: list[str] = [topdir]
+        while todo:
+            (ok, subdirs) = visit(todo.pop())
+            if not ok:
+                okay = False
+            todo += subdirs
+        return okay
+
+    with ThreadPoolExecutor(max_workers=jobs) as pool:
+        pending: set[Future] = {pool.submit(visit, topdir)}
+        while pending:
+            (done, pending) = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                (ok, subdirs) = future.result()
+                if not ok:
+                    okay = False
+                for subdir in subdirs:
+                    pending.add(pool.submit(visit, subdir))
+    return okay
@@ -0,0 +1,312 @@
+# SPDX-License-Identifier: GPL-2.0-or-later
+# SPDX-FileCopyrightText: © 2022-present  Gene C <arch@sapience.com>
+"""
+Group commit of file writes.
+
+Normally write_path_atomic() syncs each temp file before renaming
+it into place. When a batch is active, temp files are written
+but not synced and the renames (and symlink changes) are held
+until commit():
+  - temp files synced together (one syncfs() per filesystem where
+    available, otherwise fsync of each temp file)
+  - temp symlinks made for every link to be changed
+  - one fsync of each directory holding temp files
+  - renames, then symlink flips, in the order they were requested
+  - one fsync of each directory changed.
+
+Nothing is changed until every temp file and temp link is on disk.
+If a rename or flip fails, commit stops there (see commit()). If
+anything goes wrong before commit, abort() drops the batch and
+its temp files.
+
+Each file (or symlink) only ever changes from its old complete
+content to its new complete content, but the files of a batch are
+switched one at a time: a crash during commit can leave some of
+them new and some old. Data files (Data/<vpn>) are always switched
+this way. Wireguard configs of a vpn are switched together, in
+one atomic step, only in snapshot mode (--wg-snapshot) where
+Data-wg/<vpn> is a symlink to a generation directory.
+"""
+from typing import (Any, Callable)
+import ctypes
+import os
+
+from .msg import Msg
+
+
+class WriteBatch:
+    """
+    Pending renames and symlinks (class level - one batch at a time).
+     - renames: fpath -> temp file
+     - links: linkname -> link target
+     - callbacks: called after a successful commit
+       (one returning False makes the commit fail)
+     - abort_callbacks: called if commit fails or batch is aborted
+    """
+    active: bool = False
+    _renames: dict[str, str] = {}
+    _links: dict[str, str] = {}
+    _callbacks: list[Callable[[], Any]] = []
+    _abort_callbacks: list[Callable[[], Any]] = []
+
+    @classmethod
+    def begin(cls):
+        """
+        Start holding renames / symlinks
+        """
+        cls.active = True
+
+    @classmethod
+    def add_rename(cls, tmp_path: str, fpath: str):
+        """
+        rename tmp_path to fpath at commit.
+        Later request for same fpath replaces earlier one.
+        """
+        cls._renames.pop(fpath, None)
+        cls._renames[fpath] = tmp_path
+
+    @classmethod
+    def add_symlink(cls, target: str, linkname: str):
+        """
+        Make linkname -> target at commit.
+        """
+        cls._links.pop(linkname, None)
+        cls._links[linkname] = target
+
+    @classmethod
+    def after_commit(cls, callback: Callable[[], Any]):
+        """
+        callback is called once the batch is committed.
+        """
+        cls._callbacks.append(callback)
+
+    @classmethod
+    def after_abort(cls, callback: Callable[[], Any]):
+        """
+        callback is called if the batch is not committed
+        (commit fails or abort).
+        """
+        cls._abort_callbacks.append(callback)
+
+    @classmethod
+    def commit(cls) -> bool:
+        """
+        Put everything in place.
+        Stops at the first rename or symlink flip that fails: the
+        files and links not yet switched keep their old content and
+        their temp files (and temp links) are removed. No link is
+        flipped unless all files were put in place (links may point
+        to one of them).
+        Returns False if any rename, link or callback failed.
+        """
+        cls.active = False
+        renames = cls._renames
+        links = cls._links
+        callbacks = cls._callbacks
+        abort_callbacks = cls._abort_callbacks
+        cls._renames = {}
+        cls._links = {}
+        cls._callbacks = []
+        cls._abort_callbacks = []
+
+        items = list(renames.items())
+        okay = _sync_files([tmp_path for (_fpath, tmp_path) in items])
+
+        #
+        # temp links for those that change
+        #
+        link_items: list[tuple[str, str]] = []
+        if okay:
+            for (linkname, target) in links.items():
+                if _is_link_to(linkname, target):
+                    continue
+                link_tmp = linkname + '.tmp'
+                link_items.append((linkname, link_tmp))
+                try:
+                    if os.path.lexists(link_tmp):
+                        os.unlink(link_tmp)
+                    os.symlink(target, link_tmp)
+                except OSError as exc:
+                    Msg.err(f'Error making symlink {linkname}: {exc}\n')
+                    okay = False
+                    break
+
+        #
+        # temp files and links on disk before anything changes
+        #
+        dirs: set[str] = {os.path.dirname(fpath) for (fpath, _tmp) in items}
+        dirs |= {os.path.dirname(linkname) for (linkname, _tmp) in link_items}
+        if okay:
+            for dpath in dirs:
+                _fsync_dir(dpath)
+
+        #
+        # switch: files first then links
+        #
+        for (idx, (fpath, tmp_path)) in enumerate(items):
+            if not okay:
+                _remove_temps([tmp for (_fpath, tmp) in items[idx:]])
+                break
+            try:
+                os.replace(tmp_path, fpath)
+            except OSError as exc:
+                Msg.err(f'Error renaming {tmp_path}: {exc}\n')
+                okay = False
+                _remove_temps([tmp for (_fpath, tmp) in items[idx:]])
+                break
+
+        for (idx, (linkname, link_tmp)) in enumerate(link_items):
+            if not okay:
+                _remove_temps([tmp for (_link, tmp) in link_items[idx:]])
+                break
+            try:
+                os.replace(link_tmp, linkname)
+            except OSError as exc:
+                Msg.err(f'Error making symlink {linkname}: {exc}\n')
+                okay = False
+                _remove_temps([tmp for (_link, tmp) in link_items[idx:]])
+                break
+
+        # the renames themselves
+        for dpath in dirs:
+            _fsync_dir(dpath)
+
+        if not okay:
+            for callback in abort_callbacks:
+                callback()
+            return False
+
+        for callback in callbacks:
+            if callback() is False:
+                okay = False
+        return okay
+
+    @classmethod
+    def abort(cls):
+        """
+        Drop all pending changes and remove temp files.
+        """
+        _remove_temps(list(cls._renames.values()))
+        abort_callbacks = cls._abort_callbacks
+        cls.active = False
+        cls._renames = {}
+        cls._links = {}
+        cls._callbacks = []
+        cls._abort_callbacks = []
+
+        for callback in abort_callbacks:
+            callback()
+
+
+def _remove_temps(tmp_paths: list[str]):
+    """
+    Remove temp files or links (those still there)
+    """
+    for tmp_path in tmp_paths:
+        if os.path.lexists(tmp_path):
+            try:
+                os.unlink(tmp_path)
+            except OSError:
+                pass
+
+
+def _is_link_to(linkname: str, target: str) -> bool:
+    """
+    True if linkname is already a symlink to target
+    """
+    if not os.path.islink(linkname):
+        return False
+    try:
+        return os.readlink(linkname) == target
+    except OSError:
+        return False
+
+
+def _fsync_dir(dpath: str):
+    """
+    Flush directory entries to disk
+    """
+    if not dpath:
+        dpath = '.'
+    try:
+        fd = os.open(dpath, os.O_RDONLY | os.O_DIRECTORY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+
+def _sync_files(fpaths: list[str]) -> bool:
+    """
+    Flush files to disk.
+    One syncfs() for each filesystem holding any of them
+    (only that filesystem is flushed). Where syncfs() is not
+    available each file is fsync'ed.
+    Returns False if a file could not be synced.
+    """
+    # st_dev -> files on that filesystem
+    by_dev: dict[int, list[str]] = {}
+    for fpath in fpaths:
+        try:
+            dev = os.stat(fpath).st_dev
+        except OSError as exc:
+            Msg.err(f'Error syncing {fpath}: {exc}\n')
+            return False
+        by_dev.setdefault(dev, []).append(fpath)
+
+    for dev_paths in by_dev.values():
+        if _syncfs(dev_paths[0]):
+            continue
+        for fpath in dev_paths:
+            try:
+                fd = os.open(fpath, os.O_RDONLY)
+            except OSError as exc:
+                Msg.err(f'Error syncing {fpath}: {exc}\n')
+                return False
+            try:
+                os.fsync(fd)
+            except OSError as exc:
+                Msg.err(f'Error syncing {fpath}: {exc}\n')
+                return False
+            finally:
+                os.close(fd)
+    return True
+
+
+class _Libc:
+    """
+    syncfs() from libc if there is one (os has no wrapper)
+    """
+    # pylint: disable=too-few-public-methods
+    loaded: bool = False
+    syncfs: Any = None
+
+
+def _syncfs(fpath: str) -> bool:
+    """
+    Flush the filesystem holding fpath.
+    Returns False if syncfs() is not available or fails.
+    """
+    if not _Libc.loaded:
+        _Libc.loaded = True
+        try:
+            libc = ctypes.CDLL(None, use_errno=True)
+            _Libc.syncfs = getattr(libc, 'syncfs', None)
+        except (OSError, AttributeError):
+            _Libc.syncfs = None
+
+    if _Libc.syncfs is None:
+        return False
+
+    try:
+        fd = os.open(fpath, os.O_RDONLY)
+    except OSError:
+        return False
+    try:
+        return _Libc.syncfs(fd) == 0
+    finally:
+        os.close(fd)
@@ -0,0 +1,264 @@
+# SPDX-License-Identifier: GPL-2.0-or-later
+# SPDX-FileCopyrightText: © 2022-present  Gene C <arch@sapience.com>
+"""
+Incremental writes: track what changed since a vpn was read.
+
+A snapshot is taken right after the vpn is loaded, before it is
+refreshed, so what refresh changes (e.g. psk pairs of a deleted
+profile dropped) counts as a change. At write time the current state
+is compared against it (along with the changed flags) to find which
+data files need writing and which wireguard configs need rendering.
+
+Which configs depend on which peers:
+ - client config: itself, every gateway, vpninfo and its psks.
+ - gateway config: itself and every peer, vpninfo and its psks.
+
+So:
+ - gateway, vpninfo or tag change: every config.
+ - network sharing change (nets, internet, active): every config.
+ - other client peer change (key, address etc): it and all gateways.
+ - anything else: only its own config.
+
+A config also holds the IPs of dns hostnames it uses. When a host
+now resolves differently than when configs were last written (see
+Dns.is_changed()), the configs using it are rendered (dns_analyze()).
+"""
+# pylint: disable=too-many-instance-attributes
+import os
+from typing import Any
+
+from data import get_vpn_dir
+from data import get_wg_vpn_dir
+
+from dns_resolver import Dns
+
+from peers import Acct
+from peers import Profile
+
+from vpninfo import VpnInfo
+
+type _ProfKey = tuple[str, str]
+
+# Profile attributes used by (gateway) peers
+# (is_gw is not saved - it follows from Endpoint)
+_PEER_ATTRIBS: tuple[str, ...] = (
+        'PublicKey', 'Address', 'AddressWg', 'Endpoint', 'Endpoint_alt',
+        'PersistentKeepalive', 'no_psk_tags', 'hidden',
+        )
+
+# Profile attributes that change how networks are shared
+_NETS_ATTRIBS: tuple[str, ...] = (
+        'nets_offered', 'nets_wanted', 'internet_offered',
+        'internet_wanted', 'active',
+        )
+
+
+class _ProfSig:
+    """
+    Signatures of one profile.
+     - data: everything saved in the profile file.
+     - peer: what other peers use.
+     - nets: what determines network sharing.
+    """
+    # pylint: disable=too-few-public-methods
+
+    # nets signature of a client sharing no networks
+    nets_default: str = repr([[], [], False, True, True])
+
+    def __init__(self, prof: Profile):
+        self.data: str = repr(prof.to_dict())
+        self.peer: str = _attribs_sig(prof, _PEER_ATTRIBS)
+        self.nets: str = _attribs_sig(prof, _NETS_ATTRIBS)
+        self.tag: str = prof.ident.tag
+        # is_gw flag is only set by refresh
+        self.is_gw: bool = prof.is_gateway()
+
+
+class VpnDirty:
+    """
+    Snapshot of a vpn taken as read from disk (before any refresh)
+    and the results of comparing that to the current state.
+
+    After analyze():
+     - write_all: nothing can be skipped.
+     - render_all: every wireguard config needs rendering.
+     - vpninfo: Vpn.info and/or psks file needs writing.
+     - accts: acct names whose Acct.info needs writing.
+     - profs: (acct, prof) whose profile file needs writing.
+     - configs: (acct, prof) whose wireguard config needs rendering.
+    """
+    def __init__(self, vpn_name: str, vpninfo: VpnInfo,
+                 accts: dict[str, Acct], tag_map: dict[str, str]):
+        self.vpn_name: str = vpn_name
+        self.vpninfo_sig: str = repr(vpninfo.to_dict())
+        self.psk: dict[tuple[str, str], str] = dict(vpninfo.psks.psk)
+        self.tag_map: dict[str, str] = tag_map
+
+        self.acct_sig: dict[str, str] = {}
+        self.acct_state: dict[str, tuple[bool, bool]] = {}
+        self.prof_sig: dict[_ProfKey, _ProfSig] = {}
+        for (acct_name, acct) in accts.items():
+            self.acct_sig[acct_name] = repr(acct.to_dict_no_profile())
+            self.acct_state[acct_name] = (acct.active, acct.hidden)
+            for (prof_name, prof) in acct.profile.items():
+                self.prof_sig[(acct_name, prof_name)] = _ProfSig(prof)
+
+        self.write_all: bool = True
+        self.render_all: bool = True
+        self.vpninfo: bool = True
+        self.accts: set[str] = set()
+        self.profs: set[_ProfKey] = set()
+        self.configs: set[_ProfKey] = set()
+
+    def analyze(self, work_dir: str, vpn_name: str, vpninfo: VpnInfo,
+                accts: dict[str, Acct], tag_map: dict[str, str]):
+        """
+        Compare current state with the snapshot.
+        """
+        self.write_all = False
+        self.render_all = False
+        self.accts = set()
+        self.profs = set()
+        self.configs = set()
+
+        if vpn_name != self.vpn_name:
+            self.write_all = True
+            self.render_all = True
+            return
+
+        vpninfo_dirty = (vpninfo.changed
+                         or repr(vpninfo.to_dict()) != self.vpninfo_sig)
+        tags_dirty = tag_map != self.tag_map
+        self.vpninfo = (vpninfo_dirty
+                        or vpninfo.psks.changed
+                        or tags_dirty)
+
+        #
+        # data files
+        #
+        vpn_dir = get_vpn_dir(work_dir, vpn_name)
+        all_configs: bool = False
+        sigs: dict[_ProfKey, _ProfSig] = {}
+
+        for (acct_name, acct) in accts.items():
+            acct_dir = os.path.join(vpn_dir, acct_name)
+            if acct_name not in self.acct_sig:
+                self.accts.add(acct_name)
+            elif (acct.active, acct.hidden) != self.acct_state[acct_name]:
+                all_configs = True
+                self.accts.add(acct_name)
+            elif (repr(acct.to_dict_no_profile()) != self.acct_sig[acct_name]
+                  or not os.path.exists(os.path.join(acct_dir, 'Acct.info'))):
+                self.accts.add(acct_name)
+
+            for (prof_name, prof) in acct.profile.items():
+                key = (acct_name, prof_name)
+                sig = _ProfSig(prof)
+                sigs[key] = sig
+                old = self.prof_sig.get(key)
+                if (prof.changed or old is None or sig.data != old.data
+                        or not os.path.exists(prof.file_path(acct_dir))):
+                    self.profs.add(key)
+
+                # Profile.write() fixes this one up
+                if prof.internet_offered and prof.internet_wanted:
+                    self.profs.add(key)
+                    all_configs = True
+
+        #
+        # wireguard configs
+        #
+        removed = self.prof_sig.keys() - sigs.keys()
+        if vpninfo_dirty or tags_dirty or all_configs or removed:
+            self.render_all = True
+            return
+
+        gw_dirty: bool = False
+        for (key, sig) in sigs.items():
+            old = self.prof_sig.get(key)
+            if old is None:
+                # new profile
+                if sig.is_gw or sig.nets != _ProfSig.nets_default:
+                    self.render_all = True
+                    return
+                gw_dirty = True
+
+            elif sig.nets != old.nets or sig.is_gw != old.is_gw:
+                self.render_all = True
+                return
+
+            elif sig.peer != old.peer:
+                if sig.is_gw:
+                    self.render_all = True
+                    return
+                gw_dirty = True
+
+            if key in self.profs:
+                self.configs.add(key)
+
+        # psk changes affect configs of both peers in the pair
+        if vpninfo.psks.changed:
+            tags: set[str] = set()
+            for (pair, psk) in vpninfo.psks.psk.items():
+                if self.psk.get(pair) != psk:
+                    tags.update(pair)
+            tags.update(*[pair for pair in self.psk
+                          if pair not in vpninfo.psks.psk])
+            for (key, sig) in sigs.items():
+                if sig.tag in tags:
+                    self.configs.add(key)
+
+        wg_dir = get_wg_vpn_dir(work_dir, vpn_name)
+        for (key, sig) in sigs.items():
+            if gw_dirty and sig.is_gw:
+                self.configs.add(key)
+                continue
+            (acct_name, prof_name) = key
+            conf = os.path.join(wg_dir, acct_name, f'{prof_name}.conf')
+            if not os.path.exists(conf):
+                self.configs.add(key)
+
+    def dns_analyze(self, vpninfo: VpnInfo, accts: dict[str, Acct]):
+        """
+        Add configs using a dns host whose answer changed.
+        Call once hosts are resolved (before rendering).
+        """
+        if self.write_all or self.render_all:
+            return
+
+        vpn_hosts = vpninfo.dns + vpninfo.dns_gateways
+        vpn_dns_changed = any(Dns.is_changed(host) for host in vpn_hosts)
+
+        for (acct_name, acct) in accts.items():
+            for (prof_name, prof) in acct.profile.items():
+                if ((prof.use_vpn_dns and vpn_dns_changed)
+                        or any(Dns.is_changed(host) for host in prof.dns)):
+                    self.configs.add((acct_name, prof_name))
+
+    def is_write_acct(self, acct_name: str) -> bool:
+        """
+        True if Acct.info for acct needs writing.
+        """
+        return self.write_all or acct_name in self.accts
+
+    def is_write_prof(self, acct_name: str, prof_name: str) -> bool:
+        """
+        True if profile file needs writing.
+        """
+        return self.write_all or (acct_name, prof_name) in self.profs
+
+    def wg_configs(self) -> set[_ProfKey] | None:
+        """
+        Wireguard configs to render: None means all of them.
+        """
+        if self.write_all or self.render_all:
+            return None
+        return self.configs
+
+
+def _attribs_sig(prof: Profile, attribs: tuple[str, ...]) -> str:
+    """
+    Signature of some profile attributes
+    """
+    vals: list[Any] = [getattr(prof, attrib, None) for attrib in attribs]
+    return repr(vals)
@@ -0,0 +1,66 @@
+# SPDX-License-Identifier: GPL-2.0-or-later
+# SPDX-FileCopyrightText: © 2022-present  Gene C <arch@sapience.com>
+"""
+Index of the profiles of one vpn.
+
+Maps public key and tag to (acct, profile) so peers (e.g. from
+'wg show' report) are found without searching every account.
+Where more than one profile has the same key the first (in
+account / profile order) is used, same as a search would.
+
+The vpn drops the index whenever profiles are added, renamed,
+get new keys or are refreshed and builds a new one when next
+needed. Each entry found is also checked before it is used and,
+if out of date, the index is rebuilt. A key not found is only
+trusted if Profile.generation is unchanged since the index was
+built - otherwise the index is rebuilt (once) in case the key
+belongs to a profile added (or given new keys) since.
+"""
+# pylint: disable=too-few-public-methods
+from typing import Callable
+
+from peers import Acct
+from peers import Profile
+
+type _AcctProf = tuple[Acct, Profile]
+
+# what each index is keyed by
+_KEYS: dict[str, Callable[[Profile], str]] = {
+        'pubkey': lambda prof: prof.PublicKey,
+        'tag': lambda prof: prof.ident.tag,
+        }
+
+
+class PeerIndex:
+    """
+    pubkey / tag -> (acct, profile)
+    """
+    def __init__(self, accts: dict[str, Acct]):
+        self.accts: dict[str, Acct] = accts
+        self.generation: int = Profile.generation
+        self.index: dict[str, dict[str, _AcctProf]] = {
+                kind: {} for kind in _KEYS}
+
+        for acct in list(accts.values()):
+            for prof in list(acct.profile.values()):
+                for (kind, key_of) in _KEYS.items():
+                    key = key_of(prof)
+                    if key:
+                        self.index[kind].setdefault(key, (acct, prof))
+
+    def find(self, kind: str, key: str) -> tuple[bool, _AcctProf | None]:
+        """
+        Look up key in index kind ('pubkey' or 'tag').
+        Returns (current, (acct, prof) or None).
+        current is False if the entry found is out of date
+        or, when not found, if profiles changed since it was built.
+        """
+        item = self.index[kind].get(key)
+        if item is None:
+            return (Profile.generation == self.generation, None)
+
+        (acct, prof) = item
+        current = self.accts.get(acct.name) is acct
+        current = current and acct.profile.get(prof.ident.prof_name) is prof
+        current = current and _KEYS[kind](prof) == key
+        return (current, item)
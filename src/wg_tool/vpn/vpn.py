@@ -4,19 +4,31 @@
 Gateways
 """
 # pylint: disable=too-many-public-methods
+from functools import partial
+import os
+import time
 
 from utils import (Msg, state_marker)
+from utils import WriteBatch
+from utils import TomlCache
 from utils.debug import pprint
 
 from config import Opts
+from crypto import gen_key_pairs
 
 from data import (get_acct_names)
+from data import (get_vpn_dir, get_db_name)
+from data import (get_vpninfo_file, get_vpnpsk_file, get_file_names)
 from data import rename_acct_dir
 from data import unlink_profile
+from data import (wg_snapshot_begin, wg_snapshot_commit)
+from data import wg_snapshot_abort
+from data import wg_snapshot_release
 
 from peers import Acct
 from peers import WgConfig
 from peers import Profile
+from peers import dns_prefetch
 
 from rpt import PeerReport
 from rpt import AcctProfile
@@ -28,6 +40,9 @@ from net import NetsShared
 
 from vpninfo import VpnInfo
 
+from .dirty import VpnDirty
+from .peer_index import PeerIndex
+
 
 class Vpn():
     """
@@ -49,6 +64,12 @@ class Vpn():
 
         self.nets_shared: NetsShared = NetsShared()
 
+        # incremental writes: state as read (None means write all)
+        self.dirty: VpnDirty | None = None
+
+        # profiles by pubkey / tag - built when needed
+        self._peer_index: PeerIndex | None = None
+
     def is_active(self) -> bool:
         """
         Returns true of this vpn is active
@@ -76,11 +97,56 @@ class Vpn():
     def read(self):
         """
         Read Vpn.info and any accts data
+         - parsed toml files are cached in <vpn>/<db>/toml-cache
         """
-        self.vpninfo = VpnInfo(self.opts.work_dir, self.name)
-        self.read_accts()
+        vpn_dir = get_vpn_dir(self.opts.work_dir, self.name)
+        cache_path = os.path.join(vpn_dir, get_db_name(), 'toml-cache')
+        cache = TomlCache.open(vpn_dir, cache_path)
+        try:
+            self.prefetch_toml(cache)
+            self.vpninfo = VpnInfo(self.opts.work_dir, self.name)
+            self.read_accts()
+        finally:
+            TomlCache.close(vpn_dir)
+
+        #
+        # incremental: snapshot state as read from disk - before
+        # refresh, so whatever refresh changes (psks, tags etc)
+        # is seen as a change when written.
+        #
+        opts = self.opts
+        if opts.incremental and not opts.refresh:
+            self.dirty = VpnDirty(self.name, self.vpninfo, self.accts,
+                                  self.tag_id_map())
+
         self.refresh()
 
+    def prefetch_toml(self, cache: TomlCache):
+        """
+        Parse all data files of this vpn into cache - concurrently.
+        Vpn.info, Vpn.psk and for each acct: Acct.info, *.prof
+        """
+        work_dir = self.opts.work_dir
+        start = time.perf_counter()
+
+        (vpn_dir, acct_names) = get_acct_names(work_dir, self.name)
+        fpaths: list[str] = [get_vpninfo_file(work_dir, self.name),
+                             get_vpnpsk_file(work_dir, self.name)]
+        for acct_name in acct_names:
+            acct_dir = os.path.join(vpn_dir, acct_name)
+            fpaths.append(os.path.join(acct_dir, 'Acct.info'))
+            for prof_file in get_file_names(acct_dir, '.prof'):
+                fpaths.append(os.path.join(acct_dir, prof_file))
+
+        (num_parsed, num_cached) = cache.prefetch(fpaths, self.opts.jobs)
+
+        elapsed = time.perf_counter() - start
+        num = num_parsed + num_cached
+        rate = num / elapsed if elapsed > 0 else 0
+        txt = f'{self.name}: {num} files ({num_cached} cached)'
+        txt += f' in {elapsed:.4f} secs ({rate:.0f} files/sec)'
+        Msg.plainverb(f'  {txt}\n', level=2)
+
     def refresh(self) -> bool:
         """
         Refresh dns_postupdn
@@ -97,6 +163,9 @@ class Vpn():
         vpninfo = self.vpninfo
         acct_list = list(self.accts.values())
 
+        # keys, ids and tags may change
+        self.peer_index_reset()
+
         #
         # dns from gateways
         #
@@ -227,19 +296,44 @@ class Vpn():
         acct_idents: dict[str, Identities] = {}
         for ident in vpn_idents.ids:
             acct_name = ident.acct_name
-            if not acct_idents[acct_name]:
+            if acct_name not in acct_idents:
                 acct_idents[acct_name] = Identities()
 
             acct_idents[acct_name].ids.append(ident)
 
         #
-        # ask each acct to make new keys
+        # collect every profile needing new keys
         #
+        acct_profs: list[tuple[Acct, Profile]] = []
         for (acct_name, these) in acct_idents.items():
             acct = self.accts[acct_name]
-            if not acct.new_key_pairs(these):
+            (ok, profs) = acct.profs_from_idents(these)
+            if not ok:
                 return False
+            for prof in profs:
+                acct_profs.append((acct, prof))
+
+        if not acct_profs:
+            return True
+
+        #
+        # make all the keys in one batch
+        #
+        start = time.perf_counter()
+        key_pairs = gen_key_pairs(len(acct_profs))
+        if len(key_pairs) != len(acct_profs):
+            Msg.err(f'{self.name}: failed to generate new keys\n')
+            return False
 
+        for ((acct, prof), (key_prv, key_pub)) in zip(acct_profs, key_pairs):
+            prof.set_key_pair(key_prv, key_pub)
+            acct.changed = True
+        self.peer_index_reset()
+
+        elapsed = time.perf_counter() - start
+        num = len(key_pairs)
+        txt = f'{self.name}: {num} new key pairs in {elapsed:.4f} secs'
+        Msg.plainverb(f'  {txt}\n', level=2)
         return True
 
     def refresh_psks(self):
@@ -264,9 +358,10 @@ class Vpn():
         tag_infos = self._get_tag_infos()
 
         #
-        # Pass 1: get/generate all psk pairs
+        # Pass 1: find all pairs missing a psk
         #
         psks = self.vpninfo.psks
+        missing: list[tuple[str, str]] = []
         for gw_tag_info in gw_tag_infos:
             gw_tag = gw_tag_info[0]
 
@@ -278,23 +373,35 @@ class Vpn():
                 if peer_tag == gw_tag:
                     continue
 
+                if psks.lookup_psk(gw_tag, peer_tag):
+                    continue
+
                 # check if pair is a legacy with no psk pair.
-                no_psk = False
                 if gw_tag in no_psk_tags:
-                    no_psk = True
+                    psks.put_shared_key(gw_tag, peer_tag, '')
+                    continue
+
+                missing.append((gw_tag, peer_tag))
 
-                psks.get_set_shared_key(gw_tag, peer_tag, no_psk=no_psk)
+        #
+        # Pass 2: generate all missing psks in one batch
+        #
+        if missing:
+            start = time.perf_counter()
+            num = psks.set_shared_keys(missing)
+            elapsed = time.perf_counter() - start
+            txt = f'{self.name}: {num} new psks in {elapsed:.4f} secs'
+            Msg.plainverb(f'  {txt}\n', level=2)
 
         #
-        # Pass 2
+        # Pass 3
         # - delete any tags which no longer are valid tags.
         # - could happen if user manually removes a profile file
         #   from Data/<vpn>/<acct>/<prof>
         #
         if tag_infos:
             known_tags = [info[0] for info in tag_infos]
-            known_gw_tags = [info[0] for info in tag_infos]
-            psks.clean_unknown_tags(known_gw_tags, known_tags)
+            psks.clean_unknown_tags(known_tags)
 
     def _get_tag_infos(self, gw_only: bool = False
                        ) -> list[tuple[str, list[str]]]:
@@ -328,9 +435,19 @@ class Vpn():
 
         # get tag -> id mapping
         tag_map: dict[str, str] = self.tag_id_map()
-        if not self.vpninfo.write_file(self.opts.work_dir, tag_map):
-            self.okay = False
-            return
+
+        #
+        # incremental: find what changed since read
+        #
+        dirty = self.dirty
+        if dirty:
+            dirty.analyze(self.opts.work_dir, self.name, self.vpninfo,
+                          self.accts, tag_map)
+
+        if not dirty or dirty.write_all or dirty.vpninfo:
+            if not self.vpninfo.write_file(self.opts.work_dir, tag_map):
+                self.okay = False
+                return
         self.write_accts()
 
     def add_acct(self, acct_name: str) -> Acct | None:
@@ -346,44 +463,82 @@ class Vpn():
         acct = Acct(vpn_name, acct_name)
         acct.changed = True
         self.accts[acct_name] = acct
+        self.peer_index_reset()
         return acct
 
     def add_acct_prof(self, acct_name: str, prof_name: str) -> Profile | None:
         """
         Make a new prof (acct may exist)
         """
-        new_id = f'{self.name}:{acct_name}:{prof_name}'
-        Msg.info(f'Adding new {new_id}\n')
-
-        if not (acct_name and prof_name):
-            Msg.err('Error incomplete id\n')
-            return None
-        #
-        # Acct
-        #
-        acct: Acct | None
-        if acct_name in self.accts:
-            acct = self.accts[acct_name]
-        else:
-            acct = self.add_acct(acct_name)
-            if not acct:
-                return None
-        #
-        # Profile
-        #
-        prof = acct.find_prof(prof_name)
-        if prof:
-            Msg.err(f'profile {acct_name}:{prof_name} already exists\n')
+        profs = self.add_acct_profs([(acct_name, prof_name)])
+        if not profs:
             return None
+        return profs[0]
+
+    def add_acct_profs(self, names: list[tuple[str, str]]) -> list[Profile]:
+        """
+        Make new profs (acct may exist)
+         - names is list of (acct_name, prof_name)
+        Everything is checked before any change is made and
+        the addresses for all new profiles are reserved in one pass.
+        Returns list of new profiles or empty list on error.
+        """
+        if not names:
+            return []
+
+        new_ids: set[str] = set()
+        for (acct_name, prof_name) in names:
+            new_id = f'{self.name}:{acct_name}:{prof_name}'
+            Msg.info(f'Adding new {new_id}\n')
+
+            if not (acct_name and prof_name):
+                Msg.err('Error incomplete id\n')
+                return []
+
+            if new_id in new_ids:
+                Msg.err(f'profile {acct_name}:{prof_name} duplicated\n')
+                return []
+            new_ids.add(new_id)
+
+            old_acct = self.accts.get(acct_name)
+            if old_acct and old_acct.find_prof(prof_name):
+                Msg.err(f'profile {acct_name}:{prof_name} already exists\n')
+                return []
 
         txt = 'If adding a gateway profile, you *must* edit it'
         txt += '  and add an Endpoint'
-        Msg.warnverb('txt\n', level=2)
+        Msg.warnverb(f'{txt}\n', level=2)
 
+        #
+        # Addresses for all of them
+        #
         vpninfo = self.vpninfo
-        new_ips = vpninfo.find_new_address()
-        prof = acct.add_prof(prof_name, new_ips)
-        return prof
+        new_ips = vpninfo.find_new_addresses(len(names))
+        if len(new_ips) != len(names):
+            Msg.err(f'{self.name}: failed to find new addresses\n')
+            return []
+
+        profs: list[Profile] = []
+        for ((acct_name, prof_name), ips) in zip(names, new_ips):
+            #
+            # Acct
+            #
+            acct: Acct | None
+            if acct_name in self.accts:
+                acct = self.accts[acct_name]
+            else:
+                acct = self.add_acct(acct_name)
+                if not acct:
+                    return []
+            #
+            # Profile
+            #
+            prof = acct.add_prof(prof_name, ips)
+            if not prof:
+                return []
+            profs.append(prof)
+        self.peer_index_reset()
+        return profs
 
     def read_accts(self) -> bool:
         """
@@ -434,9 +589,19 @@ class Vpn():
         if not self.accts:
             return True
 
+        dirty = self.dirty
         acct_list = list(self.accts.values())
         for acct in acct_list:
-            acct.write(self.opts)
+            if not dirty:
+                acct.write(self.opts)
+                continue
+
+            write_info = dirty.is_write_acct(acct.name)
+            prof_names = [prof_name for prof_name in acct.profile
+                          if dirty.is_write_prof(acct.name, prof_name)]
+            if write_info or prof_names:
+                acct.write(self.opts, write_info=write_info,
+                           prof_names=prof_names)
         return True
 
     def write_wireguard(self) -> bool:
@@ -450,10 +615,61 @@ class Vpn():
         opts = self.opts
         vpninfo = self.vpninfo
 
+        # hosts resolved first: an answer change means config changes
+        self.prefetch_dns()
+
+        only = None
+        if self.dirty:
+            self.dirty.dns_analyze(vpninfo, self.accts)
+            only = self.dirty.wg_configs()
+            if only is not None and not only:
+                Msg.plainverb(f'  {self.name}: configs unchanged\n', level=2)
+                return True
+
+        #
+        # snapshot: write into a new generation which
+        # becomes current once all files are in place.
+        # Otherwise never write into the (last) generation.
+        #
+        work_dir = opts.work_dir
+        snapshot = opts.wg_snapshot
+        if snapshot and not wg_snapshot_begin(work_dir, self.name):
+            return False
+        if not snapshot and not wg_snapshot_release(work_dir, self.name):
+            return False
+
         wg_config = WgConfig(opts, vpninfo, self.accts)
-        okay = wg_config.write_all()
+        okay = wg_config.write_all(only=only)
+
+        if snapshot:
+            if not okay:
+                wg_snapshot_abort(work_dir, self.name)
+            elif WriteBatch.active:
+                # batch commit fails if the snapshot commit does
+                WriteBatch.after_commit(
+                        partial(wg_snapshot_commit, work_dir, self.name))
+                WriteBatch.after_abort(
+                        partial(wg_snapshot_abort, work_dir, self.name))
+            else:
+                okay = wg_snapshot_commit(work_dir, self.name)
         return okay
 
+    def prefetch_dns(self):
+        """
+        Resolve every dns hostname used by this vpn's configs
+        once, before any config is rendered.
+        """
+        vpninfo = self.vpninfo
+        hosts: list[str] = vpninfo.dns + vpninfo.dns_gateways
+        for acct in self.accts.values():
+            for prof in acct.profile.values():
+                hosts += prof.dns
+
+        start = time.perf_counter()
+        dns_prefetch(hosts, vpninfo.dns_lookup_ipv6, self.opts.jobs)
+        elapsed = time.perf_counter() - start
+        Msg.plainverb(f'  {self.name}: dns in {elapsed:.4f} secs\n', level=2)
+
     def show_list(self):
         """
         List all accts for this vpn
@@ -506,27 +722,53 @@ class Vpn():
         """
         acct_prof = AcctProfile()
 
-        for acct in list(self.accts.values()):
-            profile = acct.prof_from_pubkey(pubkey_str)
-            if profile:
-                acct_prof.valid = True
-                acct_prof.acct = acct
-                acct_prof.profile = profile
-                return acct_prof
-
-        # no match
+        item = self._peer_lookup('pubkey', pubkey_str)
+        if item:
+            acct_prof.valid = True
+            acct_prof.acct = item[0]
+            acct_prof.profile = item[1]
+
         return acct_prof
 
     def prof_from_pubkey(self, pubkey_str: str) -> Profile | None:
         """
         Locate profile with matching pubkey
         """
-        for acct in list(self.accts.values()):
-            profile = acct.prof_from_pubkey(pubkey_str)
-            if profile:
-                return profile
+        item = self._peer_lookup('pubkey', pubkey_str)
+        if item:
+            return item[1]
         return None
 
+    def peer_index_reset(self):
+        """
+        Drop profile index - call after profiles are added,
+        renamed or changed (keys etc).
+        """
+        self._peer_index = None
+        Profile.generation += 1
+
+    def _peer_lookup(self, kind: str, key: str
+                     ) -> tuple[Acct, Profile] | None:
+        """
+        Find (acct, profile) by 'pubkey' or 'tag'
+        using the index (built if needed).
+        """
+        if not key:
+            return None
+
+        index = self._peer_index
+        if index is None or index.accts is not self.accts:
+            index = PeerIndex(self.accts)
+
+        (current, item) = index.find(kind, key)
+        if not current:
+            # index is out of date
+            index = PeerIndex(self.accts)
+            (current, item) = index.find(kind, key)
+
+        self._peer_index = index
+        return item
+
     def show_gw_report(self,
                        acct_prof: AcctProfile,
                        peer_rpt: PeerReport,
@@ -593,6 +835,7 @@ class Vpn():
         acct = self.accts[old_name]
         self.accts[new_name] = acct
         del self.accts[old_name]
+        self.peer_index_reset()
 
         # Ask acct to rename itself and take care of its profiles
         if not acct.rename_acct(new_name):
@@ -624,6 +867,7 @@ class Vpn():
         # ask acct to rename the profile
         if not acct.rename_prof(prof_name, prof_name_new):
             return False
+        self.peer_index_reset()
 
         # rename the profile directory
         work_dir = self.opts.work_dir
@@ -649,11 +893,9 @@ class Vpn():
         Return the ident associated with tag
         or None if not found
         """
-        ident: Identity | None = None
-        for acct in list(self.accts.values()):
-            ident = acct.tag_to_ident(tag)
-            if ident:
-                return ident
+        item = self._peer_lookup('tag', tag)
+        if item:
+            return item[1].ident
         return None
 
     def tag_to_prof(self, tag: str) -> Profile | None:
@@ -661,10 +903,9 @@ class Vpn():
         Return the ident associated with tag
         or None if not found
         """
-        for acct in list(self.accts.values()):
-            prof = acct.tag_to_prof(tag)
-            if prof:
-                return prof
+        item = self._peer_lookup('tag', tag)
+        if item:
+            return item[1]
         return None
 
     def tag_id_map(self) -> dict[str, str]:
@@ -685,6 +926,7 @@ class Vpn():
         """
         # self and vpninfo
         self.name = new_name
+        self.peer_index_reset()
         if not self.vpninfo.rename_vpn(new_name):
             return False
 
@@ -229,11 +229,22 @@ class VpnInfo:
         Returns list of new usable address strings for each of the
         networks in this vpn.
         """
-        addresses: list[str] = []
+        addresses = self.find_new_addresses(1)
+        if not addresses:
+            return []
+        return addresses[0]
+
+    def find_new_addresses(self, count: int) -> list[list[str]]:
+        """
+        Returns list of new usable address for count profiles.
+        Each item is the list of address strings, one for each of the
+        networks in this vpn.
+        """
+        addresses: list[list[str]] = []
         if not self.networks:
             return addresses
 
-        addresses = self.networks.find_new_addresses()
+        addresses = self.networks.find_new_addresses(count)
         if not self.networks.okay:
             self.okay = False
 
@@ -466,16 +477,15 @@ def _psk_footer(psks: Psks, tag_map: dict[str, str]) -> str:
     """
     footer: str = '\n#\n# PSK by peer_name:prof_name pairs\n#\n'
 
-    for (ident, psk) in psks.psk.items():
-        id_tags = ident.split('+')
-        id1 = tag_map.get(id_tags[0])
-        id2 = tag_map.get(id_tags[1])
+    for (tag1, tag2, psk) in psks.pairs():
+        id1 = tag_map.get(tag1)
+        id2 = tag_map.get(tag2)
 
         if not id1:
-            id1 = id_tags[0]
+            id1 = tag1
             Msg.warn(f' tag map missing {id1}\n')
         if not id2:
-            id2 = id_tags[1]
+            id2 = tag2
             Msg.warn(f' tag map missing {id2}\n')
 
         item = f'# {psk:45s} = {id1:30s} x {id2:30s}\n'
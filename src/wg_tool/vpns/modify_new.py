@@ -70,13 +70,14 @@ def modify_new(vpns: VpnsBase) -> bool:
             Msg.warnverb(f'Vpn {vpn_name} has no gateway.', level=2)
             Msg.warnverb(' Please add one.', level=2)
 
+        names: list[tuple[str, str]] = []
         for id_str in acctlist:
             ident = Identity()
             ident.from_str(id_str)
+            names.append((ident.acct_name, ident.prof_name))
 
-            prof = vpn.add_acct_prof(ident.acct_name, ident.prof_name)
-            if not prof:
-                return False
+        if not vpn.add_acct_profs(names):
+            return False
     return True
 
 
@@ -4,10 +4,14 @@
 Handles 1 "vpn".
 """
 # pylint: disable=too-many-return-statements
+import os
+
 from config import Opts
 from utils import Msg
 from utils import state_marker
 from data import get_vpn_names
+from data import get_vpninfo_file
+from peers import Profile
 from rpt import GwReport
 from rpt import AcctProfile
 from vpn import Vpn
@@ -45,15 +49,65 @@ class Vpns(VpnsBase):
         Load existing vpns.
          - vpn.finfo
          - gateway and client
+        Only vpns referenced on command line are loaded, unless
+        the task needs all of them (see _vpn_names_needed()).
         """
         opts = self.opts
         vpn_names = get_vpn_names(opts.work_dir)
         if not vpn_names:
             return
+
+        needed = self._vpn_names_needed()
         for vpn_name in vpn_names:
-            vpn = Vpn(opts, vpn_name)
-            vpn.read()
-            self.vpn[vpn_name] = vpn
+            if needed is None or vpn_name in needed:
+                self.load_vpn(vpn_name)
+
+    def _vpn_names_needed(self) -> set[str] | None:
+        """
+        Names of vpns this run uses: from ids, --ident, --to-ident
+        and --import.
+        None means every vpn is needed:
+          - nothing named (applies to all)
+          - refresh, merge (tags from any vpn) and
+            show report (gateway found by public key).
+        """
+        opts = self.opts
+        if opts.refresh or opts.merge or opts.show_rpt or opts.run_show_rpt:
+            return None
+
+        names: set[str] = set(opts.idents.vpn_names())
+        for id_str in (opts.ident, opts.to_ident):
+            if id_str:
+                ident = Identity()
+                ident.from_str(id_str)
+                if ident.vpn_name:
+                    names.add(ident.vpn_name)
+
+        if opts.import_configs:
+            names.add(opts.import_configs)
+
+        if not names:
+            return None
+        return names
+
+    def load_vpn(self, vpn_name: str) -> Vpn | None:
+        """
+        Return vpn - reading it if not yet loaded.
+        None if it does not exist.
+        """
+        vpn = self.vpn.get(vpn_name)
+        if vpn:
+            return vpn
+
+        opts = self.opts
+        if not os.path.isfile(get_vpninfo_file(opts.work_dir, vpn_name)):
+            return None
+
+        Msg.plainverb(f'  Loading vpn {vpn_name}\n', level=3)
+        vpn = Vpn(opts, vpn_name)
+        vpn.read()
+        self.vpn[vpn_name] = vpn
+        return vpn
 
     def write(self):
         """
@@ -88,7 +142,7 @@ class Vpns(VpnsBase):
         if not vpn_name:
             return (False, None)
 
-        vpn = self.vpn.get(vpn_name)
+        vpn = self.load_vpn(vpn_name)
         if not vpn:
             self.vpn[vpn_name] = Vpn(self.opts, vpn_name)
             vpn = self.vpn[vpn_name]
@@ -99,7 +153,7 @@ class Vpns(VpnsBase):
         """
         Create a new vpn 'vpn_name'
         """
-        if vpn_name in self.vpn:
+        if self.load_vpn(vpn_name):
             Msg.err(f'{vpn_name} already exists\n')
             return (False, None)
         self.vpn[vpn_name] = Vpn(self.opts, vpn_name)
@@ -148,15 +202,41 @@ class Vpns(VpnsBase):
         first.
         Should we mark duplicates as 'duplicate' so always return primary?
         """
-        for vpn in list(self.vpn.values()):
+        state = (Profile.generation, len(self.vpn))
+        if state != self.pubkey_vpn_state:
+            self._pubkey_vpn_build()
+
+        vpn = self.pubkey_vpn.get(pubkey_str)
+        if vpn:
             acct_prof = vpn.acct_prof_from_pubkey(pubkey_str)
-            if acct_prof.valid:
+            if not acct_prof.valid:
+                # out of date - rebuild once
+                self._pubkey_vpn_build()
+                vpn = self.pubkey_vpn.get(pubkey_str)
+                if vpn:
+                    acct_prof = vpn.acct_prof_from_pubkey(pubkey_str)
+            if vpn and acct_prof.valid:
                 return (vpn, acct_prof)
 
         # not found vpp.valid is False
         acct_prof = AcctProfile()
         return (None, acct_prof)
 
+    def _pubkey_vpn_build(self):
+        """
+        Map every profile public key to its vpn
+        (first vpn if same key in more than one).
+        """
+        pubkey_vpn: dict[str, Vpn] = {}
+        for vpn in list(self.vpn.values()):
+            for acct in list(vpn.accts.values()):
+                for prof in list(acct.profile.values()):
+                    if prof.PublicKey:
+                        pubkey_vpn.setdefault(prof.PublicKey, vpn)
+
+        self.pubkey_vpn = pubkey_vpn
+        self.pubkey_vpn_state = (Profile.generation, len(self.vpn))
+
     def acct_exists(self, ident: Identity) -> bool:
         """
         Check if ident exists
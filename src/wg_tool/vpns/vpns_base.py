@@ -20,3 +20,8 @@ class VpnsBase:
 
         self.opts: Opts = opts
         self.vpn: dict[str, Vpn] = {}
+
+        # public key -> vpn - built when needed and rebuilt once
+        # profiles (Profile.generation) or vpns have changed.
+        self.pubkey_vpn: dict[str, Vpn] = {}
+        self.pubkey_vpn_state: tuple[int, int] = (-1, -1)
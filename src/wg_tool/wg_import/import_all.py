@@ -64,6 +64,9 @@ def import_all_wg_configs(vpn: Vpn) -> bool:
         if not wg_conf.import_one(vpn, gw_infos):
             return False
 
+    # profiles were added
+    vpn.peer_index_reset()
+
     #
     # Phase 2:
     #  - update gateways from peer.Endpoint, peer.AllowedIPs
@@ -0,0 +1,13 @@
+# SPDX-License-Identifier: GPL-2.0-or-later
+# SPDX-FileCopyrightText: © 2022-present  Gene C <arch@sapience.com>
+"""
+Tests run against the source tree: modules are imported the same way
+the tool does (absolute imports from src/wg_tool).
+"""
+import os
+import sys
+
+_SRC = os.path.join(os.path.dirname(os.path.dirname(__file__)),
+                    'src', 'wg_tool')
+if _SRC not in sys.path:
+    sys.path.insert(0, _SRC)
@@ -0,0 +1,166 @@
+# SPDX-License-Identifier: GPL-2.0-or-later
+# SPDX-FileCopyrightText: © 2022-present  Gene C <arch@sapience.com>
+"""
+Address allocators (net/allocator.py) and their use by NetWork.
+"""
+import ipaddress
+import time
+
+import pytest
+
+pytest.importorskip('py_cidr')
+
+# pylint: disable=wrong-import-position
+from net import NetWork                             # noqa: E402
+from net.allocator import (AllocBitmap, AllocRanges)    # noqa: E402
+from net.allocator import (new_allocator, resize_allocator)  # noqa: E402
+
+_BACKENDS = [AllocRanges, AllocBitmap]
+
+
+@pytest.mark.parametrize('backend', _BACKENDS)
+def test_take_give(backend):
+    """ take / release / is_free """
+    alloc = backend(100, 199)
+    assert alloc.num_free() == 100
+    assert alloc.is_free(100, 199)
+
+    assert alloc.take(110, 119)
+    assert not alloc.is_free(115, 115)
+    assert not alloc.take(119, 120)
+    assert alloc.is_free(120, 120)
+    assert alloc.num_free() == 90
+    assert alloc.free_ranges() == [(100, 109), (120, 199)]
+
+    alloc.give(110, 119)
+    assert alloc.num_free() == 100
+    assert alloc.free_ranges() == [(100, 199)]
+
+
+@pytest.mark.parametrize('backend', _BACKENDS)
+def test_take_next(backend):
+    """ lowest free first - skipping taken """
+    alloc = backend(0, 15)
+    assert alloc.take(0, 0)
+    assert alloc.take(2, 3)
+    assert alloc.next_free() == 1
+    assert alloc.take_next(3) == [1, 4, 5]
+    assert alloc.next_free() == 6
+
+    alloc.give(2, 2)
+    assert alloc.next_free() == 2
+    assert alloc.take_next(100) == []
+    assert alloc.take_next(11) == [2] + list(range(6, 16))
+    assert alloc.next_free() is None
+    assert alloc.num_free() == 0
+
+
+def test_backends_agree():
+    """ same sequence of operations gives the same state """
+    ranges = AllocRanges(0, 255)
+    bitmap = AllocBitmap(0, 255)
+    ops = [('take', 0, 0), ('take', 255, 255), ('next', 10, 0),
+           ('take', 40, 63), ('give', 3, 7), ('next', 20, 0),
+           ('give', 40, 47), ('take', 41, 41), ('next', 5, 0)]
+    for (oper, arg1, arg2) in ops:
+        if oper == 'take':
+            assert ranges.take(arg1, arg2) == bitmap.take(arg1, arg2)
+        elif oper == 'give':
+            ranges.give(arg1, arg2)
+            bitmap.give(arg1, arg2)
+        else:
+            assert ranges.take_next(arg1) == bitmap.take_next(arg1)
+        assert ranges.free_ranges() == bitmap.free_ranges()
+        assert ranges.num_free() == bitmap.num_free()
+
+
+def test_new_allocator_backend():
+    """ bitmap only for small ipv4 networks """
+    net4 = ipaddress.ip_network('10.0.0.0/16')
+    assert isinstance(new_allocator(net4), AllocBitmap)
+    net4_big = ipaddress.ip_network('10.0.0.0/8')
+    assert isinstance(new_allocator(net4_big), AllocRanges)
+    net6 = ipaddress.ip_network('fc00::/64')
+    assert isinstance(new_allocator(net6), AllocRanges)
+
+
+@pytest.mark.parametrize(('small', 'big'), [
+    ('10.1.1.0/24', '10.1.0.0/20'),
+    ('10.1.1.0/24', '10.0.0.0/8'),
+    ('fc00:1::100/120', 'fc00:1::/112'),
+    ])
+def test_resize(small: str, big: str):
+    """ taken addresses are kept, the rest of the super net is free """
+    small_net = ipaddress.ip_network(small)
+    big_net = ipaddress.ip_network(big)
+    alloc = new_allocator(small_net)
+    first = int(small_net.network_address)
+    assert alloc.take(first, first + 3)
+
+    new = resize_allocator(alloc, big_net)
+    assert not new.is_free(first, first + 3)
+    assert new.is_free(first + 4, int(small_net.broadcast_address))
+    assert new.is_free(int(big_net.network_address),
+                       int(big_net.network_address))
+    assert new.num_free() == big_net.num_addresses - 4
+
+
+def test_network_expand():
+    """ NetWork: taken addresses survive expand_net """
+    network = NetWork()
+    assert network.initialize('10.1.1.1/24')
+    assert not network.is_address_available('10.1.1.0/32')
+    assert not network.is_address_available('10.1.1.1/32')
+    assert not network.is_address_available('10.1.1.255/32')
+    assert network.is_address_available('10.1.1.2/32')
+    assert not network.is_address_available('10.1.2.2/32')
+
+    assert network.mark_address_taken(ipaddress.ip_network('10.1.1.2/32'))
+    assert not network.mark_address_taken(
+            ipaddress.ip_network('10.1.1.2/32'))
+
+    assert network.expand_net('10.1.0.0/16')
+    assert network.net_str == '10.1.0.0/16'
+    assert not network.is_address_available('10.1.1.2/32')
+    assert not network.is_address_available('10.1.0.0/32')
+    assert not network.is_address_available('10.1.255.255/32')
+    assert network.is_address_available('10.1.2.2/32')
+
+    # addresses reserved before are kept (incl old network address)
+    assert not network.is_address_available('10.1.1.0/32')
+    assert network.is_address_available('10.1.1.3/32')
+
+    # not a super net
+    assert not network.expand_net('10.2.0.0/16')
+
+    nets = network.find_new_addresses(2)
+    assert [str(net) for net in nets] == ['10.1.0.1/32', '10.1.0.2/32']
+    assert not network.is_address_available('10.1.0.1/32')
+
+
+@pytest.mark.parametrize(('cidr', 'count'), [
+    ('10.0.0.0/16', 10_000), ('10.0.0.0/16', 50_000),
+    ('10.0.0.0/8', 10_000), ('10.0.0.0/8', 50_000),
+    ('fc00::/64', 50_000),
+    ])
+def test_alloc_rate(cidr: str, count: int):
+    """ allocations/sec - reported with pytest -s """
+    net = ipaddress.ip_network(cidr)
+    alloc = new_allocator(net)
+    first = int(net.network_address)
+
+    # scattered holes so the lookups are not trivial
+    for num in range(first + 1, first + 2 * count, 7):
+        alloc.take(num, num)
+
+    start = time.perf_counter()
+    nums = alloc.take_next(count)
+    free_ok = all(not alloc.is_free(num, num) for num in nums)
+    elapsed = time.perf_counter() - start
+
+    assert len(nums) == count
+    assert free_ok
+    name = type(alloc).__name__
+    rate = count / elapsed if elapsed > 0 else 0
+    print(f'\n  {name} {cidr}: {count} in {elapsed:.4f} secs'
+          f' ({rate:.0f}/sec)')
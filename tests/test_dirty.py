@@ -0,0 +1,88 @@
+# SPDX-License-Identifier: GPL-2.0-or-later
+# SPDX-FileCopyrightText: © 2022-present  Gene C <arch@sapience.com>
+"""
+Incremental writes (vpn/dirty.py): configs using a dns host
+whose answer changed are rendered.
+"""
+import pytest
+
+pytest.importorskip('py_cidr')
+
+# pylint: disable=wrong-import-position
+import data                                         # noqa: E402,F401
+from dns_resolver import Dns                        # noqa: E402
+from peers import Acct                              # noqa: E402
+from vpn.dirty import VpnDirty                      # noqa: E402
+from vpninfo import VpnInfo                         # noqa: E402
+
+
+def _vpn(work_dir: str) -> tuple[VpnInfo, dict[str, Acct], VpnDirty]:
+    """
+    bob.laptop uses its own dns host, bob.phone the vpn's
+    and ann.pc neither.
+    """
+    vpninfo = VpnInfo(work_dir, 'vpn1')
+    vpninfo.dns = ['ns.vpn.example.com']
+
+    bob = Acct('vpn1', 'bob')
+    laptop = bob.add_prof('laptop', ['10.77.77.2/32'])
+    phone = bob.add_prof('phone', ['10.77.77.3/32'])
+    ann = Acct('vpn1', 'ann')
+    pc = ann.add_prof('pc', ['10.77.77.4/32'])
+    assert laptop and phone and pc
+    laptop.dns = ['ns.bob.example.com']
+    laptop.use_vpn_dns = False
+    phone.use_vpn_dns = True
+    pc.use_vpn_dns = False
+
+    accts = {'bob': bob, 'ann': ann}
+    dirty = VpnDirty('vpn1', vpninfo, accts, {})
+    dirty.write_all = False
+    dirty.render_all = False
+    return (vpninfo, accts, dirty)
+
+
+@pytest.mark.parametrize(('changed', 'expect'), [
+    (set(), set()),
+    ({'ns.bob.example.com'}, {('bob', 'laptop')}),
+    ({'ns.vpn.example.com'}, {('bob', 'phone')}),
+    ({'ns.bob.example.com', 'ns.vpn.example.com'},
+     {('bob', 'laptop'), ('bob', 'phone')}),
+    ])
+def test_dns_analyze(tmp_path, monkeypatch, changed, expect):
+    """ only configs using a changed host """
+    monkeypatch.setattr(Dns, '_hosts_changed', changed)
+    (vpninfo, accts, dirty) = _vpn(str(tmp_path))
+    dirty.dns_analyze(vpninfo, accts)
+    assert dirty.wg_configs() == expect
+
+
+def test_dns_analyze_render_all(tmp_path, monkeypatch):
+    """ nothing to add when all are rendered anyway """
+    monkeypatch.setattr(Dns, '_hosts_changed', {'ns.bob.example.com'})
+    (vpninfo, accts, dirty) = _vpn(str(tmp_path))
+    dirty.render_all = True
+    dirty.dns_analyze(vpninfo, accts)
+    assert dirty.wg_configs() is None
+    assert not dirty.configs
+
+
+def test_gateway_flag_set_by_refresh(tmp_path):
+    """
+    Snapshot is taken before refresh sets is_gw: a gateway
+    is not seen as changed because of that.
+    """
+    vpninfo = VpnInfo(str(tmp_path), 'vpn1')
+    vpninfo.changed = False
+    acct = Acct('vpn1', 'gw')
+    prof = acct.add_prof('main', ['10.77.77.1/32'])
+    assert prof
+    prof.Endpoint = 'vpn.example.com:51820'
+    prof.is_gw = False
+    accts = {'gw': acct}
+    dirty = VpnDirty('vpn1', vpninfo, accts, {})
+
+    prof.refresh_is_gateway()
+    assert prof.is_gw
+    dirty.analyze(str(tmp_path), 'vpn1', vpninfo, accts, {})
+    assert not dirty.render_all
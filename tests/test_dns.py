@@ -0,0 +1,229 @@
+# SPDX-License-Identifier: GPL-2.0-or-later
+# SPDX-FileCopyrightText: © 2022-present  Gene C <arch@sapience.com>
+"""
+Dns answer cache.
+
+The resolver is replaced so no real queries are made:
+answers are used until their ttl expires, "no such name" is kept
+for the negative ttl and an expired answer is used when offline.
+"""
+import os
+from typing import Any
+
+import dns.exception
+import dns.resolver
+import pytest
+
+from dns_resolver import Dns
+from dns_resolver import class_dns
+
+
+class _Clock:
+    """ settable time.time() """
+    def __init__(self):
+        self.now: float = 1_000_000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+class _Resolve:
+    """ stand in for Dns._resolve: returns next result, counts calls """
+    def __init__(self):
+        self.result: tuple[bool | None, list[str], int] = (True, [], 0)
+        self.calls: int = 0
+
+    def __call__(self, query: str, rr_type: str
+                 ) -> tuple[bool | None, list[str], int]:
+        self.calls += 1
+        return self.result
+
+
+@pytest.fixture(name='clock')
+def fixture_clock(monkeypatch) -> _Clock:
+    """ Dns sees clock.now as current time """
+    clock = _Clock()
+    monkeypatch.setattr(class_dns.time, 'time', clock)
+    return clock
+
+
+@pytest.fixture(name='resolve')
+def fixture_resolve(monkeypatch) -> _Resolve:
+    """ Dns with empty cache and fake resolver """
+    resolve = _Resolve()
+    monkeypatch.setattr(Dns, '_answers', {})
+    monkeypatch.setattr(Dns, '_loaded', False)
+    monkeypatch.setattr(Dns, '_changed', False)
+    monkeypatch.setattr(Dns, 'cache_file', '')
+    monkeypatch.setattr(Dns, 'refresh', False)
+    monkeypatch.setattr(Dns, '_hosts_changed', set())
+    monkeypatch.setattr(Dns, '_failed', set())
+    monkeypatch.setattr(Dns, '_resolve', resolve)
+    return resolve
+
+
+def test_ttl_expiry(clock, resolve):
+    """ answer used until ttl expires then asked again """
+    resolve.result = (True, ['10.0.0.1'], 60)
+    assert Dns.query('vpn.example.com') == ['10.0.0.1']
+    assert resolve.calls == 1
+
+    clock.now += 59
+    resolve.result = (True, ['10.0.0.2'], 60)
+    assert Dns.query('vpn.example.com') == ['10.0.0.1']
+    assert resolve.calls == 1
+
+    clock.now += 1
+    assert Dns.query('vpn.example.com') == ['10.0.0.2']
+    assert resolve.calls == 2
+
+
+@pytest.mark.usefixtures('clock')
+def test_rr_types_kept_apart(resolve):
+    """ A and AAAA answers are separate """
+    resolve.result = (True, ['10.0.0.1'], 60)
+    assert Dns.query('vpn.example.com', 'A') == ['10.0.0.1']
+    resolve.result = (True, ['fc00::1'], 60)
+    assert Dns.query('vpn.example.com', 'AAAA') == ['fc00::1']
+    assert Dns.query('vpn.example.com', 'A') == ['10.0.0.1']
+    assert resolve.calls == 2
+
+
+def test_negative_ttl(clock, resolve):
+    """ no such name is cached for the negative ttl """
+    resolve.result = (False, [], class_dns._NEGATIVE_TTL)
+    assert not Dns.query('none.example.com')
+    assert resolve.calls == 1
+
+    clock.now += class_dns._NEGATIVE_TTL - 1
+    assert not Dns.query('none.example.com')
+    assert resolve.calls == 1
+
+    clock.now += 1
+    resolve.result = (True, ['10.0.0.3'], 60)
+    assert Dns.query('none.example.com') == ['10.0.0.3']
+    assert resolve.calls == 2
+
+
+def test_stale_when_offline(clock, resolve):
+    """
+    expired answer used (and kept) when resolver gives no answer.
+    Resolver is asked once per host / type for the run.
+    """
+    resolve.result = (True, ['10.0.0.1'], 60)
+    assert Dns.query('vpn.example.com') == ['10.0.0.1']
+
+    clock.now += 3600
+    resolve.result = (None, [], 0)
+    for _num in range(5):
+        assert Dns.query('vpn.example.com') == ['10.0.0.1']
+    assert resolve.calls == 2
+
+    # prefetch skips it too
+    Dns.prefetch(['vpn.example.com'], ('A',))
+    assert resolve.calls == 2
+
+    # other type is asked (once)
+    assert not Dns.query('vpn.example.com', 'AAAA')
+    assert not Dns.query('vpn.example.com', 'AAAA')
+    assert resolve.calls == 3
+
+    # nothing known at all
+    assert not Dns.query('new.example.com')
+    assert not Dns.query('new.example.com')
+    assert resolve.calls == 4
+
+
+def test_is_changed(clock, resolve, monkeypatch):
+    """ answer differs from the one saved (or none saved) """
+    resolve.result = (True, ['10.0.0.1', '10.0.0.2'], 60)
+    assert Dns.query('vpn.example.com')
+    assert Dns.is_changed('vpn.example.com')
+    assert not Dns.is_changed('other.example.com')
+
+    # next run: same answer (any order) - not changed
+    monkeypatch.setattr(Dns, '_hosts_changed', set())
+    clock.now += 120
+    resolve.result = (True, ['10.0.0.2', '10.0.0.1'], 60)
+    assert Dns.query('vpn.example.com')
+    assert not Dns.is_changed('vpn.example.com')
+
+    # offline: stale answer used - not changed
+    clock.now += 120
+    resolve.result = (None, [], 0)
+    assert Dns.query('vpn.example.com')
+    assert not Dns.is_changed('vpn.example.com')
+
+    # next run: back online
+    monkeypatch.setattr(Dns, '_failed', set())
+    clock.now += 120
+    resolve.result = (True, ['10.0.0.3'], 60)
+    assert Dns.query('vpn.example.com') == ['10.0.0.3']
+    assert Dns.is_changed('vpn.example.com')
+
+
+@pytest.mark.usefixtures('clock')
+def test_save_and_load(tmp_path, resolve, monkeypatch):
+    """ answers saved to cache_file are used by next run """
+    cache_file = os.path.join(tmp_path, 'dns.cache')
+    monkeypatch.setattr(Dns, 'cache_file', cache_file)
+    resolve.result = (True, ['10.0.0.1'], 60)
+    assert Dns.query('vpn.example.com') == ['10.0.0.1']
+    assert Dns.save_cache()
+    assert os.path.exists(cache_file)
+
+    # next run
+    monkeypatch.setattr(Dns, '_answers', {})
+    monkeypatch.setattr(Dns, '_loaded', False)
+    assert Dns.query('vpn.example.com') == ['10.0.0.1']
+    assert resolve.calls == 1
+
+    # refresh ignores saved answers
+    monkeypatch.setattr(Dns, '_answers', {})
+    monkeypatch.setattr(Dns, '_loaded', False)
+    monkeypatch.setattr(Dns, 'refresh', True)
+    assert Dns.query('vpn.example.com') == ['10.0.0.1']
+    assert resolve.calls == 2
+
+
+class _Rdata:
+    """ one record of an answer """
+    def __init__(self, text: str):
+        self.text = text
+
+    def to_text(self) -> str:
+        """ record as text """
+        return self.text
+
+
+class _Answer(list):
+    """ resolver answer: records and rrset.ttl """
+    def __init__(self, records: list[str], ttl: int):
+        super().__init__(_Rdata(rec) for rec in records)
+        self.rrset: Any = type('_RRset', (), {'ttl': ttl})()
+
+
+class _Resolver:
+    """ stand in for dns.resolver.Resolver """
+    def __init__(self, outcome: Any):
+        self.outcome = outcome
+
+    def resolve(self, _query: str, _rr_type: str) -> _Answer:
+        """ answer or raise """
+        if isinstance(self.outcome, Exception):
+            raise self.outcome
+        return self.outcome
+
+
+@pytest.mark.parametrize('outcome, expect', [
+    (_Answer(['10.0.0.1', '0.0.0.0'], 120), (True, ['10.0.0.1'], 120)),
+    (dns.resolver.NXDOMAIN(), (False, [], class_dns._NEGATIVE_TTL)),
+    (dns.resolver.NoAnswer(), (False, [], class_dns._NEGATIVE_TTL)),
+    (dns.exception.Timeout(), (None, [], 0)),
+    ])
+def test_resolve(monkeypatch, outcome, expect):
+    """ resolver answers / errors -> (found, records, ttl) """
+    monkeypatch.setattr(Dns, '_initialized', True)
+    monkeypatch.setattr(Dns, '_resolver', _Resolver(outcome), raising=False)
+    # pylint: disable=protected-access
+    assert Dns._resolve('vpn.example.com', 'A') == expect
@@ -0,0 +1,50 @@
+# SPDX-License-Identifier: GPL-2.0-or-later
+# SPDX-FileCopyrightText: © 2022-present  Gene C <arch@sapience.com>
+"""
+Declared fields of slotted classes (utils/fields.py).
+"""
+from utils import (class_fields, fields_to_dict, is_field)
+
+
+class _Base:
+    __slots__ = ('first', 'second')
+
+    def __init__(self):
+        self.first: int = 1
+        self.second: int = 2
+
+
+class _Derived(_Base):
+    __slots__ = ('third', '__weakref__')
+
+    def __init__(self):
+        super().__init__()
+        self.third: int = 3
+
+
+class _Unset(_Base):
+    __slots__ = 'only'
+
+
+def test_class_fields_order():
+    """ bases first, in declared order, no dunders """
+    assert class_fields(_Base) == ('first', 'second')
+    assert class_fields(_Derived) == ('first', 'second', 'third')
+    assert class_fields(_Unset) == ('first', 'second', 'only')
+
+
+def test_fields_to_dict():
+    """ values in field order - unset fields skipped """
+    obj = _Derived()
+    assert list(fields_to_dict(obj).items()) == [
+            ('first', 1), ('second', 2), ('third', 3)]
+    assert fields_to_dict(_Unset()) == {'first': 1, 'second': 2}
+
+
+def test_is_field():
+    """ only declared fields """
+    obj = _Derived()
+    assert is_field(obj, 'third')
+    assert is_field(obj, 'first')
+    assert not is_field(obj, 'fourth')
+    assert not is_field(obj, '__weakref__')
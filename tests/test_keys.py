@@ -0,0 +1,119 @@
+# SPDX-License-Identifier: GPL-2.0-or-later
+# SPDX-FileCopyrightText: © 2022-present  Gene C <arch@sapience.com>
+"""
+In process key generation (crypto/keys.py).
+
+Known answer tests use the X25519 vectors of RFC 7748 (section 6.1).
+If wireguard-tools is installed keys are also compared with
+"wg genkey" / "wg pubkey".
+"""
+import base64
+import os
+import shutil
+import subprocess
+import time
+
+import pytest
+
+from crypto import keys
+from crypto import gen_key_pair
+from crypto import gen_key_pairs
+from crypto import gen_psk
+from crypto import gen_psks
+from crypto import public_from_private_key
+
+# RFC 7748 6.1 (private, public) - hex
+_VECTORS: list[tuple[str, str]] = [
+    ('77076d0a7318a57d3c16c17251b26645df4c2f87ebc0992ab177fba51db92c2a',
+     '8520f0098930a754748b7ddcb43ef75a0dbf3a0d26381af4eba4a98eaa9b4e6a'),
+    ('5dab087e624a8a4b79e17f8b83800ee66f3bb1292618b6fd1c2f8b27ff88e0eb',
+     'de9edb7d7b7dc1b4d35b61c2ece435373f8343c85b78674dadfc7e146f882b4f'),
+]
+
+_WG = shutil.which('wg')
+
+
+def _b64(hexstr: str) -> str:
+    return base64.b64encode(bytes.fromhex(hexstr)).decode('ascii')
+
+
+def _wg(args: list[str], input_str: str = '') -> str:
+    assert _WG
+    res = subprocess.run([_WG] + args, input=input_str, check=True,
+                         capture_output=True, text=True)
+    return res.stdout.strip()
+
+
+@pytest.mark.parametrize(('prv', 'pub'), _VECTORS)
+def test_public_key_vectors(prv: str, pub: str):
+    """ public key of known private keys """
+    assert public_from_private_key(_b64(prv)) == _b64(pub)
+
+
+@pytest.mark.parametrize(('prv', 'pub'), _VECTORS)
+def test_clamped_key_same_public(prv: str, pub: str):
+    """ clamping (as wg genkey does) does not change the public key """
+    # pylint: disable=protected-access
+    clamped = keys._encode(keys._clamp(bytes.fromhex(prv)))
+    assert public_from_private_key(clamped) == _b64(pub)
+
+
+def test_key_pair_format():
+    """ private key is clamped and both are 32 byte base64 """
+    (key_prv, key_pub) = gen_key_pair()
+    raw = base64.b64decode(key_prv)
+    assert len(raw) == 32
+    assert len(base64.b64decode(key_pub)) == 32
+    assert raw[0] & 7 == 0
+    assert raw[31] & 128 == 0
+    assert raw[31] & 64 == 64
+    assert public_from_private_key(key_prv) == key_pub
+
+
+def test_key_pairs_batch():
+    """ batch of keys - all different and consistent """
+    pairs = gen_key_pairs(50)
+    assert len(pairs) == 50
+    assert len({prv for (prv, _pub) in pairs}) == 50
+    for (key_prv, key_pub) in pairs:
+        assert public_from_private_key(key_prv) == key_pub
+    assert not gen_key_pairs(0)
+
+
+def test_psks():
+    """ psks are 32 random bytes """
+    assert len(base64.b64decode(gen_psk())) == 32
+    psks = gen_psks(20)
+    assert len(set(psks)) == 20
+    assert all(len(base64.b64decode(psk)) == 32 for psk in psks)
+
+
+@pytest.mark.parametrize('bad', ['', 'not-base64!', base64.b64encode(
+    os.urandom(16)).decode('ascii')])
+def test_invalid_private_key(bad: str):
+    """ invalid private key gives no public key """
+    assert public_from_private_key(bad) == ''
+
+
+@pytest.mark.skipif(_WG is None, reason='wireguard-tools not installed')
+def test_same_as_wg():
+    """ byte for byte same as wg pubkey (for ours and for wg genkey) """
+    (key_prv, key_pub) = gen_key_pair()
+    assert _wg(['pubkey'], key_prv) == key_pub
+
+    wg_prv = _wg(['genkey'])
+    assert public_from_private_key(wg_prv) == _wg(['pubkey'], wg_prv)
+
+    for (prv, pub) in _VECTORS:
+        assert _wg(['pubkey'], _b64(prv)) == _b64(pub)
+
+
+def test_key_rate():
+    """ keys/sec - reported with pytest -s """
+    count = 2000
+    start = time.perf_counter()
+    pairs = gen_key_pairs(count)
+    elapsed = time.perf_counter() - start
+    assert len(pairs) == count
+    rate = count / elapsed if elapsed > 0 else 0
+    print(f'\n  {count} key pairs in {elapsed:.4f} secs ({rate:.0f}/sec)')
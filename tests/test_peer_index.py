@@ -0,0 +1,113 @@
+# SPDX-License-Identifier: GPL-2.0-or-later
+# SPDX-FileCopyrightText: © 2022-present  Gene C <arch@sapience.com>
+"""
+Profile index (vpn/peer_index.py).
+
+Entries found must still be right and keys not found must not be
+trusted once profiles were added since the index was built.
+Same for the public key -> vpn map of Vpns.
+"""
+from types import SimpleNamespace
+
+import pytest
+
+pytest.importorskip('py_cidr')
+
+# pylint: disable=wrong-import-position
+import data                                         # noqa: E402,F401
+from peers import Acct                              # noqa: E402
+from vpn import Vpn                                 # noqa: E402
+from vpn.peer_index import PeerIndex                # noqa: E402
+from vpns import Vpns                               # noqa: E402
+from vpns.vpns_base import VpnsBase                 # noqa: E402
+
+
+def _accts() -> dict[str, Acct]:
+    """ bob with 2 profiles """
+    acct = Acct('vpn1', 'bob')
+    acct.add_prof('laptop', ['10.0.0.2/32'])
+    acct.add_prof('phone', ['10.0.0.3/32'])
+    return {acct.name: acct}
+
+
+def test_find():
+    """ pubkey and tag hits """
+    accts = _accts()
+    index = PeerIndex(accts)
+    prof = accts['bob'].profile['phone']
+
+    assert index.find('pubkey', prof.PublicKey) == (True, (accts['bob'], prof))
+    assert index.find('tag', prof.ident.tag) == (True, (accts['bob'], prof))
+
+    # unknown key and nothing changed: miss can be trusted
+    assert index.find('pubkey', 'no-such-key') == (True, None)
+
+
+def test_miss_after_add():
+    """ profile added after index built """
+    accts = _accts()
+    index = PeerIndex(accts)
+    prof = accts['bob'].add_prof('pc', ['10.0.0.4/32'])
+    assert prof is not None
+
+    assert index.find('pubkey', prof.PublicKey) == (False, None)
+    assert PeerIndex(accts).find('pubkey', prof.PublicKey)[1] is not None
+
+    # nothing changed since rebuilt
+    index = PeerIndex(accts)
+    assert index.find('tag', 'no-such-tag') == (True, None)
+
+    # directly added account
+    acct = Acct('vpn1', 'ann')
+    accts[acct.name] = acct
+    assert acct.add_prof('pc', ['10.0.0.5/32'])
+    assert index.find('tag', 'no-such-tag') == (False, None)
+
+
+def test_stale_hit():
+    """ key changed or profile replaced after index built """
+    accts = _accts()
+    index = PeerIndex(accts)
+    prof = accts['bob'].profile['laptop']
+    old_pubkey = prof.PublicKey
+
+    prof.new_key_pair()
+    (current, _item) = index.find('pubkey', old_pubkey)
+    assert not current
+    assert PeerIndex(accts).find('pubkey', old_pubkey) == (True, None)
+
+    tag = accts['bob'].profile['phone'].ident.tag
+    accts['bob'].profile['phone'] = accts['bob'].profile['laptop']
+    (current, _item) = index.find('tag', tag)
+    assert not current
+
+
+def _vpns(work_dir: str, names: list[str]) -> Vpns:
+    """ Vpns (nothing read) holding an empty vpn for each name """
+    opts = SimpleNamespace(work_dir=work_dir)
+    vpns = Vpns.__new__(Vpns)
+    VpnsBase.__init__(vpns, opts)
+    for name in names:
+        vpns.vpn[name] = Vpn(opts, name)
+    return vpns
+
+
+def test_vpns_pubkey(tmp_path):
+    """ public key -> vpn: first vpn wins and added profiles found """
+    vpns = _vpns(str(tmp_path), ['vpn1', 'vpn2'])
+    prof1 = vpns.vpn['vpn1'].add_acct_prof('bob', 'laptop')
+    assert prof1 is not None
+
+    (vpn, acct_prof) = vpns.vpn_acct_prof_from_pubkey(prof1.PublicKey)
+    assert vpn is vpns.vpn['vpn1'] and acct_prof.profile is prof1
+    assert vpns.vpn_acct_prof_from_pubkey('no-such-key')[0] is None
+
+    prof2 = vpns.vpn['vpn2'].add_acct_prof('ann', 'pc')
+    assert prof2 is not None
+    (vpn, acct_prof) = vpns.vpn_acct_prof_from_pubkey(prof2.PublicKey)
+    assert vpn is vpns.vpn['vpn2'] and acct_prof.profile is prof2
+
+    # same key in both: first vpn
+    prof2.set_key_pair(prof1.PrivateKey, prof1.PublicKey)
+    (vpn, acct_prof) = vpns.vpn_acct_prof_from_pubkey(prof1.PublicKey)
+    assert vpn is vpns.vpn['vpn1'] and acct_prof.profile is prof1
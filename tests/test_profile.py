@@ -0,0 +1,147 @@
+# SPDX-License-Identifier: GPL-2.0-or-later
+# SPDX-FileCopyrightText: © 2022-present  Gene C <arch@sapience.com>
+"""
+Profile serialization.
+
+data/golden.prof is what to_dict() + dict_to_toml_string() produced
+(before deepcopy was dropped) for a profile with every field set.
+Output must stay byte for byte the same.
+
+Fields are declared in __slots__ in the order they are saved and
+unknown keys in saved data are ignored (with a warning).
+"""
+import os
+import time
+import tomllib
+
+import pytest
+
+pytest.importorskip('py_cidr')
+
+# pylint: disable=wrong-import-position
+import data                                         # noqa: E402,F401
+from peers import Acct                              # noqa: E402
+from peers import Profile                           # noqa: E402
+from utils.fields import class_fields               # noqa: E402
+from utils import dict_to_toml_string               # noqa: E402
+
+_GOLDEN = os.path.join(os.path.dirname(__file__), 'data', 'golden.prof')
+
+
+def _golden() -> bytes:
+    with open(_GOLDEN, 'rb') as fob:
+        return fob.read()
+
+
+def _golden_prof() -> Profile:
+    prof = Profile()
+    prof.from_dict(tomllib.loads(_golden().decode('utf-8')))
+    return prof
+
+
+def test_golden_round_trip():
+    """ read -> to_dict -> toml gives the same bytes """
+    prof = _golden_prof()
+    out = dict_to_toml_string(prof.to_dict())
+    assert out.encode('utf-8') == _golden()
+
+
+def test_serialize_rate():
+    """ 10k profiles: to_dict + toml text rate - shown with pytest -s """
+    count = 10_000
+    prof = _golden_prof()
+
+    start = time.perf_counter()
+    size = 0
+    for _num in range(count):
+        size += len(dict_to_toml_string(prof.to_dict()))
+    secs = time.perf_counter() - start
+
+    assert size == count * len(_golden())
+    print(f'\n  {count} profiles serialized: {secs:.4f} secs'
+          f' ({count / secs:.0f}/sec)')
+
+
+def test_to_dict_is_a_copy():
+    """ changing the dict (or the profile) does not change the other """
+    prof = _golden_prof()
+    prof_dict = prof.to_dict()
+    prof_dict['dns'].append('9.9.9.9')
+    prof_dict['ident']['tag'] = 'changed'
+    assert '9.9.9.9' not in prof.dns
+    assert prof.ident.tag != 'changed'
+
+    prof.nets_offered.append('10.9.9.0/24')
+    assert '10.9.9.0/24' not in prof_dict['nets_offered']
+    assert dict_to_toml_string(_golden_prof().to_dict()).encode(
+            'utf-8') == _golden()
+
+
+def test_to_dict_order():
+    """ keys in slot order, internal fields never saved """
+    prof = _golden_prof()
+    keys = list(prof.to_dict().keys())
+    assert keys == [name for name in class_fields(Profile) if name in keys]
+    assert keys[0] == 'ident'
+    for name in ('changed', 'is_gw', 'mod_time'):
+        assert name not in keys
+
+    golden_keys = list(tomllib.loads(_golden().decode('utf-8')).keys())
+    assert keys == ['ident'] + [key for key in golden_keys
+                                if key != 'ident']
+
+
+def test_profile_unknown_key(capsys):
+    """ from_dict / merge_from_dict ignore keys that are not fields """
+    prof = Profile()
+    prof.from_dict({'MTU': '1400', 'no_such_key': 1})
+    assert prof.MTU == '1400'
+    assert not hasattr(prof, 'no_such_key')
+    assert 'unknown key no_such_key' in capsys.readouterr().out
+
+    prof.merge_from_dict({'dns': ['1.1.1.1'], 'bogus': 'x'})
+    assert prof.dns == ['1.1.1.1']
+    assert not hasattr(prof, 'bogus')
+    assert 'unknown key bogus' in capsys.readouterr().out
+
+    with pytest.raises(AttributeError):
+        setattr(prof, 'bogus', 'x')
+
+
+def test_acct_unknown_key(capsys):
+    """ Acct: unknown keys (and profile in info part) are ignored """
+    acct = Acct('vpn1', 'bob')
+    acct.from_dict_no_profile({'hidden': True, 'junk': 2})
+    assert acct.hidden
+    assert not hasattr(acct, 'junk')
+    assert 'unknown key junk' in capsys.readouterr().out
+
+    acct.from_dict({'active': False, 'extra': 1,
+                    'profile': {'laptop': {'MTU': '1300'}}})
+    assert not acct.active
+    assert not hasattr(acct, 'extra')
+    assert acct.profile['laptop'].MTU == '1300'
+    assert 'unknown key extra' in capsys.readouterr().out
+
+
+def test_profile_rate():
+    """ 20k profiles: from_dict + to_dict rate - shown with pytest -s """
+    count = 20_000
+    prof_dict = _golden_prof().to_dict()
+
+    start = time.perf_counter()
+    profs: list[Profile] = []
+    for _num in range(count):
+        prof = Profile()
+        prof.from_dict(prof_dict)
+        profs.append(prof)
+    loaded = time.perf_counter() - start
+
+    start = time.perf_counter()
+    dicts = [prof.to_dict() for prof in profs]
+    saved = time.perf_counter() - start
+
+    assert len(dicts) == count
+    assert dicts[-1] == prof_dict
+    print(f'\n  {count} profiles: from_dict {loaded:.4f} secs,'
+          f' to_dict {saved:.4f} secs')
@@ -0,0 +1,36 @@
+# SPDX-License-Identifier: GPL-2.0-or-later
+# SPDX-FileCopyrightText: © 2022-present  Gene C <arch@sapience.com>
+"""
+Pre shared keys indexed by tag pair (psks/psks.py).
+"""
+from psks import Psks
+
+
+def test_set_and_lookup():
+    """ one psk per unordered pair, batch skips pairs already set """
+    psks = Psks()
+    assert psks.set_shared_keys([('gw', 'a'), ('a', 'gw'), ('gw', 'b')]) == 2
+    psk = psks.lookup_psk('a', 'gw')
+    assert psk and psk == psks.lookup_psk('gw', 'a')
+    assert psks.set_shared_keys([('gw', 'a')]) == 0
+    assert psks.lookup_psk('gw', 'a') == psk
+    assert psks.changed
+
+
+def test_clean_unknown_tags():
+    """ pairs with an unknown tag are dropped, all others kept """
+    psks = Psks()
+    psks.set_shared_keys([('gw', 'a'), ('gw', 'b'), ('a', 'b')])
+    psks.put_shared_key('gw', 'legacy', '')
+    psks.changed = False
+
+    psks.clean_unknown_tags(['gw', 'a', 'b', 'legacy'])
+    assert len(psks.pairs()) == 4
+    assert not psks.changed
+
+    psks.clean_unknown_tags(['gw', 'a', 'legacy'])
+    assert psks.changed
+    assert not psks.lookup_psk('gw', 'b')
+    assert not psks.lookup_psk('a', 'b')
+    assert psks.lookup_psk('gw', 'a')
+    assert len(psks.pairs()) == 2
@@ -0,0 +1,82 @@
+# SPDX-License-Identifier: GPL-2.0-or-later
+# SPDX-FileCopyrightText: © 2022-present  Gene C <arch@sapience.com>
+"""
+Cache of parsed toml files (utils/toml_cache.py).
+
+Entries saved are used by the next run, each lookup is a fresh copy,
+and a cache file that is not ours, is writable by others or is not
+what we saved (e.g. a pickle) is ignored.
+"""
+import os
+import pickle
+import stat
+
+from utils import TomlCache
+from utils import read_toml_file
+
+
+def _setup(tmp_path) -> tuple[str, str, str]:
+    """ (topdir, cache file, toml file) """
+    topdir = str(tmp_path)
+    fpath = os.path.join(topdir, 'bob.toml')
+    with open(fpath, 'w', encoding='utf-8') as fob:
+        fob.write('name = "bob"\nips = ["10.0.0.2/32"]\n')
+    return (topdir, os.path.join(topdir, 'toml-cache'), fpath)
+
+
+def _run(topdir: str, cache_path: str, fpath: str
+         ) -> tuple[TomlCache, dict]:
+    """ one run: read fpath with cache open """
+    cache = TomlCache.open(topdir, cache_path)
+    try:
+        data = read_toml_file(fpath)
+    finally:
+        TomlCache.close(topdir)
+    return (cache, data)
+
+
+def test_saved_and_used(tmp_path):
+    """ next run uses saved entry - a fresh copy each time """
+    (topdir, cache_path, fpath) = _setup(tmp_path)
+    (cache, data) = _run(topdir, cache_path, fpath)
+    assert data == {'name': 'bob', 'ips': ['10.0.0.2/32']}
+    assert not cache.entries
+    assert os.path.isfile(cache_path)
+
+    cache = TomlCache(topdir, cache_path)
+    assert list(cache.entries) == ['bob.toml']
+    (_sig, data1) = cache.get(fpath)
+    assert data1 == data
+    data1['ips'].append('changed')
+    assert cache.get(fpath)[1] == data
+
+
+def test_not_plain(tmp_path):
+    """ toml dates cannot be marshalled - not cached """
+    (topdir, cache_path, fpath) = _setup(tmp_path)
+    with open(fpath, 'a', encoding='utf-8') as fob:
+        fob.write('when = 2024-01-02T03:04:05\n')
+
+    (_cache, data) = _run(topdir, cache_path, fpath)
+    assert data['name'] == 'bob'
+    assert not TomlCache(topdir, cache_path).entries
+
+
+def test_unsafe_ignored(tmp_path):
+    """ writable by group / others: not used """
+    (topdir, cache_path, fpath) = _setup(tmp_path)
+    _run(topdir, cache_path, fpath)
+    assert TomlCache(topdir, cache_path).entries
+
+    for bits in (stat.S_IWGRP, stat.S_IWOTH):
+        os.chmod(cache_path, stat.S_IRUSR | stat.S_IWUSR | bits)
+        assert not TomlCache(topdir, cache_path).entries
+
+
+def test_pickle_ignored(tmp_path):
+    """ older pickled cache (or junk) is not loaded """
+    (topdir, cache_path, _fpath) = _setup(tmp_path)
+    with open(cache_path, 'wb') as fob:
+        pickle.dump({'bob.toml': (('', 1, 2, 3), b'x')}, fob)
+    os.chmod(cache_path, stat.S_IRUSR | stat.S_IWUSR)
+    assert not TomlCache(topdir, cache_path).entries
@@ -0,0 +1,80 @@
+# SPDX-License-Identifier: GPL-2.0-or-later
+# SPDX-FileCopyrightText: © 2022-present  Gene C <arch@sapience.com>
+"""
+QR codes of client configs (peers/wg_qr.py).
+
+With writes batched, images change only when the batch is committed
+(together with the configs) and not at all if it is aborted.
+"""
+import os
+
+import pytest
+
+pytest.importorskip('py_cidr')
+
+# pylint: disable=wrong-import-position
+import data                                         # noqa: E402,F401
+from peers.wg_qr import WgQrCodes                   # noqa: E402
+from utils import WriteBatch                        # noqa: E402
+
+_CONF_OLD = '[Interface]\nPrivateKey = old\n'
+_CONF_NEW = '[Interface]\nPrivateKey = new\n'
+
+
+@pytest.fixture(autouse=True)
+def _no_batch():
+    """ each test starts and ends with no batch """
+    WriteBatch.abort()
+    yield
+    WriteBatch.abort()
+
+
+def _qr_write(work_dir: str, qr_file: str, config_data: str) -> bool:
+    qr_codes = WgQrCodes()
+    qr_codes.add(config_data, qr_file, True)
+    return qr_codes.write(work_dir, 'vpn1', 1)
+
+
+def _inode(fpath: str) -> int:
+    return os.stat(fpath).st_ino
+
+
+def _no_temps(topdir: str) -> bool:
+    for (_dirpath, _dirnames, filenames) in os.walk(topdir):
+        if [name for name in filenames if name.endswith('.tmp')]:
+            return False
+    return True
+
+
+def test_batch_commit(tmp_path):
+    """ new image in place only at commit """
+    work_dir = str(tmp_path)
+    qr_file = os.path.join(work_dir, 'out', 'qr', 'laptop.png')
+    assert _qr_write(work_dir, qr_file, _CONF_OLD)
+    old_inode = _inode(qr_file)
+
+    WriteBatch.begin()
+    assert _qr_write(work_dir, qr_file, _CONF_NEW)
+    assert _inode(qr_file) == old_inode
+
+    assert WriteBatch.commit()
+    assert _inode(qr_file) != old_inode
+    assert _no_temps(work_dir)
+
+
+def test_batch_abort(tmp_path):
+    """ old image kept when batch is aborted """
+    work_dir = str(tmp_path)
+    qr_file = os.path.join(work_dir, 'out', 'qr', 'laptop.png')
+    new_file = os.path.join(work_dir, 'out', 'qr', 'phone.png')
+    assert _qr_write(work_dir, qr_file, _CONF_OLD)
+    old_inode = _inode(qr_file)
+
+    WriteBatch.begin()
+    assert _qr_write(work_dir, qr_file, _CONF_NEW)
+    assert _qr_write(work_dir, new_file, _CONF_NEW)
+    WriteBatch.abort()
+
+    assert _inode(qr_file) == old_inode
+    assert not os.path.exists(new_file)
+    assert _no_temps(work_dir)
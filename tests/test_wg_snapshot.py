@@ -0,0 +1,65 @@
+# SPDX-License-Identifier: GPL-2.0-or-later
+# SPDX-FileCopyrightText: © 2022-present  Gene C <arch@sapience.com>
+"""
+Wireguard snapshots (data/wg_snapshot.py).
+
+Turning snapshots off must not write into the current generation
+and turning them on again makes a new one.
+"""
+import os
+
+from data import write_db_file
+from data import (wg_snapshot_begin, wg_snapshot_commit)
+from data import wg_snapshot_release
+from data.constants import (WG_DATA_DIR, DB_DIR)
+from data.wg_snapshot import wg_snapshot_staging
+
+
+def _write(work_dir: str, data: str) -> bool:
+    """ write Data-wg/vpn1/wg0.conf (snapshot if one is started) """
+    wg_vpn_dir = os.path.join(work_dir, WG_DATA_DIR, 'vpn1')
+    top_dir = wg_snapshot_staging(wg_vpn_dir) or wg_vpn_dir
+    (okay, _changed) = write_db_file(data, os.path.join(top_dir, 'wg0.conf'))
+    return okay
+
+
+def _read(fpath: str) -> str:
+    with open(fpath, 'r', encoding='utf-8') as fob:
+        return fob.read()
+
+
+def test_on_off_on(tmp_path):
+    """ snapshot on -> off -> on """
+    work_dir = str(tmp_path)
+    wg_vpn_dir = os.path.join(work_dir, WG_DATA_DIR, 'vpn1')
+    conf = os.path.join(wg_vpn_dir, 'wg0.conf')
+
+    # on
+    assert wg_snapshot_begin(work_dir, 'vpn1')
+    assert _write(work_dir, 'one\n')
+    assert wg_snapshot_commit(work_dir, 'vpn1')
+    assert os.path.islink(wg_vpn_dir)
+    gen_conf = os.path.join(os.path.realpath(wg_vpn_dir), 'wg0.conf')
+    assert _read(conf) == 'one\n'
+
+    # off: generation left as it was
+    assert wg_snapshot_release(work_dir, 'vpn1')
+    assert os.path.isdir(wg_vpn_dir) and not os.path.islink(wg_vpn_dir)
+    assert _read(conf) == 'one\n'
+    assert _write(work_dir, 'two\n')
+    assert _read(conf) == 'two\n'
+    assert _read(gen_conf) == 'one\n'
+    assert not os.path.exists(os.path.join(os.path.dirname(gen_conf), DB_DIR))
+    assert not os.path.lexists(wg_vpn_dir + '.dir.tmp')
+    assert not os.path.lexists(wg_vpn_dir + '.link.tmp')
+
+    # nothing to do if already a directory
+    assert wg_snapshot_release(work_dir, 'vpn1')
+
+    # on again
+    assert wg_snapshot_begin(work_dir, 'vpn1')
+    assert _write(work_dir, 'three\n')
+    assert wg_snapshot_commit(work_dir, 'vpn1')
+    assert os.path.islink(wg_vpn_dir)
+    assert _read(conf) == 'three\n'
+    assert _read(gen_conf) == 'one\n'
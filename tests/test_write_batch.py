@@ -0,0 +1,192 @@
+# SPDX-License-Identifier: GPL-2.0-or-later
+# SPDX-FileCopyrightText: © 2022-present  Gene C <arch@sapience.com>
+"""
+Group commit of file writes (utils/write_batch.py).
+"""
+import os
+
+import pytest
+
+from utils import WriteBatch
+from utils import write_path_atomic
+from utils import file_symlink
+from utils import write_batch
+
+
+def _read(fpath: str) -> str:
+    with open(fpath, 'r', encoding='utf-8') as fob:
+        return fob.read()
+
+
+def _setup(tmp_path) -> list[str]:
+    """
+    3 files with old content and a symlink to the 3rd.
+    Then a batch writing new content to each and pointing
+    the link at the new 3rd file.
+    """
+    fpaths = [os.path.join(tmp_path, f'file-{num}') for num in range(3)]
+    for fpath in fpaths:
+        assert write_path_atomic('old\n', fpath)
+    assert file_symlink('file-2', os.path.join(tmp_path, 'link'))
+
+    WriteBatch.begin()
+    for fpath in fpaths:
+        assert write_path_atomic('new\n', fpath)
+    assert file_symlink('file-new', os.path.join(tmp_path, 'link'))
+    assert write_path_atomic('new\n', os.path.join(tmp_path, 'file-new'))
+    return fpaths
+
+
+@pytest.fixture(autouse=True)
+def _no_batch():
+    """ each test starts and ends with no batch """
+    WriteBatch.abort()
+    yield
+    WriteBatch.abort()
+
+
+def test_commit(tmp_path):
+    """ everything put in place """
+    fpaths = _setup(tmp_path)
+    called: list[bool] = []
+    WriteBatch.after_commit(lambda: called.append(True))
+
+    # nothing changed until commit
+    assert all(_read(fpath) == 'old\n' for fpath in fpaths)
+
+    assert WriteBatch.commit()
+    assert not WriteBatch.active
+    assert called == [True]
+    assert all(_read(fpath) == 'new\n' for fpath in fpaths)
+    assert os.readlink(os.path.join(tmp_path, 'link')) == 'file-new'
+    assert not [name for name in os.listdir(tmp_path)
+                if name.endswith('.tmp')]
+
+
+def test_commit_rename_fails(tmp_path, monkeypatch):
+    """ stop at first failed rename - no links changed """
+    fpaths = _setup(tmp_path)
+    called: list[bool] = []
+    aborted: list[bool] = []
+    WriteBatch.after_commit(lambda: called.append(True))
+    WriteBatch.after_abort(lambda: aborted.append(True))
+
+    real_replace = os.replace
+
+    def _replace(src, dst):
+        if dst == fpaths[1]:
+            raise OSError('injected failure')
+        return real_replace(src, dst)
+
+    monkeypatch.setattr(os, 'replace', _replace)
+    assert not WriteBatch.commit()
+    monkeypatch.undo()
+
+    assert not WriteBatch.active
+    assert not called
+    assert aborted == [True]
+    assert _read(fpaths[0]) == 'new\n'
+    assert _read(fpaths[1]) == 'old\n'
+    assert _read(fpaths[2]) == 'old\n'
+    assert not os.path.exists(os.path.join(tmp_path, 'file-new'))
+    assert os.readlink(os.path.join(tmp_path, 'link')) == 'file-2'
+    assert not [name for name in os.listdir(tmp_path)
+                if name.endswith('.tmp')]
+
+
+def test_commit_symlink_fails(tmp_path, monkeypatch):
+    """ temp link can not be made - nothing changed """
+    fpaths = _setup(tmp_path)
+    aborted: list[bool] = []
+    WriteBatch.after_abort(lambda: aborted.append(True))
+
+    def _symlink(_target, _linkname):
+        raise OSError('injected failure')
+
+    monkeypatch.setattr(os, 'symlink', _symlink)
+    assert not WriteBatch.commit()
+    monkeypatch.undo()
+
+    assert aborted == [True]
+    assert all(_read(fpath) == 'old\n' for fpath in fpaths)
+    assert not os.path.exists(os.path.join(tmp_path, 'file-new'))
+    assert os.readlink(os.path.join(tmp_path, 'link')) == 'file-2'
+    assert not [name for name in os.listdir(tmp_path)
+                if name.endswith('.tmp')]
+
+
+def test_commit_flip_fails(tmp_path, monkeypatch):
+    """ files in place, link not flipped, no temp link left """
+    fpaths = _setup(tmp_path)
+    link = os.path.join(tmp_path, 'link')
+    real_replace = os.replace
+
+    def _replace(src, dst):
+        if dst == link:
+            raise OSError('injected failure')
+        return real_replace(src, dst)
+
+    monkeypatch.setattr(os, 'replace', _replace)
+    assert not WriteBatch.commit()
+    monkeypatch.undo()
+
+    assert all(_read(fpath) == 'new\n' for fpath in fpaths)
+    assert os.readlink(link) == 'file-2'
+    assert not [name for name in os.listdir(tmp_path)
+                if name.endswith('.tmp')]
+
+
+def test_sync_without_syncfs(tmp_path, monkeypatch):
+    """ no syncfs: each temp file is fsync'ed (and only those) """
+    # pylint: disable=protected-access
+    fpaths = _setup(tmp_path)
+    monkeypatch.setattr(write_batch._Libc, 'loaded', True)
+    monkeypatch.setattr(write_batch._Libc, 'syncfs', None)
+    synced: list[int] = []
+    real_fsync = os.fsync
+
+    def _fsync(fd):
+        synced.append(fd)
+        return real_fsync(fd)
+
+    monkeypatch.setattr(os, 'fsync', _fsync)
+    monkeypatch.setattr(os, 'sync', lambda: pytest.fail('os.sync used'))
+    assert WriteBatch.commit()
+
+    # 4 temp files + the dir (before and after the switch)
+    assert len(synced) == 6
+    assert all(_read(fpath) == 'new\n' for fpath in fpaths)
+
+
+def test_commit_callback_fails(tmp_path):
+    """ commit fails if an after_commit callback does """
+    _setup(tmp_path)
+    aborted: list[bool] = []
+    WriteBatch.after_commit(lambda: False)
+    WriteBatch.after_commit(lambda: None)
+    WriteBatch.after_abort(lambda: aborted.append(True))
+    assert not WriteBatch.commit()
+    assert not aborted
+
+
+def test_abort(tmp_path):
+    """ abort leaves old content and no temp files """
+    fpaths = _setup(tmp_path)
+    called: list[bool] = []
+    aborted: list[bool] = []
+    WriteBatch.after_commit(lambda: called.append(True))
+    WriteBatch.after_abort(lambda: aborted.append(True))
+
+    WriteBatch.abort()
+    assert not WriteBatch.active
+    assert not called
+    assert aborted == [True]
+    assert all(_read(fpath) == 'old\n' for fpath in fpaths)
+    assert os.readlink(os.path.join(tmp_path, 'link')) == 'file-2'
+    assert not [name for name in os.listdir(tmp_path)
+                if name.endswith('.tmp')]
+
+    # next commit has nothing left over
+    assert WriteBatch.commit()
+    assert not called
+    assert aborted == [True]